@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""Compare concurrent account lookups on OS threads and on green threads.
+
+Starts a local keep-alive HTTP server answering account lookups after a
+fixed latency, then, each in its own process, makes `--lookups` concurrent
+`get_account()` calls with one OS thread per lookup (plain threads) or one
+green thread per lookup (gevent and eventlet, monkey-patched). Prints the
+wall time, throughput, OS threads and peak memory of each::
+
+    python benchmarks/cooperative.py --lookups 10000 --latency 0.05
+
+At most `--in-flight` requests reach the server at once in every mode, as
+`max_concurrent_requests` bounds them, so the modes differ only in what
+the waiting lookups cost.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+MODES = ('threads', 'gevent', 'eventlet')
+
+
+def serve(latency):
+    import threading
+    try:
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from socketserver import ThreadingMixIn
+    except ImportError:  # Python 2
+        from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+        from SocketServer import ThreadingMixIn
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; don't let Nagle's
+        # algorithm hold the body back for a delayed ACK.
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = b'{"token": "token", "status": "Active"}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    server = Server(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:%d/' % server.server_address[1]
+
+
+def lookups(mode, url, count, in_flight):
+    # Patch before anything imports socket or threading.
+    if mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+    elif mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+
+    import resource
+    from concurrent.futures import ThreadPoolExecutor
+
+    from yoconfig import configure
+
+    from sitewit.concurrency import make_executor
+    from sitewit.services import SitewitService
+
+    configure(sitewit={'api_url': url, 'affiliate_id': 'benchmark',
+                       'affiliate_token': 'benchmark'})
+    service = SitewitService(
+        adaptive_concurrency=False, max_concurrent_requests=in_flight,
+        max_concurrent_requests_ceiling=in_flight)
+
+    # One worker per lookup, so they all wait concurrently.
+    if mode == 'threads':
+        executor = ThreadPoolExecutor(count)
+    else:
+        executor = make_executor(count)
+
+    started = time.time()
+    futures = [executor.submit(service.get_account, 'token')
+               for _ in range(count)]
+    threads = len(os.listdir('/proc/self/task'))
+    errors = 0
+    for future in futures:
+        if future.exception() is not None:
+            errors += 1
+    elapsed = time.time() - started
+
+    print(json.dumps({
+        'mode': mode,
+        'executor': type(executor).__name__,
+        'elapsed': elapsed,
+        'errors': errors,
+        'os_threads': threads,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }))
+
+
+def run(mode, url, args):
+    command = [
+        sys.executable, __file__, '--mode', mode, '--url', url,
+        '--lookups', str(args.lookups), '--in-flight', str(args.in_flight)]
+    try:
+        output = subprocess.check_output(command)
+    except subprocess.CalledProcessError as error:
+        return {'mode': mode, 'failed': error.returncode}
+    return json.loads(output.decode('utf8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--in-flight', type=int, default=64)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        lookups(args.mode, args.url, args.lookups, args.in_flight)
+        return
+
+    url = serve(args.latency)
+    print('%d lookups, %.0fms latency, %d in flight' % (
+        args.lookups, args.latency * 1000, args.in_flight))
+    print('%-9s %-19s %8s %10s %8s %11s %7s' % (
+        'mode', 'executor', 'time (s)', 'lookups/s', 'threads', 'max RSS MB',
+        'errors'))
+    for mode in args.modes:
+        result = run(mode, url, args)
+        if 'failed' in result:
+            print('%-9s failed (exit status %d)' % (mode, result['failed']))
+            continue
+        print('%-9s %-19s %8.2f %10.0f %8d %11.1f %7d' % (
+            mode, result['executor'], result['elapsed'],
+            args.lookups / result['elapsed'], result['os_threads'],
+            result['max_rss_kb'] / 1024.0, result['errors']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""Compare `sitewit.serialization` with pickle and JSON.
+
+Encodes and decodes a list of synthetic subscriptions and one of accounts,
+and prints the payload size and the time per object for each format::
+
+    python benchmarks/serialization.py --count 10000
+
+Needs a sitewit config (`yoconfig`) to be importable, as the models are.
+"""
+import argparse
+import json
+import pickle
+import timeit
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sitewit import serialization
+from sitewit.models import Account, Subscription, User
+
+
+def make_subscriptions(count):
+    currencies = ('USD', 'EUR', 'GBP')
+    return [
+        Subscription.from_fields(
+            site_id=uuid.uuid4().hex,
+            url='http://site-%d.example.com' % (i // 2),
+            ad_spend=Decimal('%d.00' % (50 * (i % 5 + 1))),
+            price=Decimal('%d.99' % (i % 3 + 9)),
+            campaign_id=str(100000 + i),
+            currency=currencies[i % 3],
+            expiry_date=date(2026, 1, 1) + timedelta(days=i % 60))
+        for i in range(count)]
+
+
+def make_accounts(count):
+    return [
+        Account.from_fields(
+            id=200000 + i,
+            token=uuid.uuid4().hex,
+            status='Active',
+            url='http://site-%d.example.com' % i,
+            site_id=uuid.uuid4().hex,
+            currency='USD',
+            country_code='US',
+            is_stale=False,
+            user=User('User %d' % i, 'user%d@example.com' % i,
+                      uuid.uuid4().hex))
+        for i in range(count)]
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, User):
+        return vars(value)
+    raise TypeError(value)
+
+
+def json_dumps(objects):
+    return json.dumps(
+        [vars(obj) for obj in objects], default=_default,
+        separators=(',', ':')).encode('utf8')
+
+
+def json_loads_subscriptions(data):
+    return [
+        Subscription.from_fields(
+            site_id=item['site_id'],
+            url=item['url'],
+            ad_spend=Decimal(item['ad_spend']),
+            price=Decimal(item['price']),
+            campaign_id=item['campaign_id'],
+            currency=item['currency'],
+            expiry_date=date(*map(int, item['expiry_date'].split('-'))))
+        for item in json.loads(data.decode('utf8'))]
+
+
+def json_loads_accounts(data):
+    accounts = []
+    for item in json.loads(data.decode('utf8')):
+        user = item.pop('user')
+        item['user'] = user and User(**user)
+        accounts.append(Account.from_fields(**item))
+    return accounts
+
+
+def run(name, objects, json_loads, repeat):
+    formats = (
+        ('pickle', lambda objs: pickle.dumps(objs, pickle.HIGHEST_PROTOCOL),
+         pickle.loads),
+        ('json', json_dumps, json_loads),
+        ('sitewit', serialization.dumps_many, serialization.loads_many),
+    )
+    print('%s (%d objects)' % (name, len(objects)))
+    print('  %-8s %12s %14s %14s' % (
+        'format', 'bytes', 'encode us/obj', 'decode us/obj'))
+    for label, dumps, loads in formats:
+        data = dumps(objects)
+        encode = min(timeit.repeat(
+            lambda: dumps(objects), number=1, repeat=repeat))
+        decode = min(timeit.repeat(
+            lambda: loads(data), number=1, repeat=repeat))
+        print('  %-8s %12d %14.2f %14.2f' % (
+            label, len(data), encode * 1e6 / len(objects),
+            decode * 1e6 / len(objects)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    run('Subscriptions', make_subscriptions(args.count),
+        json_loads_subscriptions, args.repeat)
+    run('Accounts', make_accounts(args.count), json_loads_accounts,
+        args.repeat)
+
+
+if __name__ == '__main__':
+    main()
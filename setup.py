@@ -28,7 +28,12 @@ setup(
     ],
     install_requires=[
         'demands >= 4.0.0, < 6.0.0',
+        'futures < 4.0.0; python_version < "3"',
         'python-dateutil < 3.0.0',
         'yoconfig < 0.3.0'
-    ]
+    ],
+    extras_require={
+        # Lets urllib3 decode (and us ask for) brotli-compressed responses.
+        'brotli': ['brotli'],
+    }
 )
@@ -1,4 +1,4 @@
 """Python client for the SiteWit API."""
 
-__version__ = '0.12.0'
+__version__ = '0.13.0'
 __url__ = 'https://github.com/yola/sitewit'
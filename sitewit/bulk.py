@@ -0,0 +1,97 @@
+"""Running one service method over many accounts concurrently."""
+import time
+from collections import namedtuple
+
+from sitewit.concurrency import KeyedExecutor
+from sitewit.constants import RequestPriorities
+
+try:
+    from queue import Queue
+except ImportError:  # Python 2
+    from Queue import Queue
+
+BulkResult = namedtuple('BulkResult', ('spec', 'result', 'error'))
+
+
+class BulkStats(namedtuple(
+        'BulkStats', ('succeeded', 'failed', 'elapsed'))):
+    @property
+    def total(self):
+        return self.succeeded + self.failed
+
+    @property
+    def throughput(self):
+        """Completed calls per second."""
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+
+def _account_token(spec):
+    if isinstance(spec, dict):
+        return spec['account_token']
+    return spec[0]
+
+
+class BulkOperation(object):
+    """Call a `SitewitService` method once per spec, concurrently.
+
+    Each spec holds the method arguments, either as a tuple of positional
+    arguments starting with `account_token` or as a dict of keyword
+    arguments. Specs for different accounts run in parallel, at most
+    `max_concurrency` at a time; specs for the same account run one after
+    another, in the order given. All calls run with background priority.
+
+    Iterating yields a BulkResult as each call completes. Failed calls carry
+    the exception in `error` instead of raising. Once iteration is over,
+    `stats` holds the aggregate counts and throughput.
+
+    Example::
+
+        operation = service.bulk('cancel_search_campaign_subscription', [
+            (account_token, campaign_id) for ... in churned])
+        for result in operation:
+            if result.error:
+                ...
+        print(operation.stats.throughput)
+
+    """
+
+    def __init__(self, service, method, specs, max_concurrency=8):
+        self._service = service
+        self._call = getattr(service, method)
+        self._specs = specs
+        self._max_concurrency = max_concurrency
+        self.stats = None
+
+    def __iter__(self):
+        started = time.time()
+        succeeded = failed = submitted = 0
+        results = Queue()
+        executor = KeyedExecutor(self._max_concurrency)
+        try:
+            for spec in self._specs:
+                future = executor.submit(_account_token(spec), self._run, spec)
+                future.add_done_callback(lambda future: results.put(
+                    future.result()))
+                submitted += 1
+
+            for _ in range(submitted):
+                result = results.get()
+                if result.error is None:
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield result
+        finally:
+            executor.shutdown(wait=False)
+            self.stats = BulkStats(succeeded, failed, time.time() - started)
+
+    def _run(self, spec):
+        try:
+            with self._service.priority(RequestPriorities.BACKGROUND):
+                if isinstance(spec, dict):
+                    result = self._call(**spec)
+                else:
+                    result = self._call(*spec)
+        except Exception as error:
+            return BulkResult(spec, None, error)
+        return BulkResult(spec, result, None)
@@ -0,0 +1,285 @@
+"""Caching of SiteWit read calls."""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, TimeoutError
+
+from demands import HTTPServiceError
+from requests import RequestException
+
+from sitewit.concurrency import make_executor
+
+CacheEntry = namedtuple('CacheEntry', ('value', 'stored_at'))
+
+# Bump when the way values are stored changes; entries written in another
+# format are treated as missing.
+FORMAT_VERSION = 1
+_COMPRESS_ABOVE = 512
+_PRUNE_EVERY = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    value BLOB NOT NULL
+)
+"""
+
+
+def _is_unavailable(error):
+    """Whether an error means SiteWit is down rather than saying no."""
+    if isinstance(error, HTTPServiceError):
+        status_code = error.response.status_code
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, (RequestException, TimeoutError))
+
+
+class CachedResponse(dict):
+    """Response json served through a `ReadCache`.
+
+    `is_stale` is True when the data is older than the cache's soft TTL,
+    e.g. because SiteWit could not be reached to refresh it.
+    """
+
+    def __init__(self, data, is_stale=False):
+        super(CachedResponse, self).__init__(data)
+        self.is_stale = is_stale
+
+
+class CachedList(list):
+    """`CachedResponse` of an endpoint answering with a list."""
+
+    def __init__(self, data, is_stale=False):
+        super(CachedList, self).__init__(data)
+        self.is_stale = is_stale
+
+
+class MemoryCache(object):
+    """Thread-safe LRU store holding at most `max_entries` entries."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the CacheEntry stored for `key`, or None."""
+        with self._lock:
+            item = self._entries.pop(key, None)
+            if item is None:
+                return None
+            entry, expires_at = item
+            if time.time() >= expires_at:
+                return None
+            self._entries[key] = item
+            return entry
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries.pop(key, None)
+            now = time.time()
+            self._entries[key] = (CacheEntry(value, now), now + ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def _key(key):
+    return json.dumps(key, separators=(',', ':'))
+
+
+def _serialize(value):
+    data = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    if len(data) > _COMPRESS_ABOVE:
+        return b'z' + zlib.compress(data)
+    return b'j' + data
+
+
+def _deserialize(blob):
+    blob = bytes(blob)
+    if blob[:1] == b'z':
+        return json.loads(zlib.decompress(blob[1:]).decode('utf-8'))
+    return json.loads(blob[1:].decode('utf-8'))
+
+
+class SqliteCache(object):
+    """Store shared by all processes on a host, in an SQLite file.
+
+    Has the same interface as `MemoryCache`, so it can back a `ReadCache`;
+    values must be JSON-serializable. The file is in WAL mode, so readers
+    in any number of processes don't block each other or the writer.
+
+    Example::
+
+        service = SitewitService(read_cache={
+            'backend': SqliteCache('/var/cache/sitewit.sqlite')})
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._sets = 0
+        with self._connection() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(_SCHEMA)
+
+    def get(self, key):
+        """Return the CacheEntry stored for `key`, or None."""
+        row = self._connection().execute(
+            'SELECT stored_at, value FROM entries '
+            'WHERE key = ? AND version = ? AND expires_at > ?',
+            (_key(key), FORMAT_VERSION, time.time())).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(_deserialize(row[1]), row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO entries '
+                '(key, version, stored_at, expires_at, value) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (_key(key), FORMAT_VERSION, now, now + ttl,
+                 sqlite3.Binary(_serialize(value))))
+            self._sets += 1
+            if self._sets % _PRUNE_EVERY == 0:
+                connection.execute(
+                    'DELETE FROM entries WHERE expires_at <= ?', (now,))
+
+    def delete(self, key):
+        with self._connection() as connection:
+            connection.execute(
+                'DELETE FROM entries WHERE key = ?', (_key(key),))
+
+    def _connection(self):
+        # One connection per thread, and a new one after a fork: sqlite
+        # connections must not cross either.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+class ReadCache(object):
+    """Stale-while-revalidate and stale-if-error policy for read calls.
+
+    Depending on the age of the cached value:
+
+    * younger than `soft_ttl`: served as is;
+    * up to `revalidate_window` seconds past `soft_ttl`: served as stale
+      while it is refreshed in the background;
+    * older, but younger than `hard_ttl`: refreshed in the foreground, but
+      if SiteWit errors out (connection error, 429, 5xx) or does not answer
+      within `timeout` seconds, served as stale instead;
+    * older than `hard_ttl`: dropped.
+
+    Example::
+
+        service = SitewitService(read_cache=ReadCache(soft_ttl=60))
+        account = Account.get(account_token)
+        if account.is_stale:
+            ...
+
+    """
+
+    def __init__(self, backend=None, soft_ttl=60, revalidate_window=300,
+                 hard_ttl=3600, timeout=5, max_workers=4):
+        if not soft_ttl <= soft_ttl + revalidate_window <= hard_ttl:
+            raise ValueError('soft_ttl + revalidate_window must not exceed '
+                             'hard_ttl')
+
+        self.backend = backend or MemoryCache()
+        self.soft_ttl = soft_ttl
+        self.revalidate_window = revalidate_window
+        self.hard_ttl = hard_ttl
+        self.timeout = timeout
+        self._executor = make_executor(max_workers)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        # [generation, loads running] of keys being loaded; `invalidate()`
+        # bumps the generation.
+        self._generations = {}
+
+    def fetch(self, key, loader):
+        """Return `(value, is_stale)` for `key`, calling `loader` if needed.
+
+        Raises:
+            Whatever `loader` raises, unless a stale value can stand in.
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            return self._refresh(key, loader, background=False).result(), False
+
+        age = time.time() - entry.stored_at
+        if age < self.soft_ttl:
+            return entry.value, False
+
+        future = self._refresh(key, loader)
+        if age < self.soft_ttl + self.revalidate_window:
+            return entry.value, True
+
+        try:
+            return future.result(timeout=self.timeout), False
+        except Exception as error:
+            if _is_unavailable(error):
+                return entry.value, True
+            raise
+
+    def invalidate(self, key):
+        # A load already under way may have read the data from before the
+        # write: it must neither be stored nor be joined by later fetches.
+        with self._lock:
+            if key in self._generations:
+                self._generations[key][0] += 1
+            self._in_flight.pop(key, None)
+        self.backend.delete(key)
+
+    def _refresh(self, key, loader, background=True):
+        # Concurrent refreshes of one key share a single loader call.
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future
+            future = self._in_flight[key] = Future()
+
+            loading = self._generations.setdefault(key, [0, 0])
+            loading[1] += 1
+            generation = loading[0]
+
+        if background:
+            self._executor.submit(self._load, key, loader, future, generation)
+        else:
+            self._load(key, loader, future, generation)
+        return future
+
+    def _load(self, key, loader, future, generation):
+        try:
+            value = loader()
+        except Exception as error:
+            future.set_exception(error)
+        else:
+            with self._lock:
+                if self._generations[key][0] == generation:
+                    self.backend.set(key, value, self.hard_ttl)
+            future.set_result(value)
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is future:
+                    del self._in_flight[key]
+                loading = self._generations[key]
+                loading[1] -= 1
+                if not loading[1]:
+                    del self._generations[key]
@@ -0,0 +1,209 @@
+"""Recording SiteWit API traffic to cassettes and replaying it offline.
+
+A cassette is a JSON lines file: a header line, then one line per request
+with its response and how long it took. Auth headers are stored as
+digests, so cassettes are safe to share yet still tell accounts apart.
+
+Example::
+
+    service = SitewitService(record_to='slow-audit.jsonl')
+    ...  # reproduce the issue against the real API
+
+    service = SitewitService(replay_from='slow-audit.jsonl', replay_speed=10)
+    ...  # same calls, same responses, no network, 10 times faster
+
+"""
+import base64
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+FORMAT_VERSION = 1
+
+REDACTED_HEADERS = frozenset(
+    ('authorization', 'partnerauth', 'cookie', 'set-cookie'))
+# Describe the wire encoding, not the decoded body we store.
+_DROPPED_RESPONSE_HEADERS = frozenset(
+    ('content-encoding', 'content-length', 'transfer-encoding'))
+
+
+class CassetteError(LookupError):
+    """A replayed request has no recorded counterpart left."""
+
+
+def redact(name, value):
+    """Return `value`, or a digest of it for auth headers."""
+    if isinstance(value, bytes):
+        # Header values may be bytes, which HTTP sends as latin-1.
+        value = value.decode('latin-1')
+    if name.lower() not in REDACTED_HEADERS:
+        return value
+    digest = hashlib.sha256(value.encode('utf8')).hexdigest()[:16]
+    return 'redacted:%s' % digest
+
+
+def _text(body):
+    if body is None:
+        return None, None
+    if not isinstance(body, bytes):
+        return body, 'text'
+    try:
+        return body.decode('utf8'), 'text'
+    except UnicodeDecodeError:
+        return base64.b64encode(body).decode('ascii'), 'base64'
+
+
+def _bytes(text, encoding):
+    if text is None:
+        return b''
+    if encoding == 'base64':
+        return base64.b64decode(text)
+    return text.encode('utf8')
+
+
+def _match_key(method, url, headers, body):
+    auth = sorted((name.lower(), value) for name, value in headers.items()
+                  if name.lower() in REDACTED_HEADERS)
+    return json.dumps([method, url, auth, body])
+
+
+class RecordingAdapter(BaseAdapter):
+    """Transport adapter that records what another adapter sends.
+
+    Every request is sent through `adapter` and appended to the cassette at
+    `path`, together with its (decoded) response and how long it took.
+    Responses are read in full before they are returned.
+    """
+
+    def __init__(self, adapter, path):
+        super(RecordingAdapter, self).__init__()
+        self.adapter = adapter
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._started = None
+
+    def send(self, request, **kwargs):
+        started = time.time()
+        response = self.adapter.send(request, **kwargs)
+        content = response.content
+        elapsed = time.time() - started
+        self._write(request, response, content, started, elapsed)
+        return response
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self.adapter.close()
+
+    def _write(self, request, response, content, started, elapsed):
+        body, body_encoding = _text(request.body)
+        content, content_encoding = _text(content)
+        interaction = {
+            'method': request.method,
+            'url': request.url,
+            'headers': dict((name, redact(name, value))
+                            for name, value in request.headers.items()),
+            'body': body,
+            'body_encoding': body_encoding,
+            'status': response.status_code,
+            'reason': response.reason,
+            'response_headers': dict(
+                (name, redact(name, value))
+                for name, value in response.headers.items()
+                if name.lower() not in _DROPPED_RESPONSE_HEADERS),
+            'content': content,
+            'content_encoding': content_encoding,
+            'elapsed': elapsed,
+        }
+        with self._lock:
+            if self._file is None:
+                self._file = io.open(self.path, 'w', encoding='utf8')
+                self._started = started
+                self._file.write(u'%s\n' % json.dumps(
+                    {'version': FORMAT_VERSION, 'recorded_at': started}))
+            interaction['offset'] = started - self._started
+            self._file.write(u'%s\n' % json.dumps(interaction))
+            self._file.flush()
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter that answers from a cassette, without a network.
+
+    A request gets the next unused recorded response to the same method,
+    URL, body and (redacted) auth headers, after its recorded duration
+    divided by `speed`; `speed=None` answers at once. Calls can come in a
+    different order than recorded, as long as each one was recorded as
+    often as it is replayed.
+
+    Raises:
+        CassetteError: From `send()` when no recorded response is left.
+    """
+
+    def __init__(self, path, speed=1.0):
+        super(ReplayAdapter, self).__init__()
+        self.path = path
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._interactions = defaultdict(deque)
+        with io.open(path, encoding='utf8') as cassette:
+            header = json.loads(cassette.readline())
+            if header.get('version') != FORMAT_VERSION:
+                raise ValueError('Unsupported cassette version: %r' % (
+                    header.get('version'),))
+            for line in cassette:
+                interaction = json.loads(line)
+                key = _match_key(
+                    interaction['method'], interaction['url'],
+                    interaction['headers'], interaction['body'])
+                self._interactions[key].append(interaction)
+
+    @property
+    def remaining(self):
+        """Number of recorded responses not replayed yet."""
+        with self._lock:
+            return sum(len(queue) for queue in self._interactions.values())
+
+    def send(self, request, **kwargs):
+        headers = dict((name, redact(name, value))
+                       for name, value in request.headers.items())
+        key = _match_key(request.method, request.url, headers,
+                         _text(request.body)[0])
+        with self._lock:
+            queue = self._interactions.get(key)
+            if not queue:
+                raise CassetteError('No recorded response left for %s %s' % (
+                    request.method, request.url))
+            interaction = queue.popleft()
+
+        if self.speed:
+            time.sleep(interaction['elapsed'] / self.speed)
+        return self._response(request, interaction)
+
+    def close(self):
+        pass
+
+    def _response(self, request, interaction):
+        response = Response()
+        response.status_code = interaction['status']
+        response.reason = interaction['reason']
+        response.headers = CaseInsensitiveDict(
+            interaction['response_headers'])
+        response._content = _bytes(
+            interaction['content'], interaction['content_encoding'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=interaction['elapsed'])
+        return response
@@ -0,0 +1,133 @@
+"""Write-behind buffering for account updates."""
+import threading
+from concurrent.futures import Future
+
+
+class _PendingUpdate(object):
+    def __init__(self, timer):
+        self.fields = {}
+        self.futures = []
+        self.timer = timer
+
+
+def _propagate(source, futures):
+    error = source.exception()
+    for future in futures:
+        if error is None:
+            future.set_result(source.result())
+        else:
+            future.set_exception(error)
+
+
+class CoalescingAccountUpdater(object):
+    """Merges account updates made within `window` seconds into one PUT.
+
+    The first change for an account starts its window; later changes for the
+    same account are merged into it (the newest value of a field wins), and
+    one `update_account` call with all merged fields is sent when the window
+    ends. PUTs go through `SitewitService.submit()`, so they stay ordered
+    with the other background writes of the account.
+
+    Example::
+
+        updater = CoalescingAccountUpdater(service, window=2)
+        updater.update(account_token, url=new_url)
+        updater.update(account_token, currency='EUR')
+        ...
+        account_data = updater.flush(account_token)  # read-your-writes
+
+    """
+
+    def __init__(self, service, window=2.0):
+        self._service = service
+        self._window = window
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._in_flight = {}
+
+    def update(self, account_token, url=None, country_code=None,
+               currency=None, user_package=None):
+        """Queue changes for an account.
+
+        Args: as for `SitewitService.update_account()`.
+
+        Returns:
+            `concurrent.futures.Future` of the account json returned by the
+            PUT that carries these changes.
+        """
+        fields = {
+            'url': url,
+            'country_code': country_code,
+            'currency': currency,
+            'user_package': user_package,
+        }
+        future = Future()
+
+        with self._lock:
+            pending = self._pending.get(account_token)
+            if pending is None:
+                timer = threading.Timer(
+                    self._window, self._send, (account_token,))
+                timer.daemon = True
+                pending = self._pending[account_token] = _PendingUpdate(timer)
+                timer.start()
+            pending.fields.update(
+                (name, value) for name, value in fields.items()
+                if value is not None)
+            pending.futures.append(future)
+
+        return future
+
+    def flush(self, account_token=None):
+        """Send pending changes now and wait until they are applied.
+
+        Waits for PUTs already sent, too.
+
+        Args:
+            account_token (str, optional): account to flush. Defaults to all
+                accounts with pending or in-flight changes.
+
+        Returns:
+            Account json of the flushed account's last update, or None if
+            all accounts were flushed or nothing was pending or in flight.
+        """
+        if account_token is None:
+            with self._lock:
+                account_tokens = list(self._pending)
+            for token in account_tokens:
+                self._send(token)
+            with self._lock:
+                futures = list(self._in_flight.values())
+            for future in futures:
+                future.exception()
+            return None
+
+        future = self._send(account_token)
+        if future is None:
+            with self._lock:
+                future = self._in_flight.get(account_token)
+        return None if future is None else future.result()
+
+    def _send(self, account_token):
+        # Popping and submitting under one lock means that once the update
+        # left `_pending` its PUT is in `_in_flight`, for `flush()` to see.
+        with self._lock:
+            pending = self._pending.pop(account_token, None)
+            if pending is None:
+                return None
+            pending.timer.cancel()
+            future = self._service.submit(
+                'update_account', account_token, **pending.fields)
+            # PUTs of an account run in order, so its latest is enough.
+            self._in_flight[account_token] = future
+
+        # Outside the lock: callbacks of a finished future run right away.
+        future.add_done_callback(
+            lambda source: self._done(account_token, source, pending.futures))
+        return future
+
+    def _done(self, account_token, source, futures):
+        with self._lock:
+            if self._in_flight.get(account_token) is source:
+                del self._in_flight[account_token]
+        _propagate(source, futures)
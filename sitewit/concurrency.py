@@ -0,0 +1,305 @@
+"""Building blocks shared by the parallel parts of the client."""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from sitewit.constants import RequestPriorities
+from sitewit.green import GreenExecutor, cooperative_library
+
+
+def make_executor(max_workers):
+    """Return the executor used to run SiteWit calls concurrently.
+
+    That is a `GreenExecutor` if gevent or eventlet monkey-patched the
+    process (see `sitewit.green`), and a `ThreadPoolExecutor` otherwise.
+    """
+    if cooperative_library() is not None:
+        return GreenExecutor(max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+class KeyedExecutor(object):
+    """Executor that keeps calls sharing a key in submission order.
+
+    Calls with different keys (e.g. account tokens) run in parallel on up to
+    `max_workers` workers; calls with the same key run strictly one after
+    another, first in first out.
+
+    Example::
+
+        executor = KeyedExecutor(8)
+        executor.submit(account_token, service.update_account, account_token,
+                        url=url)
+        future = executor.submit(account_token, service.set_account_client_id,
+                                 account_token, site_id)
+
+    """
+
+    def __init__(self, max_workers):
+        self._executor = make_executor(max_workers)
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._shutdown = False
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Schedule `fn(*args, **kwargs)` behind earlier calls for `key`.
+
+        Returns:
+            `concurrent.futures.Future` of the call.
+        """
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new calls after shutdown')
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                start = True
+            else:
+                start = False
+            queue.append((future, fn, args, kwargs))
+
+        if start:
+            self._executor.submit(self._run_next, key)
+        return future
+
+    def shutdown(self, wait=True):
+        """Stop accepting calls; calls already submitted still run."""
+        with self._lock:
+            self._shutdown = True
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def _run_next(self, key):
+        while True:
+            with self._lock:
+                future, fn, args, kwargs = self._queues[key][0]
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+            with self._lock:
+                queue = self._queues[key]
+                queue.popleft()
+                if not queue:
+                    del self._queues[key]
+                    return
+
+            # Go to the back of the line so one busy key can't hog a worker,
+            # unless the executor is shutting down: then finish the key here.
+            try:
+                self._executor.submit(self._run_next, key)
+            except RuntimeError:
+                continue
+            return
+
+
+class AdaptiveLimit(object):
+    """Concurrency limit tuned by additive increase, multiplicative decrease.
+
+    Each healthy call made while the limit was in use raises the limit by
+    `1 / limit`, i.e. by about one per round of calls. An unhealthy call
+    (429, 5xx, connection error) or a latency spike (more than
+    `latency_tolerance` times the smoothed latency) multiplies it by
+    `backoff`, at most once per smoothed latency so one burst of errors
+    counts as one congestion signal. The limit stays within
+    `[minimum, maximum]`.
+
+    Not thread-safe on its own; `PriorityGate` records outcomes under its
+    lock.
+    """
+
+    def __init__(self, initial=10, minimum=1, maximum=64, backoff=0.5,
+                 latency_tolerance=2.0, smoothing=0.05, warmup=20):
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError('Expected 1 <= minimum <= initial <= maximum')
+
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.warmup = warmup
+        self.latency = None
+        self._samples = 0
+        self._last_decrease = float('-inf')
+
+    def record(self, latency, healthy, saturated=True):
+        """Adjust the limit for the outcome of one call.
+
+        Args:
+            latency (float): call duration in seconds.
+            healthy (bool): False for 429s, 5xx and connection errors.
+            saturated (bool): whether calls were held back by the limit;
+                the limit only grows while it is actually in use.
+        """
+        spike = (self._samples >= self.warmup and
+                 latency > self.latency_tolerance * self.latency)
+        if healthy:
+            self._samples += 1
+            self.latency = latency if self.latency is None else (
+                self.latency + self.smoothing * (latency - self.latency))
+
+        now = time.time()
+        if not healthy or spike:
+            if now - self._last_decrease >= (self.latency or 0):
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self._last_decrease = now
+        elif saturated:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class PriorityGate(object):
+    """Admission control that lets interactive calls preempt background ones.
+
+    At most `capacity` calls are in flight; `capacity` is either a fixed
+    number or an `AdaptiveLimit` fed with the outcome of every call. The
+    last `reserved` slots are only ever given to interactive calls, and a
+    waiting interactive call is always admitted before any waiting
+    background call. While interactive traffic is present (in flight,
+    waiting or seen within `quiet_period` seconds), background calls are
+    further limited to `busy_background` slots (half of their share by
+    default).
+
+    Example::
+
+        gate = PriorityGate(capacity=AdaptiveLimit(minimum=3), reserved=2)
+        with gate.slot(RequestPriorities.BACKGROUND) as slot:
+            ...
+            slot.healthy = response.status_code < 500
+
+    """
+
+    def __init__(self, capacity=10, reserved=2, busy_background=None,
+                 quiet_period=1.0):
+        self._adaptive = isinstance(capacity, AdaptiveLimit)
+        minimum = capacity.minimum if self._adaptive else capacity
+        if not 0 <= reserved < minimum:
+            raise ValueError('reserved must be between 0 and capacity - 1')
+
+        self._capacity = capacity
+        self.reserved = reserved
+        self._busy_background = busy_background
+        self.quiet_period = quiet_period
+        lock = threading.Lock()
+        # Separate wake-ups, so a release only wakes callers it may admit
+        # rather than every one waiting, which adds up with thousands of
+        # green threads waiting.
+        self._interactive_ready = threading.Condition(lock)
+        self._background_ready = threading.Condition(lock)
+        self._interactive = 0
+        self._background = 0
+        self._interactive_waiting = 0
+        self._last_interactive = float('-inf')
+
+    @property
+    def capacity(self):
+        if self._adaptive:
+            return int(self._capacity.limit)
+        return self._capacity
+
+    @property
+    def busy_background(self):
+        if self._busy_background is None:
+            return max(1, (self.capacity - self.reserved) // 2)
+        return self._busy_background
+
+    def slot(self, priority):
+        """Context manager holding a slot of the given priority.
+
+        Set `healthy` on the returned slot to report the call's outcome to
+        an adaptive capacity; slots left with `healthy = None` are not
+        counted.
+        """
+        return _Slot(self, priority)
+
+    def acquire(self, priority):
+        if priority == RequestPriorities.INTERACTIVE:
+            with self._interactive_ready:
+                self._interactive_waiting += 1
+                try:
+                    while self._in_flight() >= self.capacity:
+                        self._interactive_ready.wait()
+                finally:
+                    self._interactive_waiting -= 1
+                self._interactive += 1
+                self._last_interactive = time.time()
+                # Pass on wake-ups for slots this call didn't take.
+                self._wake()
+        else:
+            with self._background_ready:
+                while not self._background_admissible():
+                    self._background_ready.wait(self._recheck_after())
+                self._background += 1
+
+    def release(self, priority, latency=None, healthy=None):
+        with self._interactive_ready:
+            if self._adaptive and healthy is not None:
+                background_capacity = self.capacity - self.reserved
+                saturated = (self._interactive_waiting or
+                             self._in_flight() >= background_capacity)
+                self._capacity.record(latency, healthy, saturated)
+
+            if priority == RequestPriorities.INTERACTIVE:
+                self._interactive -= 1
+                self._last_interactive = time.time()
+            else:
+                self._background -= 1
+            self._wake()
+
+    def _wake(self):
+        free = self.capacity - self._in_flight()
+        if free <= 0:
+            return
+        if self._interactive_waiting:
+            # Background calls wait for them anyway.
+            self._interactive_ready.notify(free)
+        else:
+            self._background_ready.notify(free)
+
+    def _in_flight(self):
+        return self._interactive + self._background
+
+    def _background_admissible(self):
+        if self._interactive_waiting:
+            return False
+        if self._in_flight() >= self.capacity - self.reserved:
+            return False
+        busy = (self._interactive or
+                time.time() - self._last_interactive < self.quiet_period)
+        return not busy or self._background < self.busy_background
+
+    def _recheck_after(self):
+        # Background limits loosen once interactive traffic has been quiet
+        # for a while, which no release() would signal.
+        quiet_in = self._last_interactive + self.quiet_period - time.time()
+        return max(quiet_in, 0.01) if quiet_in > 0 else None
+
+
+class _Slot(object):
+    def __init__(self, gate, priority):
+        self._gate = gate
+        self._priority = priority
+        self._started = None
+        self.healthy = None
+
+    def __enter__(self):
+        self._gate.acquire(self._priority)
+        self._started = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._gate.release(
+            self._priority, time.time() - self._started, self.healthy)
@@ -12,6 +12,11 @@ class CampaignTypes(object):
     SEARCH = 'search'
 
 
+class RequestPriorities(object):
+    INTERACTIVE = 'interactive'
+    BACKGROUND = 'background'
+
+
 CAMPAIGN_SERVICES = {
     CampaignServiceTypes.QUICKSTART: 'QuickStart Campaign'
 }
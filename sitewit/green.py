@@ -0,0 +1,124 @@
+"""Cooperative mode, for processes monkey-patched by gevent or eventlet.
+
+Once gevent or eventlet patched `threading` (and with it `socket`),
+`SitewitService` calls only block the green thread making them, and the
+client's locks, gates and connection pools are green-thread safe as they
+are. What still misbehaves are OS thread pools, whose C-level queues the
+patching doesn't reach: `concurrency.make_executor()` therefore hands out
+a `GreenExecutor` instead whenever `cooperative_library()` finds the
+process patched. Nothing needs configuring; patch early, as usual::
+
+    from gevent import monkey
+    monkey.patch_all()
+
+    from sitewit.services import SitewitService
+
+"""
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+GEVENT = 'gevent'
+EVENTLET = 'eventlet'
+
+
+def cooperative_library():
+    """Return `GEVENT` or `EVENTLET` if it patched `threading`, else None.
+
+    Only looks at libraries already imported, so it never imports one.
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey is not None and monkey.is_module_patched('threading'):
+        return GEVENT
+    patcher = sys.modules.get('eventlet.patcher')
+    if patcher is not None and patcher.is_monkey_patched('thread'):
+        return EVENTLET
+    return None
+
+
+def _spawner(library):
+    if library == GEVENT:
+        import gevent
+        return gevent.spawn
+    if library == EVENTLET:
+        import eventlet
+        return eventlet.spawn_n
+    raise ValueError('Unknown cooperative library: %r' % (library,))
+
+
+class GreenExecutor(object):
+    """`concurrent.futures` style executor running calls on green threads.
+
+    At most `max_workers` green threads run the submitted calls, first in
+    first out. Like `ThreadPoolExecutor`, and unlike gevent's and
+    eventlet's own pools, `submit()` never blocks, so a running call may
+    submit more. Only use it in a process `library` monkey-patched (see
+    `cooperative_library()`), since futures wait on `threading`
+    primitives.
+
+    Example::
+
+        executor = GreenExecutor(100, GEVENT)
+        futures = [executor.submit(service.get_account, token)
+                   for token in tokens]
+
+    """
+
+    def __init__(self, max_workers, library=None):
+        if max_workers <= 0:
+            raise ValueError('max_workers must be greater than 0')
+        self._spawn = _spawner(library or cooperative_library())
+        self._max_workers = max_workers
+        self._pending = deque()
+        self._workers = 0
+        self._idle = threading.Event()
+        self._idle.set()
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule `fn(*args, **kwargs)`.
+
+        Returns:
+            `concurrent.futures.Future` of the call.
+        """
+        if self._shutdown:
+            raise RuntimeError('cannot schedule new futures after shutdown')
+        future = Future()
+        self._pending.append((future, fn, args, kwargs))
+        # Green threads only switch when they block, so nothing can run
+        # between checking and updating the counts.
+        if self._workers < self._max_workers:
+            self._workers += 1
+            self._idle.clear()
+            self._spawn(self._work)
+        return future
+
+    def shutdown(self, wait=True):
+        """Stop accepting calls; calls already submitted still run."""
+        self._shutdown = True
+        if wait:
+            self._idle.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def _work(self):
+        try:
+            while self._pending:
+                future, fn, args, kwargs = self._pending.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+        finally:
+            self._workers -= 1
+            if not self._workers:
+                self._idle.set()
@@ -0,0 +1,134 @@
+"""Local indexes over subscription sweep results."""
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+
+from sitewit.snapshot import SubscriptionSnapshot, write_snapshot
+
+
+class ExpiryIndex(object):
+    """Subscriptions ordered by expiry date, with lookups by id.
+
+    Subscriptions are keyed by `campaign_id`. Range queries bisect a sorted
+    list of `(expiry ordinal, campaign_id)` pairs, so answering "what expires
+    in the next N days" needs neither a sweep nor a linear scan.
+
+    Example::
+
+        index = ExpiryIndex.load(path)
+        index.sync(Subscription.iter_subscriptions())
+        index.save(path)
+        due = index.expiring_within(3)
+
+    """
+
+    def __init__(self, subscriptions=()):
+        self._subscriptions = {}
+        self._by_site_id = {}
+        for subscription in subscriptions:
+            self._subscriptions[subscription.campaign_id] = subscription
+            self._by_site_id.setdefault(
+                subscription.site_id, set()).add(subscription.campaign_id)
+        self._keys = sorted(
+            self._key(subscription)
+            for subscription in self._subscriptions.values())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        """Iterate over subscriptions in expiry order."""
+        for _, campaign_id in self._keys:
+            yield self._subscriptions[campaign_id]
+
+    @classmethod
+    def load(cls, path):
+        """Load an index saved with `ExpiryIndex.save()`.
+
+        Args:
+            path (str): snapshot file path.
+
+        Returns:
+            Instance of ExpiryIndex class.
+        """
+        with SubscriptionSnapshot(path) as snapshot:
+            return cls(snapshot)
+
+    def save(self, path):
+        """Persist the index as a subscription snapshot in expiry order."""
+        write_snapshot(path, self)
+
+    def add(self, subscription):
+        """Add a subscription, replacing any with the same `campaign_id`."""
+        self.remove(subscription.campaign_id)
+        self._subscriptions[subscription.campaign_id] = subscription
+        self._by_site_id.setdefault(
+            subscription.site_id, set()).add(subscription.campaign_id)
+        insort(self._keys, self._key(subscription))
+
+    def remove(self, campaign_id):
+        """Remove a subscription by campaign ID, if it is indexed."""
+        subscription = self._subscriptions.pop(campaign_id, None)
+        if subscription is None:
+            return
+
+        del self._keys[bisect_left(self._keys, self._key(subscription))]
+        campaign_ids = self._by_site_id[subscription.site_id]
+        campaign_ids.discard(campaign_id)
+        if not campaign_ids:
+            del self._by_site_id[subscription.site_id]
+
+    def sync(self, subscriptions):
+        """Bring the index up to date with the results of a new sweep.
+
+        Only subscriptions whose fields changed are re-indexed; those missing
+        from the sweep are dropped.
+
+        Args:
+            subscriptions (iterable): e.g. `Subscription.iter_subscriptions()`.
+        """
+        seen = set()
+        for subscription in subscriptions:
+            seen.add(subscription.campaign_id)
+            if not self._is_current(subscription):
+                self.add(subscription)
+
+        for campaign_id in set(self._subscriptions) - seen:
+            self.remove(campaign_id)
+
+    def get(self, campaign_id):
+        """Return the subscription for a campaign ID, or None."""
+        return self._subscriptions.get(campaign_id)
+
+    def for_site_id(self, site_id):
+        """Return subscriptions of a site, in expiry order."""
+        subscriptions = [
+            self._subscriptions[campaign_id]
+            for campaign_id in self._by_site_id.get(site_id, ())]
+        return sorted(subscriptions, key=self._key)
+
+    def expiring_between(self, start, end):
+        """Return subscriptions expiring between two dates, inclusive."""
+        low = bisect_left(self._keys, (start.toordinal(),))
+        high = bisect_left(self._keys, (end.toordinal() + 1,))
+        return [self._subscriptions[campaign_id]
+                for _, campaign_id in self._keys[low:high]]
+
+    def expiring_within(self, days, today=None):
+        """Return subscriptions expiring in the next `days` days.
+
+        Args:
+            days (int): size of the window; 0 means today only.
+            today (date, optional): start of the window. Defaults to today.
+        """
+        today = today or date.today()
+        return self.expiring_between(today, today + timedelta(days=days))
+
+    def _is_current(self, subscription):
+        indexed = self._subscriptions.get(subscription.campaign_id)
+        return indexed is not None and all(
+            getattr(indexed, field) == getattr(subscription, field)
+            for field in subscription.FIELDS)
+
+    @staticmethod
+    def _key(subscription):
+        return (subscription.expiry_date.toordinal(), subscription.campaign_id)
@@ -25,6 +25,9 @@ class SiteWitServiceModel(object):
 
 
 class Account(SiteWitServiceModel):
+    FIELDS = ('id', 'token', 'status', 'url', 'site_id', 'currency',
+              'country_code', 'is_stale', 'user')
+
     def __init__(self, account_data, user_data=None):
         self.id = account_data['accountNumber']
         self.token = account_data['token']
@@ -33,6 +36,9 @@ class Account(SiteWitServiceModel):
         self.site_id = account_data['clientId']
         self.currency = account_data['currency']
         self.country_code = account_data['countryCode']
+        # Set when the data came from a read cache and could not be
+        # refreshed in time, see `sitewit.cache.ReadCache`.
+        self.is_stale = getattr(account_data, 'is_stale', False)
 
         if user_data is not None:
             self.user = User(user_data['name'], user_data['email'],
@@ -40,6 +46,14 @@ class Account(SiteWitServiceModel):
         else:
             self.user = None
 
+    @classmethod
+    def from_fields(cls, **fields):
+        """Build an account from already parsed `FIELDS` values."""
+        account = cls.__new__(cls)
+        for name in cls.FIELDS:
+            setattr(account, name, fields[name])
+        return account
+
     @classmethod
     def create(
         cls,
@@ -224,6 +238,9 @@ class Account(SiteWitServiceModel):
 
 
 class Subscription(SiteWitServiceModel):
+    FIELDS = ('site_id', 'url', 'ad_spend', 'price', 'campaign_id',
+              'currency', 'expiry_date')
+
     def __init__(self, site_id, url, data):
         self.site_id = UUID(site_id).hex if site_id else None
         self.url = url
@@ -233,6 +250,14 @@ class Subscription(SiteWitServiceModel):
         self.currency = data['currency']
         self.expiry_date = parse(data['nextCharge']).date()
 
+    @classmethod
+    def from_fields(cls, **fields):
+        """Build a subscription from already parsed `FIELDS` values."""
+        subscription = cls.__new__(cls)
+        for name in cls.FIELDS:
+            setattr(subscription, name, fields[name])
+        return subscription
+
     @classmethod
     def iter_subscriptions(cls):
         """Iterate over all active subscriptions"""
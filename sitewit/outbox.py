@@ -0,0 +1,316 @@
+"""Durable outbox for SiteWit billing mutations."""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from datetime import date
+from decimal import Decimal
+
+from requests import RequestException
+
+from sitewit.concurrency import KeyedExecutor
+from sitewit.constants import RequestPriorities
+from sitewit.routing import never_applied
+from sitewit.services import HTTPServiceError
+
+log = logging.getLogger(__name__)
+
+OUTBOX_METHODS = (
+    'subscribe_to_search_campaign',
+    'subscribe_to_display_campaign',
+    'refill_search_campaign_subscription',
+    'refill_display_campaign_subscription',
+    'cancel_search_campaign_subscription',
+    'cancel_display_campaign_subscription',
+    'refund_search_campaign_subscription',
+    'refund_display_campaign_subscription',
+    'request_quickstart_campaign_service',
+)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    method TEXT NOT NULL,
+    account_token TEXT NOT NULL,
+    arguments TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT,
+    result TEXT
+)
+"""
+
+
+class OutboxStatus(object):
+    PENDING = 'pending'
+    SENDING = 'sending'
+    DONE = 'done'
+    FAILED = 'failed'
+    # The call may or may not have been applied; needs a human to check.
+    UNCERTAIN = 'uncertain'
+
+
+def _encode(value):
+    if isinstance(value, date):
+        return {'__date__': value.toordinal()}
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    raise TypeError('%r is not JSON serializable' % (value,))
+
+
+def _decode(data):
+    if '__date__' in data:
+        return date.fromordinal(data['__date__'])
+    if '__decimal__' in data:
+        return Decimal(data['__decimal__'])
+    return data
+
+
+class Outbox(object):
+    """SQLite journal of billing mutations, drained by a worker pool.
+
+    `enqueue()` only writes the call to the journal, so it returns as fast
+    as a local commit. `drain()` (or `run_forever()`) sends due calls with
+    up to `max_workers` in flight, in order per account, and retries calls
+    SiteWit certainly did not apply (refused connections, 429s) with a
+    growing delay.
+
+    Each call has an idempotency key, and a key is accepted only once, so a
+    retried `enqueue()` never queues the same mutation twice. None of the
+    mutations is safe to send twice (it could subscribe or charge twice),
+    so calls that may have reached SiteWit without a clear answer (read
+    timeouts, broken connections, 5xx responses) are parked as
+    `UNCERTAIN` for a human to check and then `requeue()` or leave. So are
+    calls whose worker died mid-call: a worker claims `max_workers` calls
+    at a time and holds each for `lease` seconds from when it starts
+    sending it; once that runs out the call is marked uncertain. Several
+    processes may drain the same journal.
+
+    Example::
+
+        outbox = Outbox(service, '/var/lib/sitewit/outbox.sqlite')
+        outbox.enqueue('request_quickstart_campaign_service',
+                       (account_token, CampaignServiceTypes.QUICKSTART,
+                        reference_id))
+        outbox.run_forever()
+
+    """
+
+    def __init__(self, service, path, max_workers=4, max_attempts=5,
+                 retry_delay=30, poll_interval=5, lease=300):
+        self._service = service
+        self._path = path
+        self._max_workers = max_workers
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._poll_interval = poll_interval
+        self._lease = lease
+        self._stopped = threading.Event()
+
+        with self._connect() as connection:
+            connection.execute(_SCHEMA)
+
+    def enqueue(self, method, args, kwargs=None, idempotency_key=None):
+        """Journal a mutation to be sent by the workers.
+
+        Args:
+            method (str): one of `OUTBOX_METHODS`.
+            args (tuple): positional arguments, starting with account token.
+            kwargs (dict, optional): keyword arguments.
+            idempotency_key (str, optional): defaults to the `reference_id`
+                of QuickStart requests and to a random key otherwise.
+
+        Returns:
+            The idempotency key of the journaled call.
+        """
+        if method not in OUTBOX_METHODS:
+            raise ValueError('%s is not a billing mutation' % method)
+
+        kwargs = kwargs or {}
+        if idempotency_key is None:
+            if method == 'request_quickstart_campaign_service':
+                idempotency_key = kwargs.get('reference_id') or args[2]
+            else:
+                idempotency_key = uuid.uuid4().hex
+
+        arguments = json.dumps([list(args), kwargs], default=_encode)
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO outbox (idempotency_key, method, '
+                'account_token, arguments, status, next_attempt) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (idempotency_key, method, args[0], arguments,
+                 OutboxStatus.PENDING, time.time()))
+        return idempotency_key
+
+    def status(self, idempotency_key):
+        """Return the status and result/error of a journaled call."""
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT status, result, last_error FROM outbox '
+                'WHERE idempotency_key = ?', (idempotency_key,)).fetchone()
+        if row is None:
+            return None
+        status, result, error = row
+        return status, json.loads(result) if result else None, error
+
+    def uncertain(self):
+        """Return idempotency keys of calls that need a human to check."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                'SELECT idempotency_key FROM outbox WHERE status = ? '
+                'ORDER BY id', (OutboxStatus.UNCERTAIN,)).fetchall()
+        return [key for key, in rows]
+
+    def requeue(self, idempotency_key):
+        """Send an uncertain or failed call again."""
+        with self._connect() as connection:
+            connection.execute(
+                'UPDATE outbox SET status = ?, attempts = 0, next_attempt = ? '
+                'WHERE idempotency_key = ? AND status IN (?, ?)',
+                (OutboxStatus.PENDING, time.time(), idempotency_key,
+                 OutboxStatus.UNCERTAIN, OutboxStatus.FAILED))
+
+    def drain(self, now=None):
+        """Send every due call once, concurrently, and wait for them.
+
+        Returns:
+            Number of calls sent.
+        """
+        now = time.time() if now is None else now
+        sent = 0
+        last_id = 0
+        # Claiming a batch at a time keeps claimed calls from waiting in
+        # the pool for longer than their lease.
+        while True:
+            rows = self._claim_due(now, last_id)
+            if not rows:
+                return sent
+            with KeyedExecutor(self._max_workers) as executor:
+                for row in rows:
+                    executor.submit(row[3], self._send, row)
+            sent += len(rows)
+            last_id = rows[-1][0]
+
+    def run_forever(self):
+        """Drain the outbox repeatedly, until `stop()`."""
+        while not self._stopped.is_set():
+            if not self.drain():
+                self._stopped.wait(self._poll_interval)
+
+    def stop(self):
+        self._stopped.set()
+
+    def _connect(self):
+        # One connection per operation keeps the outbox usable from any
+        # thread or process; sqlite serializes the writes.
+        connection = sqlite3.connect(self._path, timeout=30)
+        return _Transaction(connection)
+
+    def _recover(self, now):
+        # A call still marked as sending after its lease ran out belonged to
+        # a worker that died mid-call, maybe after SiteWit applied it.
+        with self._connect() as connection:
+            connection.execute(
+                'UPDATE outbox SET status = ? '
+                'WHERE status = ? AND next_attempt <= ?',
+                (OutboxStatus.UNCERTAIN, OutboxStatus.SENDING, now))
+
+    def _claim_due(self, now, after_id=0):
+        self._recover(now)
+        with self._connect() as connection:
+            rows = connection.execute(
+                'SELECT id, method, arguments, account_token, attempts '
+                'FROM outbox WHERE status = ? AND next_attempt <= ? '
+                'AND id > ? ORDER BY id LIMIT ?',
+                (OutboxStatus.PENDING, now, after_id,
+                 self._max_workers)).fetchall()
+            claimed = []
+            for row in rows:
+                cursor = connection.execute(
+                    'UPDATE outbox SET status = ?, next_attempt = ? '
+                    'WHERE id = ? AND status = ?',
+                    (OutboxStatus.SENDING, now + self._lease, row[0],
+                     OutboxStatus.PENDING))
+                if cursor.rowcount:
+                    claimed.append(row)
+        return claimed
+
+    def _start_lease(self, row_id):
+        # Calls of one account wait for each other, so the lease starts
+        # again when the call is actually sent.
+        with self._connect() as connection:
+            cursor = connection.execute(
+                'UPDATE outbox SET next_attempt = ? '
+                'WHERE id = ? AND status = ?',
+                (time.time() + self._lease, row_id, OutboxStatus.SENDING))
+            return bool(cursor.rowcount)
+
+    def _send(self, row):
+        row_id, method, arguments, _, attempts = row
+        args, kwargs = json.loads(arguments, object_hook=_decode)
+        if not self._start_lease(row_id):
+            return  # Taken from us as uncertain; don't send it now.
+
+        try:
+            with self._service.priority(RequestPriorities.BACKGROUND):
+                result = getattr(self._service, method)(*args, **kwargs)
+        except HTTPServiceError as error:
+            status_code = error.response.status_code
+            if status_code < 500 and status_code != 429:
+                self._finish(row_id, OutboxStatus.FAILED, error=error)
+            else:
+                self._retry(row_id, method, attempts, error)
+        except RequestException as error:
+            self._retry(row_id, method, attempts, error)
+        except Exception as error:
+            # e.g. an unparsable response: the call may have been applied.
+            self._finish(row_id, OutboxStatus.UNCERTAIN, error=error)
+        else:
+            self._finish(row_id, OutboxStatus.DONE, result=result)
+
+    def _retry(self, row_id, method, attempts, error):
+        log.warning('Outbox call %s failed: %s', method, error)
+        if not never_applied(error):
+            status = OutboxStatus.UNCERTAIN
+        elif attempts + 1 >= self._max_attempts:
+            status = OutboxStatus.FAILED
+        else:
+            status = OutboxStatus.PENDING
+
+        with self._connect() as connection:
+            connection.execute(
+                'UPDATE outbox SET status = ?, attempts = ?, '
+                'next_attempt = ?, last_error = ? WHERE id = ?',
+                (status, attempts + 1,
+                 time.time() + self._retry_delay * 2 ** attempts,
+                 str(error), row_id))
+
+    def _finish(self, row_id, status, result=None, error=None):
+        with self._connect() as connection:
+            connection.execute(
+                'UPDATE outbox SET status = ?, attempts = attempts + 1, '
+                'result = ?, last_error = ? WHERE id = ?',
+                (status, json.dumps(result) if result is not None else None,
+                 str(error) if error is not None else None, row_id))
+
+
+class _Transaction(object):
+    """Commits (or rolls back) and closes a connection on exit."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __enter__(self):
+        return self._connection
+
+    def __exit__(self, exc_type, *exc_info):
+        with closing(self._connection):
+            if exc_type is None:
+                self._connection.commit()
+            else:
+                self._connection.rollback()
@@ -0,0 +1,144 @@
+"""Queueing several service calls and running them concurrently."""
+from concurrent.futures import Future, wait
+
+from demands import HTTPServiceClient
+
+# Service methods that run or schedule other calls rather than call SiteWit.
+_NOT_PIPELINED = frozenset(('bulk', 'pipeline', 'priority', 'submit'))
+
+
+class PipelineError(RuntimeError):
+    """A pipelined call's result was asked for before the pipeline ran."""
+
+
+class PipelinedFuture(Future):
+    """`Future` of a call queued on a `Pipeline`.
+
+    Its result is available once the pipeline ran, i.e. after the `with`
+    block; asking for it earlier raises `PipelineError` rather than wait
+    forever.
+    """
+
+    def __init__(self, pipeline):
+        super(PipelinedFuture, self).__init__()
+        self._pipeline = pipeline
+
+    def result(self, timeout=None):
+        self._check_executed()
+        return super(PipelinedFuture, self).result(timeout)
+
+    def exception(self, timeout=None):
+        self._check_executed()
+        return super(PipelinedFuture, self).exception(timeout)
+
+    def _check_executed(self):
+        if not self._pipeline.executed and not self.done():
+            raise PipelineError('The pipeline has not run yet')
+
+
+class Pipeline(object):
+    """Queues `SitewitService` calls, then runs them all at once.
+
+    Any SiteWit API method of the service called on the pipeline is queued
+    instead of run, and returns a `PipelinedFuture`; other attributes, such
+    as `bulk()` or requests' session methods, aren't available on it. On
+    leaving the `with` block, the calls run concurrently, so the block
+    takes as long as its slowest call rather than the sum of them. One call
+    runs on the calling thread, the others on the service's
+    `pipeline_executor`, all with the caller's priority. A failed call sets
+    its future's exception; it doesn't affect the others. If the block
+    raises, the queued calls are cancelled.
+
+    Example::
+
+        with service.pipeline() as pipeline:
+            account = pipeline.get_account(account_token)
+            campaigns = pipeline.list_campaigns(account_token)
+            owners = pipeline.get_account_owners(account_token)
+        render(account.result(), campaigns.result(), owners.result())
+
+    """
+
+    def __init__(self, service, executor):
+        self._service = service
+        self._executor = executor
+        self._calls = []
+        self.executed = False
+
+    def __getattr__(self, name):
+        if not self._is_api_method(name):
+            raise AttributeError('%r can not be pipelined' % name)
+        method = getattr(self._service, name)
+
+        def queue(*args, **kwargs):
+            return self.queue(method, *args, **kwargs)
+        return queue
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+        else:
+            self.cancel()
+
+    def queue(self, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)`.
+
+        Returns:
+            `PipelinedFuture` of the call.
+        """
+        if self.executed:
+            raise PipelineError('The pipeline already ran')
+        future = PipelinedFuture(self)
+        self._calls.append((future, fn, args, kwargs))
+        return future
+
+    def execute(self):
+        """Run the queued calls concurrently and wait for all of them.
+
+        Returns:
+            List of the calls' futures, in the order they were queued.
+        """
+        if self.executed:
+            raise PipelineError('The pipeline already ran')
+        self.executed = True
+        calls, self._calls = self._calls, []
+        priority = self._service.current_priority
+        submitted = [
+            self._executor.submit(self._run, priority, call)
+            for call in calls[1:]]
+        if calls:
+            self._run(priority, calls[0])
+        wait(submitted)
+        return [future for future, _, _, _ in calls]
+
+    def cancel(self):
+        """Drop the queued calls, cancelling their futures."""
+        self.executed = True
+        calls, self._calls = self._calls, []
+        for future, _, _, _ in calls:
+            future.cancel()
+
+    def _is_api_method(self, name):
+        attribute = getattr(type(self._service), name, None)
+        return (
+            not name.startswith('_') and name not in _NOT_PIPELINED and
+            callable(attribute) and not hasattr(HTTPServiceClient, name))
+
+    def _run(self, priority, call):
+        future, fn, args, kwargs = call
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            with self._service.priority(priority):
+                result = fn(*args, **kwargs)
+        except Exception as error:
+            future.set_exception(error)
+        except BaseException as error:
+            # E.g. KeyboardInterrupt: fail the call, but don't swallow it.
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
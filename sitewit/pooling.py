@@ -0,0 +1,253 @@
+"""Keep-alive connection pooling with pre-warming, idle reaping and stats."""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from requests import Request
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.poolmanager import PoolManager
+
+log = logging.getLogger(__name__)
+
+
+class PoolStats(namedtuple('PoolStats', (
+        'checkouts', 'new_connections', 'prewarmed', 'reaped', 'wait_time',
+        'max_wait_time'))):
+    """Connection pool counters, see `KeepAliveAdapter.stats`.
+
+    `checkouts` counts connections taken from the pool for a request, of
+    which `new_connections` had to connect first; `wait_time` is the total
+    time spent waiting for a free connection.
+    """
+
+    @property
+    def reused_connections(self):
+        return self.checkouts - self.new_connections
+
+    @property
+    def mean_wait_time(self):
+        return self.wait_time / self.checkouts if self.checkouts else 0.0
+
+
+class _Counters(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = self.new_connections = self.prewarmed = 0
+        self.reaped = 0
+        self.wait_time = self.max_wait_time = 0.0
+
+    def checkout(self, waited, new):
+        with self.lock:
+            self.checkouts += 1
+            self.new_connections += new
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+
+    def add(self, name, count):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + count)
+
+    def snapshot(self):
+        with self.lock:
+            return PoolStats(
+                self.checkouts, self.new_connections, self.prewarmed,
+                self.reaped, self.wait_time, self.max_wait_time)
+
+
+class _InstrumentedPool(object):
+    counters = None
+    idle_timeout = None
+
+    def _get_conn(self, timeout=None):
+        started = time.time()
+        conn = super(_InstrumentedPool, self)._get_conn(timeout)
+        if self._idle_too_long(conn, time.time()):
+            conn.close()
+            self.counters.add('reaped', 1)
+        self.counters.checkout(
+            time.time() - started, getattr(conn, 'sock', None) is None)
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.sitewit_idle_since = time.time()
+        super(_InstrumentedPool, self)._put_conn(conn)
+
+    def prewarm(self, connections):
+        """Open up to `connections` connections and leave them pooled."""
+        taken = []
+        try:
+            for _ in range(connections):
+                conn = super(_InstrumentedPool, self)._get_conn()
+                taken.append(conn)
+                if getattr(conn, 'sock', None) is None:
+                    conn.connect()
+                    self.counters.add('prewarmed', 1)
+        finally:
+            for conn in taken:
+                self._put_conn(conn)
+
+    def reap_idle(self, now):
+        """Close pooled connections idle for longer than `idle_timeout`."""
+        queue = self.pool
+        if queue is None:
+            return
+        idle = []
+        with queue.mutex:
+            # Swap them for empty slots before closing, so no request can
+            # take one out of the pool in the meantime.
+            for index, conn in enumerate(queue.queue):
+                if self._idle_too_long(conn, now):
+                    idle.append(conn)
+                    queue.queue[index] = None
+        for conn in idle:
+            conn.close()
+        self.counters.add('reaped', len(idle))
+
+    def _idle_too_long(self, conn, now):
+        idle_since = getattr(conn, 'sitewit_idle_since', None)
+        return (self.idle_timeout is not None and idle_since is not None and
+                getattr(conn, 'sock', None) is not None and
+                now - idle_since > self.idle_timeout)
+
+
+class _HTTPConnectionPool(_InstrumentedPool, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSConnectionPool(_InstrumentedPool, HTTPSConnectionPool):
+    pass
+
+
+class _PoolManager(PoolManager):
+    def __init__(self, counters, idle_timeout, *args, **kwargs):
+        super(_PoolManager, self).__init__(*args, **kwargs)
+        self.pool_classes_by_scheme = {
+            'http': _HTTPConnectionPool,
+            'https': _HTTPSConnectionPool,
+        }
+        self._counters = counters
+        self._idle_timeout = idle_timeout
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super(_PoolManager, self)._new_pool(
+            scheme, host, port, request_context=request_context)
+        pool.counters = self._counters
+        pool.idle_timeout = self._idle_timeout
+        return pool
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """`HTTPAdapter` that can pre-open connections and close idle ones.
+
+    Connections that sat in the pool for more than `idle_timeout` seconds
+    are closed, both by a background reaper and when they are taken out of
+    the pool, so a request never goes out on a connection the server is
+    about to drop. Set it a bit below the server's keep-alive timeout.
+
+    Example::
+
+        adapter = KeepAliveAdapter(pool_maxsize=16, idle_timeout=50)
+        session.mount('https://', adapter)
+        adapter.prewarm('https://api.sitewit.com/', 4)
+        print(adapter.stats.reused_connections)
+
+    """
+    __attrs__ = HTTPAdapter.__attrs__ + ['_idle_timeout']
+
+    def __init__(self, idle_timeout=None, **kwargs):
+        self._counters = _Counters()
+        self._idle_timeout = idle_timeout
+        self._reaper = None
+        self._reaper_lock = threading.Lock()
+        super(KeepAliveAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False,
+                         **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _PoolManager(
+            self._counters, self._idle_timeout, num_pools=connections,
+            maxsize=maxsize, block=block, **pool_kwargs)
+
+    def __setstate__(self, state):
+        # `HTTPAdapter` pickles its config only; rebuild the rest.
+        self._counters = _Counters()
+        self._reaper = None
+        self._reaper_lock = threading.Lock()
+        super(KeepAliveAdapter, self).__setstate__(state)
+
+    @property
+    def stats(self):
+        """`PoolStats` across all hosts this adapter talked to."""
+        return self._counters.snapshot()
+
+    def prewarm(self, url, connections, verify=True):
+        """Open `connections` keep-alive connections to `url`'s host.
+
+        `verify` must be what requests will be sent with (see
+        `Session.merge_environment_settings()`), since pools are per TLS
+        setting. Failures (e.g. DNS) are logged, not raised: the requests
+        will connect on their own.
+
+        Returns:
+            Number of connections opened.
+        """
+        before = self._counters.snapshot().prewarmed
+        try:
+            self._pool_for(url, verify).prewarm(connections)
+        except Exception as error:
+            log.warning('Could not pre-open connections to %s: %s',
+                        url, error)
+        self._start_reaper()
+        return self._counters.snapshot().prewarmed - before
+
+    def send(self, request, *args, **kwargs):
+        self._start_reaper()
+        return super(KeepAliveAdapter, self).send(request, *args, **kwargs)
+
+    def close(self):
+        with self._reaper_lock:
+            self._reaper, reaper = None, self._reaper
+        if reaper is not None:
+            reaper.set()
+        super(KeepAliveAdapter, self).close()
+
+    def reap_idle(self):
+        """Close connections idle for longer than `idle_timeout`."""
+        now = time.time()
+        for pool in self.pools():
+            pool.reap_idle(now)
+
+    def pools(self):
+        """Return the connection pools currently open, one per host."""
+        pools = self.poolmanager.pools
+        return [pool for pool in (pools.get(key) for key in pools.keys())
+                if pool is not None]
+
+    def _pool_for(self, url, verify):
+        request = Request('GET', url).prepare()
+        if hasattr(self, 'get_connection_with_tls_context'):
+            # requests >= 2.32 keys pools by their TLS settings.
+            return self.get_connection_with_tls_context(request, verify)
+        pool = self.get_connection(url)
+        self.cert_verify(pool, url, verify, None)
+        return pool
+
+    def _start_reaper(self):
+        if self._idle_timeout is None or self._reaper is not None:
+            return
+        with self._reaper_lock:
+            if self._reaper is not None:
+                return
+            stopped = self._reaper = threading.Event()
+        reaper = threading.Thread(target=self._reap_forever, args=(stopped,))
+        reaper.daemon = True
+        reaper.start()
+
+    def _reap_forever(self, stopped):
+        while not stopped.wait(self._idle_timeout / 2.0):
+            self.reap_idle()
@@ -0,0 +1,128 @@
+"""Choosing between several SiteWit API base URLs."""
+import threading
+import time
+from collections import namedtuple
+
+from demands import HTTPServiceError
+from requests.exceptions import ConnectTimeout, ConnectionError
+from urllib3.exceptions import NewConnectionError
+
+EndpointHealth = namedtuple(
+    'EndpointHealth', ('latency', 'error_rate', 'score'))
+
+
+def never_sent(error):
+    """Whether a request failed before reaching the server.
+
+    Only such requests are safe to send elsewhere regardless of method: a
+    connection that broke mid-call may have delivered e.g. a refill.
+    """
+    if isinstance(error, ConnectTimeout):
+        return True
+    if isinstance(error, ConnectionError) and error.args:
+        reason = error.args[0]
+        # urllib3 wraps the connect failure in a MaxRetryError.
+        return isinstance(getattr(reason, 'reason', reason),
+                          NewConnectionError)
+    return False
+
+
+def never_applied(error):
+    """Whether SiteWit certainly did not apply a failed call.
+
+    True for calls that never reached it and for those it turned away as
+    throttled (429), so they can be sent again without applying twice.
+    """
+    if isinstance(error, HTTPServiceError):
+        return error.response.status_code == 429
+    return never_sent(error)
+
+
+class _Health(object):
+    def __init__(self):
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.updated = None
+
+
+class EndpointSelector(object):
+    """Ranks base URLs by an EWMA of their latency and error rate.
+
+    Every call's outcome updates its URL's averages (weight `smoothing`
+    for the newest sample). A URL's score is its average latency plus
+    `error_penalty` seconds times its error rate, and fades away with a
+    half-life of `recovery` seconds while the URL is not used, so an
+    endpoint that failed is tried again once it had time to recover. URLs
+    nobody called yet score 0. Within `tolerance` seconds of the best
+    score, the configured order wins, so traffic stays on the first URL
+    (and its warm connections) while it is healthy rather than chasing
+    small latency differences.
+
+    Example::
+
+        selector = EndpointSelector(['https://us.example.com/',
+                                     'https://eu.example.com/'])
+        for url in selector.ranked():
+            ...
+            selector.record(url, latency, healthy)
+
+    """
+
+    def __init__(self, urls, smoothing=0.2, error_penalty=5.0, recovery=30.0,
+                 tolerance=0.1):
+        if not urls:
+            raise ValueError('At least one URL is needed')
+
+        self.urls = list(urls)
+        self._smoothing = smoothing
+        self._error_penalty = error_penalty
+        self._recovery = recovery
+        self._tolerance = tolerance
+        self._lock = threading.Lock()
+        self._health = dict((url, _Health()) for url in self.urls)
+
+    def ranked(self, now=None):
+        """Return the URLs, the one to use first first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            scores = dict((url, self._score(url, now)) for url in self.urls)
+
+        best = min(scores.values())
+        preferred = next(
+            url for url in self.urls
+            if scores[url] <= best + self._tolerance)
+        rest = sorted(
+            (url for url in self.urls if url != preferred),
+            key=lambda url: (scores[url], self.urls.index(url)))
+        return [preferred] + rest
+
+    def record(self, url, latency, healthy, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            health = self._health[url]
+            if health.updated is None:
+                health.latency = latency
+                health.error_rate = 0.0 if healthy else 1.0
+            else:
+                weight = self._smoothing
+                health.latency += weight * (latency - health.latency)
+                health.error_rate += weight * (
+                    (0.0 if healthy else 1.0) - health.error_rate)
+            health.updated = now
+
+    def snapshot(self, now=None):
+        """Return a dict of URL to `EndpointHealth`."""
+        now = time.time() if now is None else now
+        with self._lock:
+            return dict(
+                (url, EndpointHealth(
+                    health.latency, health.error_rate,
+                    self._score(url, now)))
+                for url, health in self._health.items())
+
+    def _score(self, url, now):
+        health = self._health[url]
+        if health.updated is None:
+            return 0.0
+        score = health.latency + self._error_penalty * health.error_rate
+        return score * 0.5 ** (max(now - health.updated, 0) / self._recovery)
@@ -0,0 +1,292 @@
+"""Just-in-time refills driven by subscription expiry."""
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from calendar import timegm
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sitewit.concurrency import make_executor
+from sitewit.constants import RequestPriorities
+from sitewit.routing import never_applied
+
+log = logging.getLogger(__name__)
+
+_replace = getattr(os, 'replace', os.rename)
+
+RefillJob = namedtuple('RefillJob', (
+    'due', 'campaign_type', 'account_token', 'campaign_id', 'refill_amount',
+    'budget', 'currency', 'expiry_date', 'attempts', 'held', 'sending'))
+
+_AMOUNTS = ('refill_amount', 'budget')
+
+RefillOutcome = namedtuple('RefillOutcome', ('job', 'result', 'error'))
+
+
+def _timestamp(moment):
+    if isinstance(moment, datetime):
+        return timegm(moment.utctimetuple())
+    return moment
+
+
+class RefillScheduler(object):
+    """Priority queue of campaign refills keyed by due time.
+
+    Refills are fired when they fall due. Refills due within the next
+    `batch_window` seconds are pulled into the same burst, which runs at most
+    `max_concurrency` calls at a time. The queue is written to `path`
+    after every change, so pending refills survive restarts. Refills are
+    marked as sending on disk before their calls are made, and removed only
+    after they returned. One interrupted by a crash may have been applied,
+    so on the next start it is held like an ambiguous failure (see below).
+
+    Failed refills stay queued. Those SiteWit certainly did not apply
+    (refused connections, 429s) are retried after `retry_delay` seconds,
+    doubling with every attempt up to `max_retry_delay`. The others (e.g.
+    timeouts, 5xx) may have charged already, so they are held, not fired
+    again, until a human checks and `requeue()`s them; see `held()`.
+
+    Example::
+
+        scheduler = RefillScheduler(service, '/var/lib/sitewit/refills.json')
+        scheduler.schedule_subscription(
+            subscription, account_token, CampaignTypes.SEARCH, 100)
+        scheduler.run_forever()
+
+    """
+
+    def __init__(self, service, path, max_concurrency=4, batch_window=60,
+                 poll_interval=60, retry_delay=60, max_retry_delay=3600):
+        self._service = service
+        self._retry_delay = retry_delay
+        self._max_retry_delay = max_retry_delay
+        self._path = path
+        self._max_concurrency = max_concurrency
+        self._batch_window = batch_window
+        self._poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._counter = itertools.count()
+        self._heap = []
+        self._jobs = {}
+        self._load()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def schedule(self, due, campaign_type, account_token, campaign_id,
+                 refill_amount, budget, currency, expiry_date=None):
+        """Queue a refill, replacing any pending one for the same campaign.
+
+        Args:
+            due (datetime or float): when to fire, as a naive UTC datetime
+                or a UNIX timestamp.
+            campaign_type (str): "search" or "display".
+            account_token, campaign_id, refill_amount, budget, currency,
+                expiry_date: as for
+                `SitewitService.refill_search_campaign_subscription()`.
+
+        Returns:
+            Instance of RefillJob.
+        """
+        job = RefillJob(
+            _timestamp(due), campaign_type, account_token, str(campaign_id),
+            refill_amount, budget, currency, expiry_date, 0, False, False)
+        with self._lock:
+            self._push(job)
+            self._save()
+        self._wakeup.set()
+        return job
+
+    def schedule_subscription(self, subscription, account_token,
+                              campaign_type, refill_amount,
+                              lead_time=timedelta(0), expiry_date=None):
+        """Queue a refill for when a `Subscription` expires.
+
+        The refill is due `lead_time` before the start of the subscription's
+        `expiry_date` (UTC) and reuses its budget and currency.
+        """
+        due = datetime.combine(subscription.expiry_date, datetime.min.time())
+        return self.schedule(
+            due - lead_time, campaign_type, account_token,
+            subscription.campaign_id, refill_amount,
+            subscription.ad_spend, subscription.currency,
+            expiry_date=expiry_date)
+
+    def cancel(self, campaign_type, campaign_id):
+        """Drop the pending refill of a campaign, if any."""
+        with self._lock:
+            if self._jobs.pop((campaign_type, str(campaign_id)), None):
+                self._save()
+
+    def held(self):
+        """Return the refills held after an ambiguous failure."""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.held]
+
+    def requeue(self, campaign_type, campaign_id, due=None):
+        """Fire a held refill again, at `due` or as soon as possible."""
+        with self._lock:
+            job = self._jobs.get((campaign_type, str(campaign_id)))
+            if job is None or not job.held:
+                return
+            self._push(job._replace(
+                due=time.time() if due is None else _timestamp(due),
+                held=False))
+            self._save()
+        self._wakeup.set()
+
+    def next_due(self):
+        """Return the UNIX timestamp of the earliest pending refill."""
+        with self._lock:
+            self._discard_replaced()
+            return self._heap[0][0] if self._heap else None
+
+    def run_pending(self, now=None):
+        """Fire every refill that is due, as one concurrent burst.
+
+        Args:
+            now (float, optional): current UNIX timestamp.
+
+        Returns:
+            List of RefillOutcome, one per fired refill.
+        """
+        now = time.time() if now is None else now
+        batch = self._pop_due(now + self._batch_window)
+        if not batch:
+            return []
+
+        executor = make_executor(min(self._max_concurrency, len(batch)))
+        try:
+            futures = [(job, executor.submit(self._refill, job))
+                       for job in batch]
+            outcomes = []
+            for job, future in futures:
+                error = future.exception()
+                if error is not None:
+                    log.error('Refill of campaign %s failed: %s',
+                              job.campaign_id, error)
+                outcomes.append(RefillOutcome(
+                    job, None if error else future.result(), error))
+        finally:
+            executor.shutdown()
+
+        with self._lock:
+            for job, _, error in outcomes:
+                key = (job.campaign_type, job.campaign_id)
+                if self._jobs.get(key) is not job:
+                    continue  # Rescheduled in the meantime.
+                if error is None:
+                    del self._jobs[key]
+                else:
+                    self._push(self._after_failure(job, error, now))
+            self._save()
+
+        return outcomes
+
+    def run_forever(self):
+        """Sleep until refills fall due and fire them, until `stop()`."""
+        while not self._stopped.is_set():
+            self.run_pending()
+            next_due = self.next_due()
+            timeout = self._poll_interval
+            if next_due is not None:
+                timeout = max(0, min(timeout, next_due - time.time()))
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def _refill(self, job):
+        refill = getattr(self._service, 'refill_%s_campaign_subscription' % (
+            job.campaign_type,))
+        with self._service.priority(RequestPriorities.BACKGROUND):
+            return refill(
+                job.account_token, job.campaign_id, job.refill_amount,
+                job.budget, job.currency, expiry_date=job.expiry_date)
+
+    def _after_failure(self, job, error, now):
+        # Refills must not be sent twice, so only those SiteWit certainly
+        # did not apply are retried.
+        if not never_applied(error):
+            return job._replace(
+                attempts=job.attempts + 1, held=True, sending=False)
+        delay = min(self._retry_delay * 2 ** job.attempts,
+                    self._max_retry_delay)
+        return job._replace(
+            due=now + delay, attempts=job.attempts + 1, sending=False)
+
+    def _push(self, job):
+        self._jobs[(job.campaign_type, job.campaign_id)] = job
+        if not job.held:
+            heapq.heappush(self._heap, (job.due, next(self._counter), job))
+
+    def _pop_due(self, until):
+        # Jobs stay in `_jobs` (and so on disk) until they have been sent,
+        # marked as sending so a restart doesn't fire them again.
+        batch = []
+        with self._lock:
+            self._discard_replaced()
+            while self._heap and self._heap[0][0] <= until:
+                job = heapq.heappop(self._heap)[2]._replace(sending=True)
+                self._jobs[(job.campaign_type, job.campaign_id)] = job
+                batch.append(job)
+                self._discard_replaced()
+            if batch:
+                self._save()
+        return batch
+
+    def _discard_replaced(self):
+        while self._heap:
+            job = self._heap[0][2]
+            if self._jobs.get((job.campaign_type, job.campaign_id)) is job:
+                return
+            heapq.heappop(self._heap)
+
+    def _save(self):
+        tmp_path = '%s.tmp' % self._path
+        with open(tmp_path, 'w') as queue_file:
+            json.dump([self._dump(job) for job in self._jobs.values()],
+                      queue_file)
+        _replace(tmp_path, self._path)
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return
+        with open(self._path) as queue_file:
+            for data in json.load(queue_file):
+                self._push(self._parse(data))
+
+    @staticmethod
+    def _dump(job):
+        data = job._asdict()
+        for name in _AMOUNTS:
+            if isinstance(data[name], Decimal):
+                data[name] = {'__decimal__': str(data[name])}
+        if job.expiry_date is not None:
+            data['expiry_date'] = job.expiry_date.toordinal()
+        return data
+
+    @staticmethod
+    def _parse(data):
+        # Queues saved before retries were added.
+        data.setdefault('attempts', 0)
+        data.setdefault('held', False)
+        if data.pop('sending', False):
+            # Its call was interrupted and may have been applied.
+            data['held'] = True
+        data['sending'] = False
+        for name in _AMOUNTS:
+            if isinstance(data[name], dict):
+                data[name] = Decimal(data[name]['__decimal__'])
+        if data['expiry_date'] is not None:
+            data['expiry_date'] = date.fromordinal(data['expiry_date'])
+        return RefillJob(**data)
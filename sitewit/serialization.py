@@ -0,0 +1,257 @@
+"""Compact binary encoding of `Account` and `Subscription` objects.
+
+A payload holds a list of objects of one kind, laid out as::
+
+    header | string data | records
+
+Strings (tokens, URLs, currencies, amounts, ...) are stored once per
+payload, NUL-separated, and records refer to them by index (0 standing for
+None), so lists of objects that share values (currencies, users, budgets)
+stay small. Dates are stored as days since the payload's earliest date,
+which the header holds, so they take no more room than string indexes.
+Every record is a fixed number of integer fields, 2 bytes each when the
+payload has few enough strings and spans few enough days, and 4 otherwise,
+which lets a whole list be packed and unpacked with a single `struct` call.
+"""
+import itertools
+import struct
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from functools import partial
+
+from sitewit.models import Account, Subscription, User
+
+MAGIC = b'SWOB'
+VERSION = 2
+
+_HEADER = struct.Struct('<4sHBIIcI')
+_SEPARATOR = u'\x00'
+
+_ACCOUNT = 1
+_SUBSCRIPTION = 2
+_WIDTHS = {_ACCOUNT: 11, _SUBSCRIPTION: 7}
+_REF_SIZES = {b'H': 2, b'I': 4}
+
+_STALE = 1
+_HAS_USER = 2
+_INT_ID = 4
+
+
+class SerializationError(ValueError):
+    pass
+
+
+def dumps(obj):
+    """Encode an `Account` or `Subscription`."""
+    return dumps_many([obj])
+
+
+def loads(data):
+    """Decode a payload written by `dumps()`."""
+    return loads_many(data)[0]
+
+
+def dumps_many(objects):
+    """Encode a list of `Account` or of `Subscription` objects.
+
+    Args:
+        objects (iterable): objects of a single kind.
+
+    Returns:
+        bytes.
+
+    Raises:
+        SerializationError: if the objects are of mixed or unknown kinds, or
+            a string holds a NUL character.
+    """
+    objects = list(objects)
+    kind = _kind(objects)
+    # Looking a string up hands out the next index the first time it's seen,
+    # without a Python-level call per field.
+    refs = defaultdict(partial(next, itertools.count(1)))
+    refs[None] = 0
+
+    if kind == _ACCOUNT:
+        base_ordinal = 0
+        records = _account_records(objects, refs.__getitem__)
+    else:
+        base_ordinal = _base_ordinal(objects)
+        records = _subscription_records(
+            objects, refs.__getitem__, base_ordinal)
+
+    strings = sorted(refs, key=refs.__getitem__)[1:]
+    text = _SEPARATOR.join(strings)
+    if text.count(_SEPARATOR) != max(len(strings) - 1, 0):
+        raise SerializationError('Strings must not contain NUL characters')
+    string_data = text.encode('utf8')
+
+    ref_type = b'H' if max(records or [0]) <= 0xFFFF else b'I'
+    return b''.join([
+        _HEADER.pack(MAGIC, VERSION, kind, len(objects), len(string_data),
+                     ref_type, base_ordinal),
+        string_data,
+        struct.pack('<%d%s' % (len(records), ref_type.decode()), *records),
+    ])
+
+
+def loads_many(data):
+    """Decode a payload written by `dumps_many()` (or `dumps()`).
+
+    Returns:
+        list of `Account` or `Subscription` objects.
+
+    Raises:
+        SerializationError: if `data` is not a payload of this version.
+    """
+    try:
+        magic, version = struct.unpack_from('<4sH', data, 0)
+    except struct.error:
+        raise SerializationError('Truncated payload')
+    if magic != MAGIC:
+        raise SerializationError('Not a SiteWit object payload')
+    if version != VERSION:
+        raise SerializationError('Unsupported payload version %d' % version)
+    try:
+        _, _, kind, count, size, ref_type, base_ordinal = _HEADER.unpack_from(
+            data, 0)
+    except struct.error:
+        raise SerializationError('Truncated payload')
+    if kind not in _WIDTHS or ref_type not in _REF_SIZES:
+        raise SerializationError('Not a SiteWit object payload')
+
+    start = _HEADER.size
+    try:
+        text = data[start:start + size].decode('utf8')
+        records = struct.unpack_from(
+            '<%d%s' % (count * _WIDTHS[kind], ref_type.decode()), data,
+            start + size)
+    except (struct.error, UnicodeDecodeError):
+        raise SerializationError('Truncated payload')
+    strings = [None] + text.split(_SEPARATOR)
+
+    if kind == _ACCOUNT:
+        return _accounts(records, count, strings)
+    return _subscriptions(records, count, strings, base_ordinal)
+
+
+def _kind(objects):
+    kinds = set(type(obj) for obj in objects)
+    if kinds == {Account} or not kinds:
+        return _ACCOUNT
+    if kinds == {Subscription}:
+        return _SUBSCRIPTION
+    raise SerializationError(
+        'Can only encode a list of Accounts or of Subscriptions')
+
+
+def _account_records(accounts, ref):
+    records = []
+    for account in accounts:
+        user = account.user
+        records.append(
+            (_STALE if account.is_stale else 0) |
+            (_HAS_USER if user is not None else 0) |
+            (_INT_ID if isinstance(account.id, int) else 0))
+        records.extend(map(ref, (
+            None if account.id is None else str(account.id),
+            account.token,
+            account.status,
+            account.url,
+            account.site_id,
+            account.currency,
+            account.country_code,
+        ) + ((user.name, user.email, user.token) if user is not None
+             else (None, None, None))))
+    return records
+
+
+def _base_ordinal(subscriptions):
+    # The day before the earliest date, so 0 is left for None.
+    ordinals = [subscription.expiry_date.toordinal()
+                for subscription in subscriptions
+                if subscription.expiry_date is not None]
+    return min(ordinals) - 1 if ordinals else 0
+
+
+def _subscription_records(subscriptions, ref, base_ordinal):
+    records = []
+    for subscription in subscriptions:
+        expiry_date = subscription.expiry_date
+        records.extend(map(ref, (
+            subscription.site_id,
+            subscription.url,
+            None if subscription.ad_spend is None
+            else str(subscription.ad_spend),
+            None if subscription.price is None else str(subscription.price),
+            subscription.campaign_id,
+            subscription.currency,
+        )))
+        records.append(
+            0 if expiry_date is None
+            else expiry_date.toordinal() - base_ordinal)
+    return records
+
+
+def _accounts(records, count, strings):
+    string = strings.__getitem__
+    accounts = []
+    width = _WIDTHS[_ACCOUNT]
+
+    for start in range(0, count * width, width):
+        flags = records[start]
+        (id_, token, status, url, site_id, currency, country_code,
+         user_name, user_email, user_token) = map(
+            string, records[start + 1:start + width])
+
+        user = None
+        if flags & _HAS_USER:
+            user = User.__new__(User)
+            user.__dict__ = {
+                'name': user_name, 'email': user_email, 'token': user_token}
+
+        account = Account.__new__(Account)
+        account.__dict__ = {
+            'id': int(id_) if flags & _INT_ID else id_,
+            'token': token,
+            'status': status,
+            'url': url,
+            'site_id': site_id,
+            'currency': currency,
+            'country_code': country_code,
+            'is_stale': bool(flags & _STALE),
+            'user': user,
+        }
+        accounts.append(account)
+    return accounts
+
+
+def _subscriptions(records, count, strings, base_ordinal):
+    # Amounts and dates repeat a lot, so each distinct one is parsed once.
+    decimals = {0: None}
+    dates = {0: None}
+    subscriptions = []
+    width = _WIDTHS[_SUBSCRIPTION]
+
+    for start in range(0, count * width, width):
+        (site_id, url, ad_spend, price, campaign_id, currency,
+         expiry) = records[start:start + width]
+
+        for index in (ad_spend, price):
+            if index not in decimals:
+                decimals[index] = Decimal(strings[index])
+        if expiry not in dates:
+            dates[expiry] = date.fromordinal(base_ordinal + expiry)
+
+        subscription = Subscription.__new__(Subscription)
+        subscription.__dict__ = {
+            'site_id': strings[site_id],
+            'url': strings[url],
+            'ad_spend': decimals[ad_spend],
+            'price': decimals[price],
+            'campaign_id': strings[campaign_id],
+            'currency': strings[currency],
+            'expiry_date': dates[expiry],
+        }
+        subscriptions.append(subscription)
+    return subscriptions
@@ -1,19 +1,63 @@
 import base64
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
 from copy import deepcopy
+from decimal import Decimal
 
 from demands import HTTPServiceClient, HTTPServiceError  # NOQA
+from requests import RequestException
 from yoconfig import get_config
 
 import sitewit
-from sitewit.constants import BillingTypes, CAMPAIGN_SERVICES, CampaignTypes
+from sitewit.bulk import BulkOperation
+from sitewit.cache import CachedList, CachedResponse, MemoryCache, ReadCache
+from sitewit.cassettes import RecordingAdapter, ReplayAdapter
+from sitewit.concurrency import (
+    AdaptiveLimit,
+    KeyedExecutor,
+    PriorityGate,
+    make_executor,
+)
+from sitewit.constants import (
+    BillingTypes,
+    CAMPAIGN_SERVICES,
+    CampaignTypes,
+    RequestPriorities,
+)
+from sitewit.pipeline import Pipeline
+from sitewit.pooling import KeepAliveAdapter
+from sitewit.routing import EndpointSelector, never_sent
+from sitewit.transfer import ACCEPT_ENCODING, TransferStats
+
+log = logging.getLogger(__name__)
 
 _NEXT_CHARGE_PARAMETER_FORMAT = '%Y-%m-%d 23:59:59'
+# How long validators (and the body they validate) of conditional GETs are
+# kept; SiteWit decides whether they are still current.
+_VALIDATOR_TTL = 24 * 60 * 60
+# Safe to repeat against another base URL even if the first one may have
+# received them.
+_IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
 
 
 def _remove_nones(data):
     return {k: v for k, v in data.items() if v is not None}
 
 
+def _amount(value):
+    # JSON has no decimal type. The shortest repr of the float is the
+    # Decimal's own digits for amounts of up to 15 significant digits, so
+    # that is what goes on the wire.
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def _is_overload(status_code):
+    return status_code == 429 or status_code >= 500
+
+
 class SitewitService(HTTPServiceClient):
     """Client for SiteWit's API.
 
@@ -35,8 +79,333 @@ class SitewitService(HTTPServiceClient):
 
         self._partner_id = config['affiliate_id']
         self._partner_token = config['affiliate_token']
+        self._max_workers = config.pop('max_workers', 8)
+        self._executor = None
+        self._pipeline_executor = None
+        self._executor_lock = threading.Lock()
+        capacity = config.pop('max_concurrent_requests', 10)
+        reserved = config.pop('interactive_reserved_requests', 2)
+        ceiling = config.pop('max_concurrent_requests_ceiling', 64)
+        if config.pop('adaptive_concurrency', True):
+            capacity = AdaptiveLimit(
+                initial=capacity, minimum=reserved + 1, maximum=ceiling)
+        self._gate = PriorityGate(capacity=capacity, reserved=reserved)
+        self._local = threading.local()
+        read_cache = config.pop('read_cache', None)
+        if isinstance(read_cache, dict):
+            read_cache = ReadCache(**read_cache)
+        self._read_cache = read_cache
+        self._missing_ttl = config.pop('missing_ttl', None)
+        self._missing = MemoryCache(config.pop('missing_cache_size', 10000))
+        validators = config.pop('conditional_requests', False)
+        if validators is True:
+            validators = MemoryCache(
+                config.pop('conditional_cache_size', 1000))
+        self._validators = validators or None
+        self.transfer_stats = TransferStats()
+        # Say explicitly which encodings we can decode (gzip and deflate,
+        # and br if a brotli package is installed) so large responses,
+        # such as audit pages, come compressed.
+        config.setdefault('headers', {}).setdefault(
+            'Accept-Encoding', ACCEPT_ENCODING)
+        # Enough keep-alive connections for the most concurrent requests
+        # we may allow, so they never have to reconnect.
+        self.connection_pool = KeepAliveAdapter(
+            pool_maxsize=ceiling,
+            idle_timeout=config.pop('idle_connection_timeout', None))
+        prewarm_connections = config.pop('prewarm_connections', 0)
+        # `api_url` may list several base URLs (e.g. regional endpoints);
+        # calls go to the healthiest and fail over to the others.
+        urls = config.pop('api_url')
+        if isinstance(urls, (list, tuple)):
+            urls = list(urls)
+        else:
+            urls = [urls]
+        self._endpoints = None
+        if len(urls) > 1:
+            self._endpoints = EndpointSelector(
+                urls, **config.pop('endpoint_selection', {}))
+
+        # Record the traffic to a cassette, or replay one instead of
+        # touching the network; see `sitewit.cassettes`.
+        record_to = config.pop('record_to', None)
+        replay_from = config.pop('replay_from', None)
+        replay_speed = config.pop('replay_speed', 1.0)
+
+        super(SitewitService, self).__init__(urls[0], **config)
+        if replay_from:
+            self.transport = ReplayAdapter(replay_from, speed=replay_speed)
+            prewarm_connections = 0
+        elif record_to:
+            self.transport = RecordingAdapter(self.connection_pool, record_to)
+        else:
+            self.transport = self.connection_pool
+        self.mount('https://', self.transport)
+        self.mount('http://', self.transport)
+        if prewarm_connections:
+            self._prewarm(prewarm_connections)
+
+    def request(self, method, path, **kwargs):
+        with self._gate.slot(self.current_priority) as slot:
+            if self._endpoints is None:
+                response = self._request(slot, method, path, **kwargs)
+            else:
+                response = self._request_failing_over(
+                    slot, method, path, **kwargs)
+            slot.healthy = not _is_overload(response.status_code)
+            return response
+
+    def _request(self, slot, method, path, **kwargs):
+        try:
+            return super(SitewitService, self).request(method, path, **kwargs)
+        except HTTPServiceError as error:
+            slot.healthy = not _is_overload(error.response.status_code)
+            raise
+        except RequestException:
+            slot.healthy = False
+            raise
+
+    def _request_failing_over(self, slot, method, path, **kwargs):
+        base_urls = self._endpoints.ranked()
+        for attempt, base_url in enumerate(base_urls, 1):
+            started = time.time()
+            try:
+                response = self._request(
+                    slot, method, path, base_url=base_url,
+                    relative_path=path, **kwargs)
+            except HTTPServiceError as error:
+                self._endpoints.record(
+                    base_url, time.time() - started,
+                    not _is_overload(error.response.status_code))
+                raise
+            except RequestException as error:
+                self._endpoints.record(base_url, time.time() - started, False)
+                if attempt == len(base_urls) or not (
+                        method.upper() in _IDEMPOTENT_METHODS or
+                        never_sent(error)):
+                    raise
+                log.warning('%s %s failed on %s, trying %s: %s', method,
+                            path, base_url, base_urls[attempt], error)
+                continue
+            self._endpoints.record(
+                base_url, time.time() - started,
+                not _is_overload(response.status_code))
+            return response
+
+    def pre_send(self, request_params):
+        base_url = request_params.pop('base_url', None)
+        path = request_params.pop('relative_path', None)
+        if base_url is not None:
+            # demands joined the path to the first base URL; join it to the
+            # chosen one instead, the same way.
+            request_params['url'] = base_url
+            if path:
+                request_params['url'] = '%s/%s' % (
+                    base_url.rstrip('/'), path.lstrip('/'))
+        return super(SitewitService, self).pre_send(request_params)
+
+    @property
+    def endpoint_health(self):
+        """`EndpointHealth` per base URL, if several are configured."""
+        return self._endpoints.snapshot() if self._endpoints else {}
+
+    def _prewarm(self, connections):
+        # In the background, so that booting a worker doesn't wait on it.
+        prewarm = threading.Thread(
+            target=self._prewarm_all, args=(connections,))
+        prewarm.daemon = True
+        prewarm.start()
+
+    def _prewarm_all(self, connections):
+        urls = self._endpoints.urls if self._endpoints else [self.url]
+        for url in urls:
+            # Resolve TLS settings the way requests will, so the
+            # connections land in the pool the requests use.
+            settings = self.merge_environment_settings(
+                url, {}, None,
+                self._shared_request_params.get('verify_ssl'), None)
+            self.connection_pool.prewarm(
+                url, connections, verify=settings['verify'])
+
+    def post_send(self, response, **kwargs):
+        self.transfer_stats.record(response)
+        return super(SitewitService, self).post_send(response, **kwargs)
+
+    @contextmanager
+    def priority(self, priority):
+        """Give calls made by this thread in the block a priority.
+
+        Calls are `RequestPriorities.INTERACTIVE` by default. Background calls
+        never use the last `interactive_reserved_requests` of the
+        concurrent request slots, queue behind interactive calls and are
+        throttled further while interactive traffic is present.
+
+        The number of slots starts at `max_concurrent_requests` and, unless
+        `adaptive_concurrency` is disabled in the config, grows while SiteWit
+        answers promptly and halves on 429s, 5xx, connection errors and
+        latency spikes (see `sitewit.concurrency.AdaptiveLimit`), up to
+        `max_concurrent_requests_ceiling`.
+
+        Example::
+
+            with service.priority(RequestPriorities.BACKGROUND):
+                service.get_account(account_token)
+
+        """
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    @property
+    def current_priority(self):
+        """Priority of the calls this thread makes now."""
+        return (getattr(self._local, 'priority', None) or
+                RequestPriorities.INTERACTIVE)
+
+    @property
+    def executor(self):
+        """`KeyedExecutor` that orders background calls per account."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = KeyedExecutor(self._max_workers)
+            return self._executor
+
+    @property
+    def pipeline_executor(self):
+        """Executor that runs the calls of `pipeline()` blocks."""
+        with self._executor_lock:
+            if self._pipeline_executor is None:
+                self._pipeline_executor = make_executor(self._max_workers)
+            return self._pipeline_executor
+
+    def pipeline(self):
+        """Queue calls in a block and run them concurrently at its end.
+
+        Calls to service methods on the returned `Pipeline` return futures;
+        leaving the block runs them all at once and waits for them, so the
+        block takes as long as the slowest call instead of the sum. Calls
+        for the same account are not ordered: for writes that depend on
+        each other, use `submit()`.
+
+        Example::
+
+            with service.pipeline() as pipeline:
+                account = pipeline.get_account(account_token)
+                campaigns = pipeline.list_campaigns(account_token)
+                subscriptions = pipeline.list_campaign_subscriptions(
+                    account_token)
+                owners = pipeline.get_account_owners(account_token)
+            account.result()
+
+        Returns:
+            `sitewit.pipeline.Pipeline`
+        """
+        return Pipeline(self, self.pipeline_executor)
+
+    def submit(self, method, account_token, *args, **kwargs):
+        """Call a service method in the background, ordered per account.
+
+        Calls for different accounts run in parallel (up to `max_workers`
+        from the config); calls for the same account token run strictly in
+        the order they were submitted, so e.g. `subscribe_to_*` followed by
+        `refill_*` can't overtake each other.
 
-        super(SitewitService, self).__init__(config.pop('api_url'), **config)
+        Args:
+            method (str): name of the method to call, e.g. 'update_account'.
+            account_token (str): account token, passed as first argument.
+            *args, **kwargs: the rest of the method's arguments.
+
+        Returns:
+            `concurrent.futures.Future` of the method's result.
+        """
+        return self.executor.submit(
+            account_token, getattr(self, method), account_token, *args,
+            **kwargs)
+
+    def _read_through(self, key, loader):
+        # Without a `read_cache` in the config every read goes to SiteWit.
+        if self._read_cache is None:
+            return loader()
+        value, is_stale = self._read_cache.fetch(
+            (self._partner_id,) + key, loader)
+        if isinstance(value, list):
+            return CachedList(value, is_stale)
+        return CachedResponse(value, is_stale)
+
+    def _unless_missing(self, key, loader):
+        # With `missing_ttl` in the config, a 404 is remembered for that
+        # many seconds and raised again without asking SiteWit.
+        if not self._missing_ttl:
+            return loader()
+
+        entry = self._missing.get((self._partner_id,) + key)
+        if entry is not None:
+            raise HTTPServiceError(entry.value)
+        try:
+            return loader()
+        except HTTPServiceError as error:
+            if error.response.status_code == 404:
+                self._missing.set(
+                    (self._partner_id,) + key, error.response,
+                    self._missing_ttl)
+                self._invalidate(key)
+            raise
+
+    def _invalidate(self, key, missing=False):
+        if self._read_cache is not None:
+            self._read_cache.invalidate((self._partner_id,) + key)
+        if missing:
+            self._missing.delete((self._partner_id,) + key)
+
+    def _get_json(self, key, path, headers):
+        # With `conditional_requests` in the config, the body of the last
+        # response is kept with its ETag / Last-Modified, and a 304 to a
+        # conditional GET reuses it instead of downloading it again. The raw
+        # body is kept, so callers changing the json they get back can't
+        # change what later 304s return.
+        if self._validators is None:
+            return self.get(path, headers=headers).json()
+
+        key = (self._partner_id,) + key
+        entry = self._validators.get(key)
+        validated = entry.value if entry is not None else {}
+        headers = dict(headers)
+        if validated.get('etag'):
+            headers['If-None-Match'] = validated['etag']
+        if validated.get('last_modified'):
+            headers['If-Modified-Since'] = validated['last_modified']
+
+        response = self.get(
+            path, headers=headers,
+            expected_response_codes=[304] if validated else [])
+        if response.status_code == 304:
+            body = validated['body']
+        else:
+            body = response.text
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self._validators.set(key, {
+                'etag': etag,
+                'last_modified': last_modified,
+                'body': body,
+            }, _VALIDATOR_TTL)
+        return json.loads(body)
+
+    def _invalidate_campaign(self, account_token, campaign_id=None):
+        # Subscription changes show in the campaign's status.
+        if campaign_id is not None:
+            self._invalidate(('campaign', account_token, str(campaign_id)))
+        self._invalidate(('campaigns', account_token))
+
+    def _invalidate_partner(self, subpartner_id):
+        # The partner may also be cached under its remote id, which we
+        # can't tell from here; that entry ages out on its own.
+        self._invalidate(('partner', subpartner_id, None))
 
     def _get_account_auth_header(self, account_token):
         return self._compose_auth_header((
@@ -123,10 +492,15 @@ class SitewitService(HTTPServiceClient):
         Returns:
             account json:
             https://sandboxpapi.sitewit.com/Help/Api/GET-api-Account
+
+            If the config has a `read_cache`, the json is a
+            `sitewit.cache.CachedResponse`, and may be stale.
         """
-        return self.get(
-            '/api/account/',
-            headers=self._get_account_auth_header(account_token)).json()
+        key = ('account', account_token)
+        return self._unless_missing(key, lambda: self._read_through(
+            key, lambda: self._get_json(
+                key, '/api/account/',
+                self._get_account_auth_header(account_token))))
 
     def update_account(
             self, account_token, url=None, country_code=None, currency=None,
@@ -147,9 +521,11 @@ class SitewitService(HTTPServiceClient):
             'partnerPackage': user_package,
         })
 
-        return self.put(
+        response = self.put(
             '/api/account/', json=data,
             headers=self._get_account_auth_header(account_token)).json()
+        self._invalidate(('account', account_token))
+        return response
 
     def change_account_owner(self, account_token, user_token=None,
                              user_email=None, user_name=None):
@@ -174,9 +550,11 @@ class SitewitService(HTTPServiceClient):
             'name': user_name,
             'userToken': user_token
         }
-        return self.put(
+        response = self.put(
             '/api/account/owner', json=data,
             headers=self._get_account_auth_header(account_token)).json()
+        self._invalidate(('account', account_token))
+        return response
 
     def delete_account(self, account_token):
         """Delete SiteWit account.
@@ -188,14 +566,18 @@ class SitewitService(HTTPServiceClient):
             account json:
             https://sandboxpapi.sitewit.com/Help/Api/DELETE-api-Account
         """
-        return self.delete(
+        response = self.delete(
             '/api/account/',
             headers=self._get_account_auth_header(account_token)).json()
+        self._invalidate(('account', account_token))
+        return response
 
     def set_account_client_id(self, account_token, client_id):
-        return self.put(
+        response = self.put(
             '/api/Account/ClientId', json={'clientId': client_id},
             headers=self._get_account_auth_header(account_token)).json()
+        self._invalidate(('account', account_token))
+        return response
 
     def get_account_owners(self, account_token):
         """Get all account owners.
@@ -238,10 +620,12 @@ class SitewitService(HTTPServiceClient):
         Returns:
             dict of the format:   {'id': 1, 'name': 'test', 'status': 'Unpaid'}
         """
-        return self.post(
+        response = self.post(
             '/api/campaign/create', json={'type': campaign_type},
             headers=self._get_account_auth_header(account_token)
         ).json()
+        self._invalidate_campaign(account_token)
+        return response
 
     def get_campaign(self, account_token, campaign_id):
         """Get Campaign info by campaign ID
@@ -252,10 +636,15 @@ class SitewitService(HTTPServiceClient):
 
         Returns:
             dict of format:   {'id': 1, 'name': 'test', 'status': 'Active'}
+
+            If the config has a `read_cache`, the dict is a
+            `sitewit.cache.CachedResponse`, and may be stale.
         """
-        return self.get(
-            '/api/campaign/%s' % (campaign_id,),
-            headers=self._get_account_auth_header(account_token)).json()
+        key = ('campaign', account_token, str(campaign_id))
+        return self._unless_missing(key, lambda: self._read_through(
+            key, lambda: self.get(
+                '/api/campaign/%s' % (campaign_id,),
+                headers=self._get_account_auth_header(account_token)).json()))
 
     def list_campaigns(self, account_token):
         """List campaigns available for given account.
@@ -266,10 +655,14 @@ class SitewitService(HTTPServiceClient):
         Returns:
             List of dicts:
             [{'id': 1, 'name': 'test', 'status': 'Active'},...]
+
+            If the config has a `read_cache`, the list is a
+            `sitewit.cache.CachedList`, and may be stale.
         """
-        return self.get(
-            '/api/campaign/',
-            headers=self._get_account_auth_header(account_token)).json()
+        key = ('campaigns', account_token)
+        return self._read_through(key, lambda: self._get_json(
+            key, '/api/campaign/',
+            self._get_account_auth_header(account_token)))
 
     def delete_campaign(self, account_token, campaign_id):
         """Delete Campaign by campaign ID
@@ -281,9 +674,11 @@ class SitewitService(HTTPServiceClient):
         Returns:
             dict of format:   {'id': 1, 'name': 'test', 'status': 'Active'}
         """
-        return self.delete(
+        response = self.delete(
             '/api/campaign/%s' % (campaign_id,),
             headers=self._get_account_auth_header(account_token)).json()
+        self._invalidate_campaign(account_token, campaign_id)
+        return response
 
     def subscribe_to_search_campaign(
             self, account_token, campaign_id, budget,
@@ -344,7 +739,7 @@ class SitewitService(HTTPServiceClient):
             billing_type, expiry_date):
         data = {
             'billingType': billing_type,
-            'budget': budget,
+            'budget': _amount(budget),
             'campaignId': campaign_id,
             'currency': currency,
         }
@@ -353,9 +748,13 @@ class SitewitService(HTTPServiceClient):
             data['nextCharge'] = expiry_date.strftime(
                 _NEXT_CHARGE_PARAMETER_FORMAT)
 
-        return self.post(
+        response = self.post(
             '/api/subscription/campaign/{}'.format(campaign_type), json=data,
             headers=self._get_account_auth_header(account_token)).json()
+        self._invalidate(
+            ('subscription', account_token, str(campaign_id)), missing=True)
+        self._invalidate_campaign(account_token, campaign_id)
+        return response
 
     def refill_search_campaign_subscription(
             self, account_token, campaign_id, refill_amount, budget, currency,
@@ -412,9 +811,9 @@ class SitewitService(HTTPServiceClient):
             budget, currency, expiry_date):
 
         data = {
-            'budget': budget,
+            'budget': _amount(budget),
             'campaignId': campaign_id,
-            'chargedSpend': refill_amount,
+            'chargedSpend': _amount(refill_amount),
             'currency': currency,
         }
 
@@ -422,10 +821,12 @@ class SitewitService(HTTPServiceClient):
             data['nextCharge'] = expiry_date.strftime(
                 _NEXT_CHARGE_PARAMETER_FORMAT)
 
-        return self.put(
+        response = self.put(
             'api/subscription/refill/campaign/{}'.format(campaign_type),
             json=data,
             headers=self._get_account_auth_header(account_token)).json()
+        self._invalidate_campaign(account_token, campaign_id)
+        return response
 
     def get_campaign_subscription(self, account_token, campaign_id):
         """Get campaign subscription info.
@@ -439,9 +840,10 @@ class SitewitService(HTTPServiceClient):
             https://sandboxpapi.sitewit.com/Help/Api/
             GET-api-subscription-campaign-id
         """
-        return self.get(
+        key = ('subscription', account_token, str(campaign_id))
+        return self._unless_missing(key, lambda: self.get(
             '/api/subscription/campaign/%s' % (campaign_id,),
-            headers=self._get_account_auth_header(account_token)).json()
+            headers=self._get_account_auth_header(account_token)).json())
 
     def list_campaign_subscriptions(self, account_token):
         """Get all subscriptions to given campaign for given account.
@@ -467,11 +869,12 @@ class SitewitService(HTTPServiceClient):
             https://sandboxpapi.sitewit.com/Help/Api/
             GET-api-subscription-audit_limit_skip
         """
-        return self.get(
-            '/api/subscription/audit',
-            params={'limit': limit, 'skip': offset},
-            headers=self._get_partner_auth_headers()
-        ).json()
+        with self.priority(RequestPriorities.BACKGROUND):
+            return self.get(
+                '/api/subscription/audit',
+                params={'limit': limit, 'skip': offset},
+                headers=self._get_partner_auth_headers()
+            ).json()
 
     def cancel_search_campaign_subscription(self, account_token, campaign_id,
                                             immediate=True):
@@ -493,9 +896,11 @@ class SitewitService(HTTPServiceClient):
         data = {'campaignId': campaign_id,
                 'cancelType': 'Immediate' if immediate else 'EndOfCycle'}
 
-        return self.delete(
+        response = self.delete(
             'api/subscription/cancel/campaign/search/', json=data,
             headers=self._get_account_auth_header(account_token)).json()
+        self._invalidate_campaign(account_token, campaign_id)
+        return response
 
     def cancel_display_campaign_subscription(self, account_token, campaign_id,
                                              immediate=True):
@@ -517,9 +922,11 @@ class SitewitService(HTTPServiceClient):
         data = {'campaignId': campaign_id,
                 'cancelType': 'Immediate' if immediate else 'EndOfCycle'}
 
-        return self.delete(
+        response = self.delete(
             'api/subscription/cancel/campaign/display/', json=data,
             headers=self._get_account_auth_header(account_token)).json()
+        self._invalidate_campaign(account_token, campaign_id)
+        return response
 
     def refund_search_campaign_subscription(self, account_token, campaign_id):
         """Cancel search subscription and initiate refund.
@@ -537,9 +944,11 @@ class SitewitService(HTTPServiceClient):
             https://sandboxpapi.sitewit.com/Help/Api/
             DELETE-api-subscription-refund-campaign-search-id
         """
-        return self.delete(
+        response = self.delete(
             'api/subscription/refund/campaign/search/{}'.format(campaign_id),
             headers=self._get_account_auth_header(account_token)).json()
+        self._invalidate_campaign(account_token, campaign_id)
+        return response
 
     def refund_display_campaign_subscription(self, account_token, campaign_id):
         """Cancel display subscription and initiate refund.
@@ -557,9 +966,11 @@ class SitewitService(HTTPServiceClient):
             https://sandboxpapi.sitewit.com/Help/Api/
             DELETE-api-subscription-refund-campaign-display-id
         """
-        return self.delete(
+        response = self.delete(
             'api/subscription/refund/campaign/display/{}'.format(campaign_id),
             headers=self._get_account_auth_header(account_token)).json()
+        self._invalidate_campaign(account_token, campaign_id)
+        return response
 
     def request_quickstart_campaign_service(
             self, account_token, service_type, reference_id):
@@ -609,9 +1020,12 @@ class SitewitService(HTTPServiceClient):
             'remoteId': remote_id,
         }
 
-        return self.post(
+        response = self.post(
             '/api/partner/', json=data,
             headers=self._get_partner_auth_headers()).json()
+        if remote_id is not None:
+            self._invalidate(('partner', None, remote_id), missing=True)
+        return response
 
     def get_partner(self, subpartner_id=None, remote_subpartner_id=None):
         """Get subpartner by subpartner id.
@@ -628,11 +1042,15 @@ class SitewitService(HTTPServiceClient):
 
         Note:
             Parameters are mutually exclusive.
+
+            If the config has a `read_cache`, the json is a
+            `sitewit.cache.CachedResponse`, and may be stale.
         """
-        return self.get(
-            'api/partner/',
-            headers=self._get_partner_auth_headers(
-                subpartner_id, remote_subpartner_id)).json()
+        key = ('partner', subpartner_id, remote_subpartner_id)
+        return self._unless_missing(key, lambda: self._read_through(
+            key, lambda: self._get_json(
+                key, 'api/partner/', self._get_partner_auth_headers(
+                    subpartner_id, remote_subpartner_id))))
 
     def update_partner_address(self, subpartner_id, address):
         """Update partner's address.
@@ -650,9 +1068,11 @@ class SitewitService(HTTPServiceClient):
             Address specification, see details here:
             https://sandboxpapi.sitewit.com/Help/Api/PUT-api-partner-address
         """
-        return self.put(
+        response = self.put(
             'api/partner/address', json=address,
             headers=self._get_partner_auth_headers(subpartner_id)).json()
+        self._invalidate_partner(subpartner_id)
+        return response
 
     def update_partner_settings(self, subpartner_id, settings):
         """Update partner's settings.
@@ -670,7 +1090,29 @@ class SitewitService(HTTPServiceClient):
             Settings specification, see details here:
             https://sandboxpapi.sitewit.com/Help/Api/PUT-api-partner-whitelabel
         """
-        return self.put(
+        response = self.put(
             'api/partner/whitelabel', json=settings,
             headers=self._get_partner_auth_headers(subpartner_id),
         ).json()
+        self._invalidate_partner(subpartner_id)
+        return response
+
+    def bulk(self, method, specs, max_concurrency=8):
+        """Call a service method once per spec, concurrently.
+
+        Calls for different accounts run in parallel; calls for the same
+        account run in the given order.
+
+        Args:
+            method (str): name of the method to call, e.g.
+                'refill_search_campaign_subscription'.
+            specs (iterable): method arguments per call, either tuples of
+                positional arguments starting with the account token or
+                dicts of keyword arguments.
+            max_concurrency (int, optional): calls to run at once.
+
+        Returns:
+            `sitewit.bulk.BulkOperation`, which yields a `BulkResult` as each
+            call completes and then exposes aggregate `stats`.
+        """
+        return BulkOperation(self, method, specs, max_concurrency)
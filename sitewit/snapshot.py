@@ -0,0 +1,182 @@
+"""Memory-mapped binary snapshots of subscription sweeps.
+
+A snapshot file is laid out as::
+
+    header | fixed-width records | string offsets | string data
+
+Every record holds references into a de-duplicated string table (URLs,
+site ids, campaign ids, currencies and amounts) plus the expiry date as a
+day ordinal, so a worker can `mmap` the file and decode any record by index
+without reading the rest of it.
+"""
+import mmap
+import os
+import struct
+from datetime import date
+from decimal import Decimal
+
+from sitewit.models import Subscription
+
+MAGIC = b'SWSN'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHHII')
+_RECORD = struct.Struct('<IIIIIIi')
+_OFFSET = struct.Struct('<I')
+_NONE = 0xFFFFFFFF
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class _StringTable(object):
+    def __init__(self):
+        self.strings = []
+        self._refs = {}
+
+    def ref(self, value):
+        if value is None:
+            return _NONE
+        if value not in self._refs:
+            self._refs[value] = len(self.strings)
+            self.strings.append(value)
+        return self._refs[value]
+
+
+def write_snapshot(path, subscriptions):
+    """Write subscriptions to a snapshot file.
+
+    Records are streamed to disk as they come, so only the distinct strings
+    are held in memory. The file is written next to `path` and moved into
+    place at the end, so readers never see a partial snapshot.
+
+    Args:
+        path (str): snapshot file path.
+        subscriptions (iterable): `Subscription` instances, e.g.
+            `Subscription.iter_subscriptions()`.
+
+    Returns:
+        Number of records written.
+    """
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+
+    try:
+        with open(tmp_path, 'wb') as snapshot_file:
+            count = _write(snapshot_file, subscriptions)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    _replace(tmp_path, path)
+    return count
+
+
+def _write(snapshot_file, subscriptions):
+    strings = _StringTable()
+    count = 0
+
+    snapshot_file.write(_HEADER.pack(MAGIC, VERSION, _RECORD.size, 0, 0))
+
+    for subscription in subscriptions:
+        snapshot_file.write(_RECORD.pack(
+            strings.ref(subscription.site_id),
+            strings.ref(subscription.url),
+            strings.ref(str(subscription.ad_spend)),
+            strings.ref(str(subscription.price)),
+            strings.ref(subscription.campaign_id),
+            strings.ref(subscription.currency),
+            subscription.expiry_date.toordinal()))
+        count += 1
+
+    encoded = [value.encode('utf8') for value in strings.strings]
+    offset = 0
+    for value in encoded:
+        snapshot_file.write(_OFFSET.pack(offset))
+        offset += len(value)
+    snapshot_file.write(_OFFSET.pack(offset))
+    snapshot_file.write(b''.join(encoded))
+
+    snapshot_file.seek(0)
+    snapshot_file.write(_HEADER.pack(
+        MAGIC, VERSION, _RECORD.size, count, len(encoded)))
+
+    return count
+
+
+class SubscriptionSnapshot(object):
+    """Read-only, random-access view of a snapshot file.
+
+    Example::
+
+        with SubscriptionSnapshot('/var/cache/sitewit.snapshot') as snapshot:
+            subscription = snapshot[42]
+
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as snapshot_file:
+            self._mmap = mmap.mmap(
+                snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, record_size, count, string_count = (
+            _HEADER.unpack_from(self._mmap, 0))
+        if magic != MAGIC or record_size != _RECORD.size:
+            self.close()
+            raise SnapshotError('%s is not a subscription snapshot' % path)
+        if version != VERSION:
+            self.close()
+            raise SnapshotError(
+                'Unsupported snapshot version %d in %s' % (version, path))
+
+        self._count = count
+        self._offsets_start = _HEADER.size + count * _RECORD.size
+        self._strings_start = (
+            self._offsets_start + (string_count + 1) * _OFFSET.size)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('snapshot index out of range')
+
+        (site_id, url, ad_spend, price, campaign_id, currency,
+         expiry) = _RECORD.unpack_from(
+            self._mmap, _HEADER.size + index * _RECORD.size)
+
+        return Subscription.from_fields(
+            site_id=self._string(site_id),
+            url=self._string(url),
+            ad_spend=Decimal(self._string(ad_spend)),
+            price=Decimal(self._string(price)),
+            campaign_id=self._string(campaign_id),
+            currency=self._string(currency),
+            expiry_date=date.fromordinal(expiry))
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def _string(self, ref):
+        if ref == _NONE:
+            return None
+        position = self._offsets_start + ref * _OFFSET.size
+        start, = _OFFSET.unpack_from(self._mmap, position)
+        end, = _OFFSET.unpack_from(self._mmap, position + _OFFSET.size)
+        return self._mmap[
+            self._strings_start + start:self._strings_start + end
+        ].decode('utf8')
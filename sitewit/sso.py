@@ -0,0 +1,142 @@
+"""In-memory SSO tokens, refreshed ahead of expiry."""
+import heapq
+import logging
+import threading
+import time
+
+from sitewit.concurrency import make_executor
+
+log = logging.getLogger(__name__)
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        log.warning('SSO token refresh failed: %s', future.exception())
+
+
+class SSOTokenManager(object):
+    """Serves `generate_sso_token()` results from memory.
+
+    Tokens are cached per `(user_token, account_token)` for `ttl` seconds,
+    which must not exceed the validity window SiteWit gives SSO tokens.
+    A pair that was asked for (or warmed) within the last `keep_warm`
+    seconds gets a new token fetched in the background `refresh_margin`
+    seconds before its current one expires, so opening the dashboard does
+    not wait for `/api/sso/token`. Concurrent misses for one pair share a
+    single request.
+
+    Example::
+
+        sso_tokens = SSOTokenManager(service, ttl=60)
+        sso_tokens.warm(user_token, account_token)  # on login
+        token = sso_tokens.get(user_token, account_token)  # on click
+
+    """
+
+    def __init__(self, service, ttl=60, refresh_margin=15, keep_warm=600,
+                 max_workers=4):
+        if refresh_margin >= ttl:
+            raise ValueError('refresh_margin must be shorter than ttl')
+
+        self._service = service
+        self._ttl = ttl
+        self._refresh_margin = refresh_margin
+        self._keep_warm = keep_warm
+        self._executor = make_executor(max_workers)
+        self._condition = threading.Condition()
+        self._tokens = {}
+        self._warm_until = {}
+        self._in_flight = {}
+        self._refreshes = []
+        self._closed = False
+        self._refresher = threading.Thread(target=self._refresh_loop)
+        self._refresher.daemon = True
+        self._refresher.start()
+
+    def get(self, user_token, account_token):
+        """Return an SSO token, fetching one only if none is cached.
+
+        Raises:
+            demands.HTTPServiceError: if a token had to be fetched and that
+                failed.
+        """
+        key = (user_token, account_token)
+        with self._condition:
+            self._warm_until[key] = time.time() + self._keep_warm
+            cached = self._tokens.get(key)
+            if cached is not None and time.time() < cached[1]:
+                return cached[0]
+            future = self._fetch(key)
+        return future.result()
+
+    def warm(self, user_token, account_token):
+        """Fetch a token in the background and keep it fresh for a while.
+
+        Returns:
+            `concurrent.futures.Future` of the token.
+        """
+        key = (user_token, account_token)
+        with self._condition:
+            self._warm_until[key] = time.time() + self._keep_warm
+            return self._fetch(key)
+
+    def invalidate(self, user_token, account_token):
+        key = (user_token, account_token)
+        with self._condition:
+            self._tokens.pop(key, None)
+            self._warm_until.pop(key, None)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._executor.shutdown(wait=False)
+
+    def _fetch(self, key):
+        future = self._in_flight.get(key)
+        if future is None:
+            future = self._in_flight[key] = self._executor.submit(
+                self._load, key)
+        return future
+
+    def _load(self, key):
+        try:
+            token = self._service.generate_sso_token(*key)
+        except Exception:
+            with self._condition:
+                del self._in_flight[key]
+            raise
+
+        expires_at = time.time() + self._ttl
+        with self._condition:
+            del self._in_flight[key]
+            self._tokens[key] = (token, expires_at)
+            heapq.heappush(self._refreshes, (
+                expires_at - self._refresh_margin, key))
+            self._condition.notify()
+        return token
+
+    def _refresh_loop(self):
+        with self._condition:
+            while not self._closed:
+                now = time.time()
+                if not self._refreshes:
+                    self._condition.wait()
+                elif self._refreshes[0][0] > now:
+                    self._condition.wait(self._refreshes[0][0] - now)
+                else:
+                    refresh_at, key = heapq.heappop(self._refreshes)
+                    self._refresh(key, refresh_at, now)
+
+    def _refresh(self, key, refresh_at, now):
+        cached = self._tokens.get(key)
+        if cached is None or cached[1] - self._refresh_margin != refresh_at:
+            # The token was dropped or replaced since this was scheduled.
+            return
+
+        if self._warm_until.get(key, 0) > now:
+            self._fetch(key).add_done_callback(_log_failure)
+        else:
+            # Nobody asked for this pair lately; let it go.
+            self._warm_until.pop(key, None)
+            self._tokens.pop(key, None)
@@ -0,0 +1,75 @@
+"""Content-encoding negotiation and per-endpoint transfer accounting."""
+import re
+import threading
+from collections import namedtuple
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:  # Python 2
+    from urlparse import urlsplit
+
+try:
+    # Lists br when urllib3 found a brotli package it can decode with.
+    from urllib3.util.request import ACCEPT_ENCODING
+except ImportError:  # urllib3 < 1.25
+    ACCEPT_ENCODING = 'gzip,deflate'
+
+# Path segments that identify a resource rather than an endpoint: numbers,
+# hex tokens and UUIDs.
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F-]{16,})$')
+
+
+class EndpointTransfer(namedtuple(
+        'EndpointTransfer', ('responses', 'wire_bytes', 'body_bytes'))):
+    @property
+    def ratio(self):
+        """Wire bytes per decoded body byte; lower is better."""
+        if not self.body_bytes:
+            return 1.0
+        return self.wire_bytes / float(self.body_bytes)
+
+
+def endpoint(method, url):
+    """Name the endpoint of a request, e.g. 'GET /api/campaign/{id}'."""
+    segments = urlsplit(url).path.rstrip('/').split('/')
+    return '%s %s' % (method, '/'.join(
+        '{id}' if _ID_SEGMENT.match(segment) else segment.lower()
+        for segment in segments) or '/')
+
+
+class TransferStats(object):
+    """Counts the bytes each endpoint's responses took on the wire and
+    decoded, so the effect of compression can be measured.
+
+    Example::
+
+        for name, transfer in service.transfer_stats.snapshot().items():
+            print(name, transfer.wire_bytes, transfer.body_bytes)
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, response):
+        body_bytes = len(response.content)
+        raw = response.raw
+        # urllib3 counts the (possibly compressed) bytes it read off the
+        # socket, while `content` is already decoded.
+        wire_bytes = raw.tell() if hasattr(raw, 'tell') else body_bytes
+        name = endpoint(response.request.method, response.url)
+
+        with self._lock:
+            responses, wire, body = self._endpoints.get(name, (0, 0, 0))
+            self._endpoints[name] = EndpointTransfer(
+                responses + 1, wire + wire_bytes, body + body_bytes)
+
+    def snapshot(self):
+        """Return a dict of endpoint name to `EndpointTransfer`."""
+        with self._lock:
+            return dict(self._endpoints)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
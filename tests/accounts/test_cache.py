@@ -0,0 +1,397 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from demands import HTTPServiceError
+from mock import Mock, patch
+from requests import ConnectionError
+
+import sitewit.services
+from sitewit.cache import (
+    CachedList,
+    CachedResponse,
+    MemoryCache,
+    ReadCache,
+    SqliteCache,
+)
+from sitewit.models import Account
+from tests.base import SitewitTestCase
+
+
+def _http_error(status_code):
+    return HTTPServiceError(Mock(status_code=status_code))
+
+
+class MemoryCacheTestCase(TestCase):
+    def test_entries_expire_after_ttl(self):
+        cache = MemoryCache()
+        cache.set('key', 'value', 0.05)
+
+        self.assertEqual(cache.get('key').value, 'value')
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('key'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        cache.set('c', 3, 60)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a').value, 1)
+        self.assertEqual(cache.get('c').value, 3)
+
+
+class ReadCacheTestCase(TestCase):
+    def setUp(self):
+        self.cache = ReadCache(
+            soft_ttl=0.05, revalidate_window=0.1, hard_ttl=1, timeout=0.1)
+        self.loader = Mock(side_effect=['v1', 'v2', 'v3'])
+
+    def test_miss_calls_loader(self):
+        self.assertEqual(self.cache.fetch('key', self.loader), ('v1', False))
+        self.assertEqual(self.cache.fetch('key', self.loader), ('v1', False))
+        self.assertEqual(self.loader.call_count, 1)
+
+    def test_miss_raises_loader_errors(self):
+        self.loader.side_effect = _http_error(503)
+
+        with self.assertRaises(HTTPServiceError):
+            self.cache.fetch('key', self.loader)
+
+    def test_stale_value_is_served_while_revalidating(self):
+        self.cache.fetch('key', self.loader)
+        time.sleep(0.06)
+
+        self.assertEqual(self.cache.fetch('key', self.loader), ('v1', True))
+        time.sleep(0.02)
+        self.assertEqual(self.cache.fetch('key', self.loader), ('v2', False))
+
+    def test_concurrent_misses_share_one_load(self):
+        release = threading.Event()
+
+        def loader():
+            release.wait(1)
+            return 'value'
+
+        loader = Mock(side_effect=loader)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                self.cache.fetch('key', loader)))
+            for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.02)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [('value', False)] * 4)
+        self.assertEqual(loader.call_count, 1)
+
+    def test_old_value_is_refreshed_in_foreground(self):
+        self.cache.fetch('key', self.loader)
+        time.sleep(0.16)
+
+        self.assertEqual(self.cache.fetch('key', self.loader), ('v2', False))
+
+    def test_old_value_is_served_if_sitewit_is_down(self):
+        self.cache.fetch('key', self.loader)
+        self.loader.side_effect = ConnectionError()
+        time.sleep(0.16)
+
+        self.assertEqual(self.cache.fetch('key', self.loader), ('v1', True))
+
+    def test_old_value_is_served_if_sitewit_is_slow(self):
+        self.cache.fetch('key', self.loader)
+        self.loader.side_effect = lambda: time.sleep(0.3)
+        time.sleep(0.16)
+
+        self.assertEqual(self.cache.fetch('key', self.loader), ('v1', True))
+
+    def test_client_errors_are_not_masked(self):
+        self.cache.fetch('key', self.loader)
+        self.loader.side_effect = _http_error(404)
+        time.sleep(0.16)
+
+        with self.assertRaises(HTTPServiceError):
+            self.cache.fetch('key', self.loader)
+
+    def test_nothing_is_served_after_hard_ttl(self):
+        cache = ReadCache(soft_ttl=0.01, revalidate_window=0.01, hard_ttl=0.05)
+        cache.fetch('key', self.loader)
+        self.loader.side_effect = ConnectionError()
+        time.sleep(0.06)
+
+        with self.assertRaises(ConnectionError):
+            cache.fetch('key', self.loader)
+
+    def test_invalidate(self):
+        self.cache.fetch('key', self.loader)
+        self.cache.invalidate('key')
+
+        self.assertEqual(self.cache.fetch('key', self.loader), ('v2', False))
+
+    def test_refresh_started_before_invalidate_is_not_kept(self):
+        self.cache.fetch('key', Mock(return_value='old'))
+        time.sleep(0.06)
+        started, release = threading.Event(), threading.Event()
+
+        def old_refresh():
+            started.set()
+            release.wait(1)
+            return 'old'
+        self.cache.fetch('key', old_refresh)  # Refreshes in background.
+        self.assertTrue(started.wait(1))
+
+        self.cache.invalidate('key')
+        self.assertEqual(
+            self.cache.fetch('key', Mock(return_value='new')), ('new', False))
+        release.set()
+        time.sleep(0.02)
+
+        self.assertEqual(self.cache.fetch('key', self.loader), ('new', False))
+
+
+class ServiceReadCacheTestCase(SitewitTestCase):
+    def setUp(self):
+        self.service = sitewit.services.SitewitService(read_cache={
+            'soft_ttl': 60, 'revalidate_window': 60, 'hard_ttl': 600})
+        self.account_json = {
+            'accountNumber': 1,
+            'token': 'token',
+            'status': 'Active',
+            'url': 'http://example.com',
+            'clientId': 'site-id',
+            'currency': 'USD',
+            'countryCode': 'US',
+        }
+
+    def test_account_is_read_once(self):
+        with patch.object(self.service, 'get') as get:
+            get.return_value.json.return_value = self.account_json
+            self.service.get_account('token')
+            account = self.service.get_account('token')
+
+        self.assertEqual(account, self.account_json)
+        self.assertFalse(account.is_stale)
+        self.assertEqual(get.call_count, 1)
+
+    def test_update_invalidates_account(self):
+        with patch.object(self.service, 'get') as get, \
+                patch.object(self.service, 'put'):
+            get.return_value.json.return_value = self.account_json
+            self.service.get_account('token')
+            self.service.update_account('token', currency='EUR')
+            self.service.get_account('token')
+
+        self.assertEqual(get.call_count, 2)
+
+    def test_partners_are_cached_per_subpartner(self):
+        with patch.object(self.service, 'get') as get:
+            get.return_value.json.return_value = {'id': 'partner'}
+            self.service.get_partner('a')
+            self.service.get_partner('a')
+            self.service.get_partner('b')
+
+        self.assertEqual(get.call_count, 2)
+
+    def serve_campaigns(self, get):
+        campaign = {'id': 1, 'name': 'a', 'status': 'Active'}
+
+        def respond(path, **kwargs):
+            if path == '/api/campaign/':
+                return Mock(json=Mock(return_value=[campaign]))
+            return Mock(json=Mock(return_value=campaign))
+        get.side_effect = respond
+        return campaign
+
+    def test_campaigns_are_read_once(self):
+        with patch.object(self.service, 'get') as get:
+            campaign = self.serve_campaigns(get)
+            self.service.get_campaign('token', 1)
+            self.service.get_campaign('token', '1')
+            self.service.list_campaigns('token')
+            campaigns = self.service.list_campaigns('token')
+
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(campaigns, [campaign])
+        self.assertIsInstance(campaigns, CachedList)
+        self.assertFalse(campaigns.is_stale)
+
+    def test_campaign_changes_invalidate_campaigns(self):
+        changes = (
+            ('post', 'subscribe_to_search_campaign', ('token', 1, 10, 'USD')),
+            ('put', 'refill_display_campaign_subscription',
+             ('token', 1, 10, 20, 'USD')),
+            ('delete', 'cancel_search_campaign_subscription', ('token', 1)),
+            ('delete', 'refund_display_campaign_subscription', ('token', 1)),
+            ('delete', 'delete_campaign', ('token', 1)),
+        )
+        for method, name, args in changes:
+            with patch.object(self.service, 'get') as get, \
+                    patch.object(self.service, method):
+                self.serve_campaigns(get)
+                self.service.get_campaign('token', 1)
+                self.service.list_campaigns('token')
+                get.reset_mock()
+                getattr(self.service, name)(*args)
+                self.service.get_campaign('token', 1)
+                self.service.list_campaigns('token')
+
+            self.assertEqual(get.call_count, 2, name)
+
+    def test_creating_campaign_invalidates_list(self):
+        with patch.object(self.service, 'get') as get, \
+                patch.object(self.service, 'post'):
+            self.serve_campaigns(get)
+            self.service.list_campaigns('token')
+            self.service.create_campaign('token')
+            self.service.list_campaigns('token')
+
+        self.assertEqual(get.call_count, 2)
+
+    def test_account_model_carries_staleness(self):
+        account_json = CachedResponse(self.account_json, is_stale=True)
+
+        self.assertTrue(Account(account_json).is_stale)
+        self.assertFalse(Account(self.account_json).is_stale)
+
+
+class ServiceMissingCacheTestCase(SitewitTestCase):
+    def setUp(self):
+        self.service = sitewit.services.SitewitService(missing_ttl=60)
+        self.not_found = Mock(status_code=404, content=b'')
+        self.not_found.json.side_effect = ValueError()
+
+    def test_missing_account_is_looked_up_once(self):
+        with patch.object(self.service, 'get') as get:
+            get.side_effect = HTTPServiceError(self.not_found)
+            for _ in range(3):
+                with self.assertRaises(HTTPServiceError) as raised:
+                    self.service.get_account('gone')
+                self.assertEqual(raised.exception.response.status_code, 404)
+
+        self.assertEqual(get.call_count, 1)
+
+    def test_other_errors_are_not_remembered(self):
+        with patch.object(self.service, 'get') as get:
+            get.side_effect = _http_error(503)
+            for _ in range(2):
+                with self.assertRaises(HTTPServiceError):
+                    self.service.get_campaign('token', 1)
+
+        self.assertEqual(get.call_count, 2)
+
+    def test_missing_entries_are_per_campaign(self):
+        with patch.object(self.service, 'get') as get:
+            get.side_effect = [HTTPServiceError(self.not_found), Mock()]
+            with self.assertRaises(HTTPServiceError):
+                self.service.get_campaign('token', 1)
+            self.service.get_campaign('token', 2)
+
+        self.assertEqual(get.call_count, 2)
+
+    def test_subscribing_forgets_missing_subscription(self):
+        with patch.object(self.service, 'get') as get, \
+                patch.object(self.service, 'post'):
+            get.side_effect = [HTTPServiceError(self.not_found), Mock()]
+            with self.assertRaises(HTTPServiceError):
+                self.service.get_campaign_subscription('token', 1)
+            self.service.subscribe_to_search_campaign(
+                'token', 1, 10, 'USD')
+            self.service.get_campaign_subscription('token', 1)
+
+        self.assertEqual(get.call_count, 2)
+
+    def test_subscribing_forgets_missing_subscription_of_any_id_type(self):
+        for looked_up, subscribed in (('1', 1), (2, '2')):
+            with patch.object(self.service, 'get') as get, \
+                    patch.object(self.service, 'post'):
+                get.side_effect = [HTTPServiceError(self.not_found), Mock()]
+                with self.assertRaises(HTTPServiceError):
+                    self.service.get_campaign_subscription('token', looked_up)
+                self.service.subscribe_to_search_campaign(
+                    'token', subscribed, 10, 'USD')
+                self.service.get_campaign_subscription('token', looked_up)
+
+            self.assertEqual(get.call_count, 2)
+
+    def test_missing_entries_expire(self):
+        self.service = sitewit.services.SitewitService(missing_ttl=0.01)
+        with patch.object(self.service, 'get') as get:
+            get.side_effect = [HTTPServiceError(self.not_found), Mock()]
+            with self.assertRaises(HTTPServiceError):
+                self.service.get_partner('gone')
+            time.sleep(0.02)
+            self.service.get_partner('gone')
+
+        self.assertEqual(get.call_count, 2)
+
+    def test_disabled_by_default(self):
+        service = sitewit.services.SitewitService()
+        with patch.object(service, 'get') as get:
+            get.side_effect = HTTPServiceError(self.not_found)
+            for _ in range(2):
+                with self.assertRaises(HTTPServiceError):
+                    service.get_account('gone')
+
+        self.assertEqual(get.call_count, 2)
+
+
+class SqliteCacheTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cache.sqlite')
+        self.cache = SqliteCache(self.path)
+
+    def test_set_and_get(self):
+        self.cache.set(('partner', 'account', 'token'), {'id': 1}, 60)
+
+        entry = self.cache.get(('partner', 'account', 'token'))
+        self.assertEqual(entry.value, {'id': 1})
+        self.assertAlmostEqual(entry.stored_at, time.time(), delta=1)
+
+    def test_large_values_round_trip(self):
+        value = {'campaigns': [{'id': i, 'name': 'x' * 20} for i in range(50)]}
+        self.cache.set('key', value, 60)
+
+        self.assertEqual(self.cache.get('key').value, value)
+
+    def test_entries_are_shared_between_instances(self):
+        self.cache.set('key', 'value', 60)
+
+        self.assertEqual(SqliteCache(self.path).get('key').value, 'value')
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.set('key', 'value', 0.01)
+        time.sleep(0.02)
+
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_delete(self):
+        self.cache.set('key', 'value', 60)
+        self.cache.delete('key')
+
+        self.assertIsNone(self.cache.get('key'))
+
+    @patch('sitewit.cache.FORMAT_VERSION', 2)
+    def test_entries_of_other_format_versions_are_ignored(self):
+        with patch('sitewit.cache.FORMAT_VERSION', 1):
+            self.cache.set('key', 'value', 60)
+
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_backs_read_cache(self):
+        cache = ReadCache(backend=self.cache)
+        cache.fetch('key', lambda: {'id': 1})
+
+        self.assertEqual(
+            ReadCache(backend=SqliteCache(self.path)).fetch('key', Mock()),
+            ({'id': 1}, False))
@@ -0,0 +1,108 @@
+import threading
+
+from mock import patch
+
+import sitewit.services
+from sitewit.coalescing import CoalescingAccountUpdater
+
+from .base import AccountTestCase
+
+
+class TestCoalescingAccountUpdater(AccountTestCase):
+    def setUp(self):
+        patcher = patch.object(sitewit.services.SitewitService, 'put')
+        self.put_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self._mock_response(self.put_mock, self.response_brief)
+
+        self.updater = CoalescingAccountUpdater(self.service, window=60)
+
+    def test_nothing_is_sent_within_window(self):
+        self.updater.update(self.token, url=self.url)
+
+        self.assertFalse(self.put_mock.called)
+
+    def test_changes_are_merged_into_one_put(self):
+        first = self.updater.update(self.token, url='http://old.com')
+        second = self.updater.update(
+            self.token, url=self.url, currency=self.currency)
+
+        result = self.updater.flush(self.token)
+
+        self.assertDemandsIsCalled(
+            self.put_mock, {'url': self.url, 'currency': self.currency},
+            account_token=self.token)
+        self.assertEqual(result, self.response_brief)
+        self.assertEqual(first.result(timeout=1), self.response_brief)
+        self.assertEqual(second.result(timeout=1), self.response_brief)
+
+    def test_flush_all_sends_one_put_per_account(self):
+        self.updater.update(self.token, url=self.url)
+        self.updater.update('other', currency=self.currency)
+
+        self.updater.flush()
+
+        self.assertEqual(self.put_mock.call_count, 2)
+
+    def test_flush_without_pending_changes_returns_none(self):
+        self.assertIsNone(self.updater.flush(self.token))
+        self.assertFalse(self.put_mock.called)
+
+    def test_window_end_sends_changes(self):
+        updater = CoalescingAccountUpdater(self.service, window=0.01)
+
+        future = updater.update(self.token, user_package=self.user_package)
+
+        self.assertEqual(future.result(timeout=1), self.response_brief)
+        self.assertDemandsIsCalled(
+            self.put_mock, {'partnerPackage': self.user_package},
+            account_token=self.token)
+
+    def block_puts(self):
+        sent = threading.Event()
+        release = threading.Event()
+        response = self.put_mock.return_value
+
+        def put(*args, **kwargs):
+            sent.set()
+            release.wait(1)
+            return response
+        self.put_mock.side_effect = put
+        return sent, release
+
+    def flush_in_background(self, *args):
+        flushed = []
+        thread = threading.Thread(
+            target=lambda: flushed.append(self.updater.flush(*args)))
+        thread.start()
+        return thread, flushed
+
+    def test_flush_waits_for_put_in_flight(self):
+        sent, release = self.block_puts()
+        self.updater = CoalescingAccountUpdater(self.service, window=0.01)
+        self.updater.update(self.token, url=self.url)
+        self.assertTrue(sent.wait(1))
+
+        thread, flushed = self.flush_in_background(self.token)
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+
+        release.set()
+        thread.join(1)
+        self.assertEqual(flushed, [self.response_brief])
+        self.assertEqual(self.put_mock.call_count, 1)
+
+    def test_flush_all_waits_for_puts_in_flight(self):
+        sent, release = self.block_puts()
+        self.updater = CoalescingAccountUpdater(self.service, window=0.01)
+        future = self.updater.update(self.token, url=self.url)
+        self.assertTrue(sent.wait(1))
+
+        thread, flushed = self.flush_in_background()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+
+        release.set()
+        thread.join(1)
+        self.assertEqual(flushed, [None])
+        self.assertEqual(future.result(timeout=1), self.response_brief)
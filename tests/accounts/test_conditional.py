@@ -0,0 +1,83 @@
+from sitewit.cache import ReadCache
+from sitewit.services import SitewitService
+from tests.base import SitewitTestCase
+from tests.fakeapi import FAKE_API_URL, FakeSitewitAPI
+
+
+class ConditionalRequestsTestCase(SitewitTestCase):
+    def setUp(self):
+        self.api = FakeSitewitAPI()
+        self.api.accounts['token'] = {'token': 'token', 'currency': 'USD'}
+        self.api.campaigns['token'] = [{'id': 1, 'status': 'Active'}]
+        self.api.partners[None] = {'name': 'Partner'}
+        self.service = self._service(conditional_requests=True)
+
+    def _service(self, **kwargs):
+        service = SitewitService(api_url=FAKE_API_URL, **kwargs)
+        service.mount(FAKE_API_URL, self.api)
+        return service
+
+    def test_unchanged_account_is_not_downloaded_again(self):
+        first = self.service.get_account('token')
+        second = self.service.get_account('token')
+
+        self.assertEqual(first, second)
+        self.assertEqual(
+            [status for _, _, status in self.api.log], [200, 304])
+
+    def test_changing_the_result_does_not_change_later_ones(self):
+        self.service.get_account('token')['currency'] = 'EUR'
+
+        account = self.service.get_account('token')
+
+        self.assertEqual(account['currency'], 'USD')
+        self.assertEqual(self.api.log[-1][2], 304)
+
+    def test_changed_account_is_downloaded(self):
+        self.service.get_account('token')
+        self.api.accounts['token']['currency'] = 'EUR'
+
+        account = self.service.get_account('token')
+
+        self.assertEqual(account['currency'], 'EUR')
+        self.assertEqual(self.api.log[-1][2], 200)
+
+    def test_campaigns_and_partners_are_revalidated(self):
+        for _ in range(2):
+            campaigns = self.service.list_campaigns('token')
+            partner = self.service.get_partner()
+
+        self.assertEqual(campaigns, [{'id': 1, 'status': 'Active'}])
+        self.assertEqual(partner, {'name': 'Partner'})
+        self.assertEqual(
+            [status for _, _, status in self.api.log], [200, 200, 304, 304])
+
+    def test_last_modified_is_used_without_etag(self):
+        self.service.get_account('token')
+        entry = self.service._validators.get(
+            (self.service._partner_id, 'account', 'token'))
+        entry.value['etag'] = None
+
+        self.service.get_account('token')
+
+        self.assertEqual(self.api.log[-1][2], 304)
+
+    def test_disabled_by_default(self):
+        service = self._service()
+        service.get_account('token')
+        service.get_account('token')
+
+        self.assertEqual(
+            [status for _, _, status in self.api.log], [200, 200])
+
+    def test_read_cache_refresh_revalidates(self):
+        service = self._service(
+            conditional_requests=True,
+            read_cache=ReadCache(soft_ttl=0, revalidate_window=0))
+        service.get_account('token')
+
+        account = service.get_account('token')
+
+        self.assertFalse(account.is_stale)
+        self.assertEqual(
+            [status for _, _, status in self.api.log], [200, 304])
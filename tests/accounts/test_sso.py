@@ -0,0 +1,77 @@
+import threading
+import time
+from unittest import TestCase
+
+from mock import Mock
+
+from sitewit.sso import SSOTokenManager
+
+
+class SSOTokenManagerTestCase(TestCase):
+    def setUp(self):
+        self.counter = iter(range(1000))
+        self.service = Mock()
+        self.service.generate_sso_token.side_effect = (
+            lambda user_token, account_token: 'sso-%d' % next(self.counter))
+        self.manager = SSOTokenManager(
+            self.service, ttl=0.2, refresh_margin=0.1, keep_warm=0.5)
+
+    def tearDown(self):
+        self.manager.close()
+
+    def test_token_is_fetched_on_first_use(self):
+        self.assertEqual(self.manager.get('user', 'account'), 'sso-0')
+        self.service.generate_sso_token.assert_called_once_with(
+            'user', 'account')
+
+    def test_token_is_served_from_memory_within_ttl(self):
+        self.manager.get('user', 'account')
+
+        self.assertEqual(self.manager.get('user', 'account'), 'sso-0')
+        self.assertEqual(self.service.generate_sso_token.call_count, 1)
+
+    def test_tokens_are_cached_per_user_and_account(self):
+        self.manager.get('user', 'account')
+
+        self.assertEqual(self.manager.get('user', 'other'), 'sso-1')
+
+    def test_warmed_token_is_served_from_memory(self):
+        self.manager.warm('user', 'account').result(timeout=1)
+
+        self.assertEqual(self.manager.get('user', 'account'), 'sso-0')
+        self.assertEqual(self.service.generate_sso_token.call_count, 1)
+
+    def test_token_is_refreshed_before_it_expires(self):
+        self.manager.get('user', 'account')
+        time.sleep(0.15)
+
+        self.assertEqual(self.manager.get('user', 'account'), 'sso-1')
+
+    def test_unused_tokens_stop_being_refreshed(self):
+        self.manager.get('user', 'account')
+        time.sleep(1)
+        calls = self.service.generate_sso_token.call_count
+        time.sleep(0.3)
+
+        self.assertEqual(self.service.generate_sso_token.call_count, calls)
+
+    def test_concurrent_misses_share_one_request(self):
+        release = threading.Event()
+        self.service.generate_sso_token.side_effect = (
+            lambda *args: release.wait(1) and 'sso')
+        threads = [
+            threading.Thread(target=self.manager.get, args=('u', 'a'))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(1)
+
+        self.assertEqual(self.service.generate_sso_token.call_count, 1)
+
+    def test_invalidated_token_is_fetched_again(self):
+        self.manager.get('user', 'account')
+        self.manager.invalidate('user', 'account')
+
+        self.assertEqual(self.manager.get('user', 'account'), 'sso-1')
@@ -0,0 +1,12 @@
+from sitewit.models import Subscription
+
+
+def make_subscription(campaign_id=1, site_id=None, budget=19.99, fee=19.0,
+                      currency='EUR', next_charge='2015-05-08T11:32:03'):
+    return Subscription(site_id, 'http://example.com/%s' % campaign_id, {
+        'budget': budget,
+        'fee': fee,
+        'currency': currency,
+        'campaignId': campaign_id,
+        'nextCharge': next_charge,
+    })
@@ -0,0 +1,77 @@
+import threading
+import time
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+import sitewit.services
+from sitewit.bulk import BulkOperation
+from tests.base import SitewitTestCase
+
+
+class BulkOperationTestCase(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.service = MagicMock()
+        self.service.cancel_search_campaign_subscription.side_effect = (
+            self._cancel)
+
+    def _cancel(self, account_token, campaign_id, immediate=True):
+        time.sleep(0.01)
+        with self.lock:
+            self.calls.append((account_token, campaign_id))
+        if campaign_id == 'gone':
+            raise ValueError(campaign_id)
+        return {'campaignId': campaign_id}
+
+    def run_bulk(self, specs):
+        operation = BulkOperation(
+            self.service, 'cancel_search_campaign_subscription', specs,
+            max_concurrency=4)
+        return operation, list(operation)
+
+    def test_every_spec_yields_a_result(self):
+        specs = [('a', '1'), ('b', '2'), ('c', '3')]
+        operation, results = self.run_bulk(specs)
+
+        self.assertEqual(sorted(r.spec for r in results), specs)
+        self.assertEqual(operation.stats.succeeded, 3)
+        self.assertEqual(operation.stats.total, 3)
+        self.assertGreater(operation.stats.throughput, 0)
+
+    def test_failures_are_reported_per_item(self):
+        operation, results = self.run_bulk([('a', '1'), ('b', 'gone')])
+
+        failed, = [r for r in results if r.error is not None]
+        self.assertEqual(failed.spec, ('b', 'gone'))
+        self.assertIsInstance(failed.error, ValueError)
+        self.assertEqual(operation.stats.failed, 1)
+
+    def test_calls_for_one_account_keep_their_order(self):
+        specs = [('a', str(i)) for i in range(5)] + [('b', '9')]
+        self.run_bulk(specs)
+
+        self.assertEqual(
+            [c for c in self.calls if c[0] == 'a'],
+            [('a', str(i)) for i in range(5)])
+
+    def test_keyword_specs_are_supported(self):
+        operation, results = self.run_bulk([
+            {'account_token': 'a', 'campaign_id': '1', 'immediate': False}])
+
+        self.assertEqual(results[0].result, {'campaignId': '1'})
+
+
+class ServiceBulkTestCase(SitewitTestCase):
+    @patch.object(sitewit.services.SitewitService, 'delete')
+    def test_bulk_calls_service_method(self, delete_mock):
+        self._mock_response(delete_mock, {'campaignId': '1'})
+
+        results = list(self.service.bulk(
+            'refund_display_campaign_subscription', [('token', '1')]))
+
+        self.assertEqual(results[0].result, {'campaignId': '1'})
+        self.assertDemandsIsCalled(
+            delete_mock, account_token='token',
+            url='api/subscription/refund/campaign/display/1')
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import TestCase
+
+from sitewit.indexes import ExpiryIndex
+from tests.campaigns.base import make_subscription
+
+SITE_ID = 'a' * 32
+
+
+def campaign_ids(subscriptions):
+    return [subscription.campaign_id for subscription in subscriptions]
+
+
+class ExpiryIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = ExpiryIndex([
+            make_subscription(3, 'b' * 32, next_charge='2015-05-10T00:00:00'),
+            make_subscription(1, SITE_ID, next_charge='2015-05-08T00:00:00'),
+            make_subscription(2, SITE_ID, next_charge='2015-05-09T23:59:59'),
+        ])
+
+    def test_subscriptions_are_iterated_in_expiry_order(self):
+        self.assertEqual(campaign_ids(self.index), ['1', '2', '3'])
+
+    def test_expiring_within_includes_both_ends(self):
+        self.assertEqual(
+            campaign_ids(self.index.expiring_within(1, date(2015, 5, 8))),
+            ['1', '2'])
+
+    def test_expiring_between_outside_range_is_empty(self):
+        self.assertEqual(
+            self.index.expiring_between(date(2015, 6, 1), date(2015, 6, 9)),
+            [])
+
+    def test_lookup_by_campaign_id(self):
+        self.assertEqual(self.index.get('2').expiry_date, date(2015, 5, 9))
+        self.assertIsNone(self.index.get('404'))
+
+    def test_lookup_by_site_id(self):
+        self.assertEqual(
+            campaign_ids(self.index.for_site_id(SITE_ID)), ['1', '2'])
+
+    def test_add_replaces_subscription_with_same_campaign_id(self):
+        self.index.add(
+            make_subscription(1, SITE_ID, next_charge='2015-05-20T00:00:00'))
+
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(campaign_ids(self.index), ['2', '3', '1'])
+
+    def test_remove_drops_all_lookups(self):
+        self.index.remove('3')
+
+        self.assertEqual(campaign_ids(self.index), ['1', '2'])
+        self.assertEqual(self.index.for_site_id('b' * 32), [])
+
+    def test_sync_applies_changes_from_new_sweep(self):
+        self.index.sync([
+            make_subscription(1, SITE_ID, next_charge='2015-05-08T00:00:00'),
+            make_subscription(2, SITE_ID, next_charge='2015-05-30T00:00:00'),
+            make_subscription(4, SITE_ID, next_charge='2015-05-01T00:00:00'),
+        ])
+
+        self.assertEqual(campaign_ids(self.index), ['4', '1', '2'])
+
+
+class ExpiryIndexPersistenceTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'expiry.index')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_saved_index_is_loaded_back(self):
+        ExpiryIndex([
+            make_subscription(2, SITE_ID, next_charge='2015-05-09T00:00:00'),
+            make_subscription(1, SITE_ID, next_charge='2015-05-08T00:00:00'),
+        ]).save(self.path)
+
+        index = ExpiryIndex.load(self.path)
+
+        self.assertEqual(campaign_ids(index), ['1', '2'])
+        self.assertEqual(index.get('2').expiry_date, date(2015, 5, 9))
@@ -0,0 +1,216 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date
+from unittest import TestCase
+
+from mock import MagicMock, Mock
+from requests import ConnectionError, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from sitewit.constants import CampaignServiceTypes
+from sitewit.outbox import Outbox, OutboxStatus
+from sitewit.services import HTTPServiceError
+
+
+def http_error(status_code):
+    return HTTPServiceError(Mock(status_code=status_code, json=Mock(
+        return_value={'message': 'error'})))
+
+
+def refused():
+    return ConnectionError(MaxRetryError(
+        None, '/', NewConnectionError(None, 'Connection refused')))
+
+
+class OutboxTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'outbox.sqlite')
+        self.service = MagicMock()
+        self.service.cancel_search_campaign_subscription.return_value = {
+            'campaignId': '1'}
+        self.outbox = Outbox(self.service, self.path, retry_delay=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_enqueued_call_is_sent_on_drain(self):
+        key = self.outbox.enqueue(
+            'cancel_search_campaign_subscription', ('token', '1'),
+            {'immediate': False})
+
+        self.assertFalse(
+            self.service.cancel_search_campaign_subscription.called)
+        self.assertEqual(self.outbox.drain(), 1)
+        cancel = self.service.cancel_search_campaign_subscription
+        cancel.assert_called_once_with('token', '1', immediate=False)
+        self.assertEqual(
+            self.outbox.status(key), ('done', {'campaignId': '1'}, None))
+
+    def test_dates_survive_the_journal(self):
+        self.outbox.enqueue(
+            'subscribe_to_search_campaign', ('token', '1', 100, 'USD'),
+            {'expiry_date': date(2015, 5, 8)})
+        self.outbox.drain()
+
+        self.service.subscribe_to_search_campaign.assert_called_once_with(
+            'token', '1', 100, 'USD', expiry_date=date(2015, 5, 8))
+
+    def test_quickstart_reference_id_deduplicates(self):
+        args = ('token', CampaignServiceTypes.QUICKSTART, 'ref-1')
+        key = self.outbox.enqueue('request_quickstart_campaign_service', args)
+        self.outbox.enqueue('request_quickstart_campaign_service', args)
+
+        self.outbox.drain()
+
+        self.assertEqual(key, 'ref-1')
+        self.assertEqual(
+            self.service.request_quickstart_campaign_service.call_count, 1)
+
+    def test_other_methods_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.outbox.enqueue('delete_account', ('token',))
+
+    def test_calls_that_never_reached_sitewit_are_retried(self):
+        cancel = self.service.cancel_search_campaign_subscription
+        cancel.side_effect = [refused(), {'campaignId': '1'}]
+        key = self.outbox.enqueue(
+            'cancel_search_campaign_subscription', ('token', '1'))
+
+        self.outbox.drain()
+        self.assertEqual(self.outbox.status(key)[0], OutboxStatus.PENDING)
+        self.outbox.drain()
+
+        self.assertEqual(self.outbox.status(key)[0], OutboxStatus.DONE)
+
+    def test_throttled_calls_are_retried(self):
+        refill = self.service.refill_search_campaign_subscription
+        refill.side_effect = [http_error(429), {'campaignId': '1'}]
+        key = self.outbox.enqueue(
+            'refill_search_campaign_subscription',
+            ('token', '1', 50, 100, 'USD'))
+
+        self.outbox.drain()
+        self.assertEqual(self.outbox.status(key)[0], OutboxStatus.PENDING)
+        self.outbox.drain()
+
+        self.assertEqual(self.outbox.status(key)[0], OutboxStatus.DONE)
+
+    def test_server_errors_are_not_repeated(self):
+        cancel = self.service.cancel_search_campaign_subscription
+        cancel.side_effect = http_error(503)
+        key = self.outbox.enqueue(
+            'cancel_search_campaign_subscription', ('token', '1'))
+
+        self.outbox.drain()
+
+        self.assertEqual(self.outbox.uncertain(), [key])
+        self.assertEqual(cancel.call_count, 1)
+
+    def test_timed_out_subscribe_is_not_repeated(self):
+        subscribe = self.service.subscribe_to_search_campaign
+        subscribe.side_effect = ReadTimeout('timed out')
+        key = self.outbox.enqueue(
+            'subscribe_to_search_campaign', ('token', '1', 100, 'USD'))
+
+        self.outbox.drain()
+
+        self.assertEqual(self.outbox.uncertain(), [key])
+        self.assertEqual(self.outbox.drain(), 0)
+        self.assertEqual(subscribe.call_count, 1)
+
+    def test_client_errors_are_not_retried(self):
+        cancel = self.service.cancel_search_campaign_subscription
+        cancel.side_effect = http_error(400)
+        key = self.outbox.enqueue(
+            'cancel_search_campaign_subscription', ('token', '1'))
+
+        self.outbox.drain()
+
+        self.assertEqual(self.outbox.status(key)[0], OutboxStatus.FAILED)
+        self.assertEqual(self.outbox.drain(), 0)
+
+    def test_ambiguous_refill_failure_is_not_repeated(self):
+        refill = self.service.refill_search_campaign_subscription
+        refill.side_effect = ConnectionError('reset')
+        key = self.outbox.enqueue(
+            'refill_search_campaign_subscription',
+            ('token', '1', 50, 100, 'USD'))
+
+        self.outbox.drain()
+
+        self.assertEqual(self.outbox.uncertain(), [key])
+        self.assertEqual(self.outbox.drain(), 0)
+
+        refill.side_effect = None
+        refill.return_value = {'campaignId': '1'}
+        self.outbox.requeue(key)
+        self.outbox.drain()
+        self.assertEqual(self.outbox.status(key)[0], OutboxStatus.DONE)
+
+    def test_calls_of_dead_workers_are_uncertain_after_lease(self):
+        cancel_key = self.outbox.enqueue(
+            'cancel_search_campaign_subscription', ('token', '1'))
+        refill_key = self.outbox.enqueue(
+            'refill_search_campaign_subscription',
+            ('token', '1', 50, 100, 'USD'))
+        crashed = Outbox(self.service, self.path, lease=60)
+        now = time.time()
+        crashed._claim_due(now)
+
+        self.assertEqual(self.outbox.drain(now=now + 59), 0)
+        self.assertEqual(self.outbox.drain(now=now + 60), 0)
+        self.assertEqual(self.outbox.uncertain(), [cancel_key, refill_key])
+        self.assertFalse(
+            self.service.cancel_search_campaign_subscription.called)
+        self.assertFalse(
+            self.service.refill_search_campaign_subscription.called)
+
+    def test_subscribe_of_dead_worker_is_not_repeated(self):
+        key = self.outbox.enqueue(
+            'subscribe_to_search_campaign', ('token', '1', 100, 'USD'))
+        crashed = Outbox(self.service, self.path, lease=60)
+        now = time.time()
+        crashed._claim_due(now)
+
+        self.outbox.drain(now=now + 61)
+
+        self.assertEqual(self.outbox.status(key)[0], OutboxStatus.UNCERTAIN)
+        self.assertFalse(self.service.subscribe_to_search_campaign.called)
+
+    def sending(self):
+        with sqlite3.connect(self.path) as connection:
+            return connection.execute(
+                'SELECT next_attempt FROM outbox WHERE status = ?',
+                (OutboxStatus.SENDING,)).fetchall()
+
+    def test_backlog_is_claimed_a_batch_at_a_time(self):
+        outbox = Outbox(self.service, self.path, max_workers=2)
+        claimed = []
+        cancel = self.service.cancel_search_campaign_subscription
+        cancel.side_effect = lambda *args, **kwargs: claimed.append(
+            len(self.sending()))
+        for i in range(5):
+            outbox.enqueue(
+                'cancel_search_campaign_subscription', ('token-%d' % i, '1'))
+
+        self.assertEqual(outbox.drain(), 5)
+
+        self.assertEqual(len(claimed), 5)
+        self.assertLessEqual(max(claimed), 2)
+
+    def test_lease_starts_when_the_call_is_sent(self):
+        outbox = Outbox(self.service, self.path, lease=60)
+        leases = []
+        cancel = self.service.cancel_search_campaign_subscription
+        cancel.side_effect = lambda *args, **kwargs: leases.append(
+            self.sending()[0][0] - time.time())
+        outbox.enqueue('cancel_search_campaign_subscription', ('token', '1'))
+
+        outbox.drain(now=time.time() + 3600)
+
+        lease, = leases
+        self.assertTrue(0 < lease <= 60)
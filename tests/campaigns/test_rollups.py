@@ -0,0 +1,53 @@
+from datetime import date
+from decimal import Decimal
+from unittest import TestCase
+
+from sitewit.rollups import SubscriptionColumns
+from tests.campaigns.base import make_subscription
+
+
+class SubscriptionColumnsTestCase(TestCase):
+    def setUp(self):
+        self.subscriptions = [
+            make_subscription(budget=19.99, fee=5.0, currency='USD',
+                              next_charge='2015-05-04T10:00:00'),
+            make_subscription(budget=0.01, fee=0.1, currency='USD',
+                              next_charge='2015-05-10T10:00:00'),
+            make_subscription(budget=200.0, fee=19.0, currency='EUR',
+                              next_charge='2015-05-11T10:00:00'),
+        ]
+        partners = {'USD': 'p1', 'EUR': 'p2'}
+        self.columns = SubscriptionColumns.from_subscriptions(
+            self.subscriptions, partner_of=lambda s: partners[s.currency])
+
+    def test_amounts_are_stored_as_integer_cents(self):
+        self.assertEqual(list(self.columns.ad_spend), [1999, 1, 20000])
+        self.assertEqual(list(self.columns.price), [500, 10, 1900])
+
+    def test_totals_by_currency_are_exact_decimals(self):
+        totals = self.columns.totals(by=('currency',))
+
+        self.assertEqual(
+            [(t.key, t.count, t.ad_spend, t.price) for t in totals], [
+                (('EUR',), 1, Decimal('200.00'), Decimal('19.00')),
+                (('USD',), 2, Decimal('20.00'), Decimal('5.10')),
+            ])
+
+    def test_totals_by_partner_and_expiry_week(self):
+        totals = self.columns.totals(by=('partner', 'expiry_week'))
+
+        self.assertEqual([(t.key, t.count) for t in totals], [
+            (('p1', date(2015, 5, 4)), 2),
+            (('p2', date(2015, 5, 11)), 1),
+        ])
+
+    def test_totals_without_grouping_cover_everything(self):
+        total, = self.columns.totals(by=())
+
+        self.assertEqual(total.key, ())
+        self.assertEqual(total.count, 3)
+        self.assertEqual(total.ad_spend, Decimal('220.00'))
+
+    def test_unknown_group_field_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.columns.totals(by=('url',))
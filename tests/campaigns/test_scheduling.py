@@ -0,0 +1,197 @@
+import os
+import shutil
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import TestCase
+
+from mock import MagicMock, Mock
+from requests import ConnectionError, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from sitewit.constants import CampaignTypes
+from sitewit.models import Subscription
+from sitewit.scheduling import RefillScheduler
+from sitewit.services import HTTPServiceError
+
+subscription_data = {
+    'fee': 19.0,
+    'campaignId': 23916,
+    'nextCharge': '2015-05-08T11:32:03',
+    'budget': 200.0,
+    'currency': 'EUR',
+}
+EXPIRY_TIMESTAMP = 1431043200  # 2015-05-08 00:00:00 UTC
+
+
+def refused():
+    return ConnectionError(MaxRetryError(
+        None, '/', NewConnectionError(None, 'Connection refused')))
+
+
+class RefillSchedulerTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'refills.json')
+        self.service = MagicMock()
+        self.scheduler = RefillScheduler(
+            self.service, self.path, batch_window=60, retry_delay=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_subscription_refill_is_due_at_expiry(self):
+        subscription = Subscription(None, 'http://a.com', subscription_data)
+        self.scheduler.schedule_subscription(
+            subscription, 'token', CampaignTypes.SEARCH, 50)
+
+        self.assertEqual(self.scheduler.next_due(), EXPIRY_TIMESTAMP)
+        self.scheduler.run_pending(EXPIRY_TIMESTAMP)
+        refill = self.service.refill_search_campaign_subscription
+        refill.assert_called_once_with(
+            'token', '23916', 50, Decimal('200.0'), 'EUR', expiry_date=None)
+
+    def test_nothing_is_fired_before_due_time(self):
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP, CampaignTypes.SEARCH, 'token', 1, 50, 200, 'EUR')
+
+        self.assertEqual(self.scheduler.run_pending(EXPIRY_TIMESTAMP - 61), [])
+        self.assertFalse(
+            self.service.refill_search_campaign_subscription.called)
+
+    def test_due_refills_are_fired_together(self):
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP, CampaignTypes.SEARCH, 'a', 1, 50, 200, 'EUR')
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP + 30, CampaignTypes.DISPLAY, 'b', 2, 60, 300,
+            'USD', expiry_date=date(2015, 6, 8))
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP + 3600, CampaignTypes.SEARCH, 'c', 3, 1, 1, 'USD')
+
+        outcomes = self.scheduler.run_pending(EXPIRY_TIMESTAMP)
+
+        self.assertEqual(len(outcomes), 2)
+        search_refill = self.service.refill_search_campaign_subscription
+        search_refill.assert_called_once_with(
+            'a', '1', 50, 200, 'EUR', expiry_date=None)
+        display_refill = self.service.refill_display_campaign_subscription
+        display_refill.assert_called_once_with(
+            'b', '2', 60, 300, 'USD', expiry_date=date(2015, 6, 8))
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_failed_refill_is_reported(self):
+        error = ValueError('boom')
+        self.service.refill_search_campaign_subscription.side_effect = error
+        self.scheduler.schedule(
+            datetime(2015, 5, 8), CampaignTypes.SEARCH, 'a', 1, 50, 200, 'EUR')
+
+        outcome, = self.scheduler.run_pending(EXPIRY_TIMESTAMP)
+
+        self.assertIs(outcome.error, error)
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_refill_that_never_reached_sitewit_runs_later(self):
+        refill = self.service.refill_search_campaign_subscription
+        refill.side_effect = [refused(), refused(), {'campaignId': '1'}]
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP, CampaignTypes.SEARCH, 'a', 1, 50, 200, 'EUR')
+
+        outcome, = self.scheduler.run_pending(EXPIRY_TIMESTAMP)
+        self.assertIsNotNone(outcome.error)
+        self.assertEqual(self.scheduler.next_due(), EXPIRY_TIMESTAMP + 60)
+
+        self.scheduler.run_pending(EXPIRY_TIMESTAMP + 60)
+        self.assertEqual(self.scheduler.next_due(), EXPIRY_TIMESTAMP + 180)
+
+        outcome, = self.scheduler.run_pending(EXPIRY_TIMESTAMP + 180)
+        self.assertIsNone(outcome.error)
+        self.assertEqual(refill.call_count, 3)
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_throttled_refill_runs_later(self):
+        refill = self.service.refill_search_campaign_subscription
+        refill.side_effect = [
+            HTTPServiceError(Mock(status_code=429, json=Mock(
+                return_value={'message': 'Slow down'}))),
+            {'campaignId': '1'}]
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP, CampaignTypes.SEARCH, 'a', 1, 50, 200, 'EUR')
+
+        self.scheduler.run_pending(EXPIRY_TIMESTAMP)
+        self.scheduler.run_pending(EXPIRY_TIMESTAMP + 60)
+
+        self.assertEqual(refill.call_count, 2)
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_ambiguous_failure_is_held(self):
+        refill = self.service.refill_search_campaign_subscription
+        refill.side_effect = ReadTimeout('timed out')
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP, CampaignTypes.SEARCH, 'a', 1, 50, 200, 'EUR')
+
+        self.scheduler.run_pending(EXPIRY_TIMESTAMP)
+
+        self.assertEqual(
+            self.scheduler.run_pending(EXPIRY_TIMESTAMP + 3600), [])
+        self.assertIsNone(self.scheduler.next_due())
+        held, = RefillScheduler(self.service, self.path).held()
+        self.assertEqual((held.campaign_id, held.attempts), ('1', 1))
+
+        refill.side_effect = None
+        self.scheduler.requeue(CampaignTypes.SEARCH, 1, EXPIRY_TIMESTAMP)
+        self.scheduler.run_pending(EXPIRY_TIMESTAMP)
+        self.assertEqual(refill.call_count, 2)
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_rescheduling_replaces_pending_refill(self):
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP, CampaignTypes.SEARCH, 'a', 1, 50, 200, 'EUR')
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP + 3600, CampaignTypes.SEARCH, 'a', 1, 50, 200,
+            'EUR')
+
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertEqual(self.scheduler.next_due(), EXPIRY_TIMESTAMP + 3600)
+
+    def test_queue_survives_restart(self):
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP, CampaignTypes.DISPLAY, 'a', 1, 50, 200, 'EUR',
+            expiry_date=date(2015, 6, 8))
+
+        scheduler = RefillScheduler(self.service, self.path)
+        scheduler.run_pending(EXPIRY_TIMESTAMP)
+
+        display_refill = self.service.refill_display_campaign_subscription
+        display_refill.assert_called_once_with(
+            'a', '1', 50, 200, 'EUR', expiry_date=date(2015, 6, 8))
+        self.assertEqual(len(RefillScheduler(self.service, self.path)), 0)
+
+    def test_refills_interrupted_by_restart_are_held(self):
+        restarted = []
+
+        def refill(*args, **kwargs):
+            scheduler = RefillScheduler(self.service, self.path)
+            restarted.append((scheduler.held(), scheduler.next_due()))
+            return {'campaignId': '1'}
+        self.service.refill_search_campaign_subscription.side_effect = refill
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP, CampaignTypes.SEARCH, 'a', 1, 50, 200, 'EUR')
+
+        self.scheduler.run_pending(EXPIRY_TIMESTAMP)
+
+        (held, next_due), = restarted
+        self.assertEqual([job.campaign_id for job in held], ['1'])
+        self.assertIsNone(next_due)
+        self.assertEqual(len(RefillScheduler(self.service, self.path)), 0)
+
+    def test_amounts_stay_decimal_across_restart(self):
+        self.scheduler.schedule(
+            EXPIRY_TIMESTAMP, CampaignTypes.SEARCH, 'a', 1, Decimal('0.10'),
+            Decimal('200.07'), 'EUR')
+
+        RefillScheduler(self.service, self.path).run_pending(EXPIRY_TIMESTAMP)
+
+        refill = self.service.refill_search_campaign_subscription
+        refill.assert_called_once_with(
+            'a', '1', Decimal('0.10'), Decimal('200.07'), 'EUR',
+            expiry_date=None)
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import TestCase
+from uuid import uuid4
+
+from sitewit.models import Subscription
+from sitewit.snapshot import (
+    SnapshotError,
+    SubscriptionSnapshot,
+    write_snapshot,
+)
+from tests.campaigns.base import make_subscription
+
+
+class SubscriptionSnapshotTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'subscriptions.snapshot')
+        self.subscriptions = [
+            make_subscription(1, site_id=uuid4().hex),
+            make_subscription(2),
+            make_subscription(3, budget=200.0),
+        ]
+        self.count = write_snapshot(self.path, iter(self.subscriptions))
+        self.snapshot = SubscriptionSnapshot(self.path)
+
+    def tearDown(self):
+        self.snapshot.close()
+        shutil.rmtree(self.directory)
+
+    def assertSubscriptionsEqual(self, actual, expected):
+        for field in Subscription.FIELDS:
+            self.assertEqual(
+                getattr(actual, field), getattr(expected, field), field)
+
+    def test_all_records_are_written(self):
+        self.assertEqual(self.count, 3)
+        self.assertEqual(len(self.snapshot), 3)
+
+    def test_records_are_accessible_by_index(self):
+        self.assertSubscriptionsEqual(self.snapshot[1], self.subscriptions[1])
+        self.assertSubscriptionsEqual(
+            self.snapshot[-1], self.subscriptions[-1])
+
+    def test_iteration_restores_every_field(self):
+        for actual, expected in zip(self.snapshot, self.subscriptions):
+            self.assertSubscriptionsEqual(actual, expected)
+
+    def test_amounts_round_trip_exactly(self):
+        self.assertEqual(self.snapshot[0].ad_spend, Decimal(19.99))
+        self.assertEqual(self.snapshot[0].expiry_date, date(2015, 5, 8))
+
+    def test_empty_site_id_is_restored_as_none(self):
+        self.assertIsNone(self.snapshot[1].site_id)
+
+    def test_out_of_range_index_raises_index_error(self):
+        with self.assertRaises(IndexError):
+            self.snapshot[3]
+
+    def test_no_temporary_files_are_left_behind(self):
+        self.assertEqual(
+            os.listdir(self.directory), ['subscriptions.snapshot'])
+
+    def test_other_files_are_rejected(self):
+        path = os.path.join(self.directory, 'other')
+        with open(path, 'wb') as other_file:
+            other_file.write(b'\0' * 64)
+
+        with self.assertRaises(SnapshotError):
+            SubscriptionSnapshot(path)
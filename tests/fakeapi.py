@@ -0,0 +1,196 @@
+"""In-process stand-in for SiteWit's API, for tests.
+
+`FakeSitewitAPI` is a requests transport adapter, so a real
+`SitewitService` can talk to it without a network::
+
+    api = FakeSitewitAPI()
+    service = SitewitService(api_url=FAKE_API_URL)
+    service.mount(FAKE_API_URL, api)
+    api.accounts['token'] = {...}
+
+It serves the read endpoints the client caches (accounts, campaigns,
+partners), the subscription audit and the account update, and answers
+conditional GETs the way SiteWit does: every body carries an `ETag` and a
+`Last-Modified`, and a matching `If-None-Match` / `If-Modified-Since` gets
+a bodyless 304. Bodies are gzipped when the request accepts it.
+
+Mounted under several base URLs, it stands in for regional endpoints, and
+`degrade()` makes one of them slow, failing or unreachable::
+
+    service = SitewitService(api_url=[FAKE_API_URL, FAKE_API_EU_URL])
+    service.mount(FAKE_API_URL, api)
+    service.mount(FAKE_API_EU_URL, api)
+    api.degrade(FAKE_API_URL, refuse=True)
+"""
+import base64
+import email.utils
+import gzip
+import hashlib
+import io
+import json
+import re
+import time
+
+from requests.adapters import BaseAdapter
+from requests.exceptions import ConnectionError
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from urllib3.response import HTTPResponse
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:  # Python 2
+    from urlparse import urlsplit
+
+FAKE_API_URL = 'http://fake.sitewit.test/'
+FAKE_API_EU_URL = 'http://eu.fake.sitewit.test/'
+
+
+class FakeSitewitAPI(BaseAdapter):
+    def __init__(self):
+        super(FakeSitewitAPI, self).__init__()
+        self.accounts = {}
+        self.campaigns = {}
+        self.partners = {}
+        self.audit = []
+        self.modified = {}
+        # (method, path, status code) of every request served.
+        self.log = []
+        # Host to (latency, status code, refuse), see `degrade()`.
+        self.degraded = {}
+        # Host of every request, including refused ones.
+        self.hosts = []
+        self._routes = (
+            ('GET', r'/api/account/$', self._get_account),
+            ('PUT', r'/api/account/$', self._update_account),
+            ('GET', r'/api/campaign/$', self._list_campaigns),
+            ('GET', r'/api/partner/$', self._get_partner),
+            ('GET', r'/api/subscription/audit$', self._audit),
+        )
+
+    def touch(self, key):
+        """Mark a resource as changed now, for `Last-Modified`."""
+        self.modified[key] = time.time()
+
+    def degrade(self, url, latency=0, status_code=None, refuse=False):
+        """Make requests to `url`'s host slow, fail or not connect.
+
+        `latency` seconds are added to each of them, `status_code` is
+        answered instead of serving them and `refuse` fails them like an
+        unreachable host. Called with the defaults, heals the host.
+        """
+        self.degraded[urlsplit(url).netloc] = (latency, status_code, refuse)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        path = url.path
+        self.hosts.append(url.netloc)
+        latency, degraded_status, refuse = self.degraded.get(
+            url.netloc, (0, None, False))
+        if refuse:
+            raise ConnectionError(MaxRetryError(
+                None, request.url,
+                NewConnectionError(None, 'Connection refused')),
+                request=request)
+        time.sleep(latency)
+
+        if degraded_status is not None:
+            status_code, body, key = degraded_status, {'message': 'Down'}, None
+        else:
+            status_code, body, key = self._route(request, path)
+
+        response = self._respond(request, status_code, body, key)
+        self.log.append((request.method, path, response.status_code))
+        return response
+
+    def close(self):
+        pass
+
+    def _route(self, request, path):
+        for method, pattern, handler in self._routes:
+            if request.method == method and re.match(pattern, path):
+                return handler(request)
+        return 404, {'message': 'No route'}, None
+
+    def _respond(self, request, status_code, body, key):
+        content = json.dumps(body).encode('utf8')
+        headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+
+        if request.method == 'GET' and status_code == 200:
+            etag = '"%s"' % hashlib.sha1(content).hexdigest()
+            modified = int(self.modified.setdefault(key, time.time()))
+            headers['ETag'] = etag
+            headers['Last-Modified'] = email.utils.formatdate(
+                modified, usegmt=True)
+            if _not_modified(request.headers, etag, modified):
+                status_code, content = 304, b''
+
+        response = Response()
+        response.status_code = status_code
+        if 'gzip' in request.headers.get('Accept-Encoding', '') and content:
+            headers['Content-Encoding'] = 'gzip'
+            # Decoded by urllib3 as it is read, like a real response.
+            response.raw = HTTPResponse(
+                body=io.BytesIO(_gzip(content)), headers=headers,
+                status=status_code, preload_content=False)
+        else:
+            response._content = content
+        response.headers = headers
+        response.url = request.url
+        response.request = request
+        response.reason = 'Fake'
+        return response
+
+    def _auth(self, request):
+        auth = base64.b64decode(request.headers['PartnerAuth'])
+        return auth.decode('utf8').split(':')
+
+    def _get_account(self, request):
+        token = self._auth(request)[2]
+        if token not in self.accounts:
+            return 404, {'message': 'Account not found'}, None
+        return 200, self.accounts[token], ('account', token)
+
+    def _update_account(self, request):
+        token = self._auth(request)[2]
+        if token not in self.accounts:
+            return 404, {'message': 'Account not found'}, None
+        self.accounts[token].update(json.loads(request.body.decode('utf8')))
+        self.touch(('account', token))
+        return 200, self.accounts[token], ('account', token)
+
+    def _list_campaigns(self, request):
+        token = self._auth(request)[2]
+        return 200, self.campaigns.get(token, []), ('campaigns', token)
+
+    def _get_partner(self, request):
+        auth = self._auth(request)
+        subpartner_id = auth[2] if len(auth) > 2 else None
+        if subpartner_id not in self.partners:
+            return 404, {'message': 'Partner not found'}, None
+        return 200, self.partners[subpartner_id], ('partner', subpartner_id)
+
+    def _audit(self, request):
+        query = dict(
+            pair.split('=') for pair in urlsplit(request.url).query.split('&'))
+        skip, limit = int(query['skip']), int(query['limit'])
+        return 200, self.audit[skip:skip + limit], ('audit', skip, limit)
+
+
+def _gzip(content):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as gzip_file:
+        gzip_file.write(content)
+    return buffer.getvalue()
+
+
+def _not_modified(headers, etag, modified):
+    if 'If-None-Match' in headers:
+        return etag in [tag.strip() for tag in
+                        headers['If-None-Match'].split(',')]
+    if 'If-Modified-Since' in headers:
+        since = email.utils.parsedate_tz(headers['If-Modified-Since'])
+        return (since is not None and
+                modified <= email.utils.mktime_tz(since))
+    return False
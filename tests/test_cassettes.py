@@ -0,0 +1,157 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from sitewit.cassettes import (
+    CassetteError,
+    RecordingAdapter,
+    ReplayAdapter,
+    redact,
+)
+from sitewit.services import SitewitService
+from tests.base import SitewitTestCase
+from tests.fakeapi import FAKE_API_URL, FakeSitewitAPI
+
+
+class RedactTestCase(TestCase):
+    def test_auth_headers_are_digested(self):
+        redacted = redact('PartnerAuth', 'secret')
+
+        self.assertTrue(redacted.startswith('redacted:'))
+        self.assertNotIn('secret', redacted)
+        self.assertEqual(redacted, redact('partnerauth', 'secret'))
+        self.assertNotEqual(redacted, redact('PartnerAuth', 'other'))
+
+    def test_other_headers_are_kept(self):
+        self.assertEqual(redact('Accept', 'application/json'),
+                         'application/json')
+
+
+class CassetteTestCase(SitewitTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cassette.jsonl')
+
+        self.api = FakeSitewitAPI()
+        self.api.accounts['token'] = {'token': 'token', 'url': 'a.com'}
+        self.api.accounts['other'] = {'token': 'other', 'url': 'b.com'}
+        self.api.audit = [{'url': 'http://example.com/%d' % i}
+                          for i in range(100)]
+
+    def record(self, calls, latency=0):
+        self.api.degrade(FAKE_API_URL, latency=latency)
+        service = SitewitService(api_url=FAKE_API_URL)
+        recorder = RecordingAdapter(self.api, self.path)
+        service.mount(FAKE_API_URL, recorder)
+        results = [call(service) for call in calls]
+        recorder.close()
+        return results
+
+    def replay(self, speed=None):
+        return SitewitService(
+            api_url=FAKE_API_URL, replay_from=self.path, replay_speed=speed)
+
+    def test_replay_returns_recorded_responses(self):
+        recorded = self.record([
+            lambda service: service.get_account('token'),
+            lambda service: service.list_subscriptions(0, 100),
+        ])
+        served = len(self.api.log)
+
+        service = self.replay()
+        replayed = [service.get_account('token'),
+                    service.list_subscriptions(0, 100)]
+
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(len(self.api.log), served)
+        self.assertEqual(service.transport.remaining, 0)
+
+    def test_calls_are_told_apart_by_account(self):
+        self.record([
+            lambda service: service.get_account('token'),
+            lambda service: service.get_account('other'),
+        ])
+
+        service = self.replay()
+
+        self.assertEqual(service.get_account('other')['url'], 'b.com')
+        self.assertEqual(service.get_account('token')['url'], 'a.com')
+
+    def test_writes_are_matched_by_body(self):
+        self.record([
+            lambda service: service.update_account('token', url='c.com'),
+            lambda service: service.update_account('token', url='d.com'),
+        ])
+
+        service = self.replay()
+
+        self.assertEqual(
+            service.update_account('token', url='d.com')['url'], 'd.com')
+
+    def test_unrecorded_calls_raise(self):
+        self.record([lambda service: service.get_account('token')])
+        service = self.replay()
+        service.get_account('token')
+
+        with self.assertRaises(CassetteError):
+            service.get_account('token')
+
+    def test_secrets_are_not_recorded(self):
+        service = SitewitService(api_url=FAKE_API_URL)
+        auth = service._get_account_auth_header('token')['PartnerAuth']
+        if isinstance(auth, bytes):
+            auth = auth.decode('ascii')
+        self.record([lambda service: service.get_account('token')])
+
+        with io.open(self.path, encoding='utf8') as cassette:
+            content = cassette.read()
+        self.assertNotIn(auth, content)
+        self.assertNotIn(
+            self.config.common.sitewit['affiliate_token'], content)
+
+    def test_compressed_responses_are_stored_decoded(self):
+        self.record([lambda service: service.get_account('token')])
+
+        with io.open(self.path, encoding='utf8') as cassette:
+            header, interaction = [json.loads(line) for line in cassette]
+        self.assertEqual(header['version'], 1)
+        self.assertEqual(json.loads(interaction['content']),
+                         self.api.accounts['token'])
+        self.assertNotIn('Content-Encoding', interaction['response_headers'])
+
+    def test_replay_timing_can_be_accelerated(self):
+        self.record([lambda service: service.get_account('token')],
+                    latency=0.1)
+
+        started = time.time()
+        self.replay(speed=10).get_account('token')
+        accelerated = time.time() - started
+        started = time.time()
+        self.replay(speed=1).get_account('token')
+        recorded = time.time() - started
+
+        self.assertLess(accelerated, 0.08)
+        self.assertGreaterEqual(recorded, 0.1)
+
+    def test_service_records_through_its_pool(self):
+        service = SitewitService(record_to=self.path)
+
+        self.assertIsInstance(service.transport, RecordingAdapter)
+        self.assertIs(service.transport.adapter, service.connection_pool)
+        self.assertIs(service.get_adapter('https://x.test/'),
+                      service.transport)
+
+    def test_replay_does_not_pool_connections(self):
+        with io.open(self.path, 'w', encoding='utf8') as cassette:
+            cassette.write(u'{"version": 1}\n')
+
+        service = self.replay()
+
+        self.assertIsInstance(service.transport, ReplayAdapter)
+        self.assertIs(service.get_adapter('https://x.test/'),
+                      service.transport)
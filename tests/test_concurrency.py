@@ -0,0 +1,272 @@
+import threading
+import time
+from unittest import TestCase
+
+from mock import MagicMock, Mock, patch
+from requests import ConnectionError
+
+import sitewit.services
+from sitewit.concurrency import AdaptiveLimit, KeyedExecutor, PriorityGate
+from sitewit.constants import RequestPriorities
+from sitewit.services import HTTPServiceError
+from tests.base import SitewitTestCase
+
+INTERACTIVE = RequestPriorities.INTERACTIVE
+BACKGROUND = RequestPriorities.BACKGROUND
+
+
+class KeyedExecutorTestCase(TestCase):
+    def setUp(self):
+        self.executor = KeyedExecutor(4)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def record(self, key, value, delay=0):
+        time.sleep(delay)
+        with self.lock:
+            self.calls.append((key, value))
+        return value
+
+    def test_future_holds_result(self):
+        future = self.executor.submit('a', self.record, 'a', 1)
+
+        self.assertEqual(future.result(timeout=1), 1)
+
+    def test_calls_for_one_key_run_in_submission_order(self):
+        futures = [
+            self.executor.submit('a', self.record, 'a', i, 0.01 * (5 - i))
+            for i in range(5)]
+        for future in futures:
+            future.result(timeout=1)
+
+        self.assertEqual(self.calls, [('a', i) for i in range(5)])
+
+    def test_different_keys_run_in_parallel(self):
+        started = threading.Event()
+
+        def wait_for_other_key():
+            return started.wait(1)
+
+        blocked = self.executor.submit('a', wait_for_other_key)
+        self.executor.submit('b', started.set).result(timeout=1)
+
+        self.assertTrue(blocked.result(timeout=1))
+
+    def test_errors_do_not_stop_the_key(self):
+        failed = self.executor.submit('a', int, 'x')
+        future = self.executor.submit('a', self.record, 'a', 1)
+
+        self.assertIsInstance(failed.exception(timeout=1), ValueError)
+        self.assertEqual(future.result(timeout=1), 1)
+
+    def test_submitted_calls_finish_on_shutdown(self):
+        futures = [self.executor.submit('a', self.record, 'a', i, 0.01)
+                   for i in range(3)]
+        self.executor.shutdown()
+
+        self.assertTrue(all(future.done() for future in futures))
+        with self.assertRaises(RuntimeError):
+            self.executor.submit('a', self.record, 'a', 4)
+
+
+class ServiceSubmitTestCase(SitewitTestCase):
+    @patch.object(sitewit.services.SitewitService, 'put')
+    def test_submit_returns_future_of_method_result(self, put_mock):
+        self._mock_response(put_mock, {'token': 'token'})
+
+        future = self.service.submit(
+            'set_account_client_id', 'token', 'site_id')
+
+        self.assertEqual(future.result(timeout=1), {'token': 'token'})
+        self.assertDemandsIsCalled(
+            put_mock, {'clientId': 'site_id'}, account_token='token',
+            url='/api/Account/ClientId')
+
+
+class PriorityGateTestCase(TestCase):
+    def setUp(self):
+        self.gate = PriorityGate(
+            capacity=3, reserved=1, busy_background=1, quiet_period=0.05)
+
+    def acquire_in_thread(self, priority):
+        acquired = threading.Event()
+
+        def acquire():
+            self.gate.acquire(priority)
+            acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.daemon = True
+        thread.start()
+        return acquired
+
+    def test_background_never_takes_reserved_slots(self):
+        self.gate.acquire(BACKGROUND)
+        self.gate.acquire(BACKGROUND)
+
+        self.assertFalse(self.acquire_in_thread(BACKGROUND).wait(0.1))
+        self.assertTrue(self.acquire_in_thread(INTERACTIVE).wait(0.1))
+
+    def test_interactive_waits_only_for_full_capacity(self):
+        for _ in range(3):
+            self.gate.acquire(INTERACTIVE)
+
+        acquired = self.acquire_in_thread(INTERACTIVE)
+        self.assertFalse(acquired.wait(0.05))
+
+        self.gate.release(INTERACTIVE)
+        self.assertTrue(acquired.wait(0.1))
+
+    def test_waiting_interactive_call_goes_first(self):
+        for _ in range(3):
+            self.gate.acquire(INTERACTIVE)
+        interactive = self.acquire_in_thread(INTERACTIVE)
+        time.sleep(0.01)
+        background = self.acquire_in_thread(BACKGROUND)
+
+        self.gate.release(INTERACTIVE)
+
+        self.assertTrue(interactive.wait(0.1))
+        self.assertFalse(background.wait(0.02))
+
+    def test_background_is_throttled_while_interactive_traffic_is_present(
+            self):
+        self.gate.acquire(INTERACTIVE)
+        self.gate.acquire(BACKGROUND)
+
+        self.assertFalse(self.acquire_in_thread(BACKGROUND).wait(0.05))
+
+    def test_background_throttle_lifts_after_quiet_period(self):
+        with self.gate.slot(INTERACTIVE):
+            pass
+        self.gate.acquire(BACKGROUND)
+
+        self.assertTrue(self.acquire_in_thread(BACKGROUND).wait(0.5))
+
+
+class AdaptiveLimitTestCase(TestCase):
+    def setUp(self):
+        self.limit = AdaptiveLimit(initial=4, minimum=2, maximum=6, warmup=3)
+
+    def test_limit_grows_by_about_one_per_round_of_healthy_calls(self):
+        for _ in range(4):
+            self.limit.record(0.1, healthy=True)
+
+        self.assertAlmostEqual(self.limit.limit, 5, delta=0.1)
+
+    def test_limit_does_not_grow_while_unused(self):
+        self.limit.record(0.1, healthy=True, saturated=False)
+
+        self.assertEqual(self.limit.limit, 4)
+
+    def test_limit_is_capped_at_maximum(self):
+        for _ in range(100):
+            self.limit.record(0.1, healthy=True)
+
+        self.assertEqual(self.limit.limit, 6)
+
+    def test_unhealthy_call_halves_limit_down_to_minimum(self):
+        self.limit.record(0.1, healthy=False)
+        self.assertEqual(self.limit.limit, 2)
+
+        self.limit._last_decrease = float('-inf')
+        self.limit.record(0.1, healthy=False)
+        self.assertEqual(self.limit.limit, 2)
+
+    def test_burst_of_errors_counts_once(self):
+        for _ in range(3):
+            self.limit.record(0.1, healthy=True)
+        self.limit.record(0.1, healthy=False)
+        self.limit.record(0.1, healthy=False)
+
+        self.assertAlmostEqual(self.limit.limit, 2.3, delta=0.1)
+
+    def test_latency_spike_cuts_limit(self):
+        for _ in range(3):
+            self.limit.record(0.1, healthy=True, saturated=False)
+        self.limit.record(0.5, healthy=True)
+
+        self.assertEqual(self.limit.limit, 2)
+
+
+class GateWithAdaptiveLimitTestCase(TestCase):
+    def test_capacity_follows_limit(self):
+        gate = PriorityGate(capacity=AdaptiveLimit(initial=4, minimum=2),
+                            reserved=1)
+
+        with gate.slot(BACKGROUND) as slot:
+            slot.healthy = False
+
+        self.assertEqual(gate.capacity, 2)
+
+    def test_reserved_slots_must_fit_minimum(self):
+        with self.assertRaises(ValueError):
+            PriorityGate(capacity=AdaptiveLimit(minimum=2), reserved=2)
+
+
+class ServiceAdaptiveConcurrencyTestCase(SitewitTestCase):
+    def setUp(self):
+        self.service = sitewit.services.SitewitService()
+
+    @patch('demands.HTTPServiceClient.request')
+    def test_overloaded_response_halves_capacity(self, request_mock):
+        request_mock.side_effect = HTTPServiceError(Mock(
+            status_code=429, json=Mock(return_value={})))
+
+        with self.assertRaises(HTTPServiceError):
+            self.service.get_account('token')
+
+        self.assertEqual(self.service._gate.capacity, 5)
+
+    @patch('demands.HTTPServiceClient.request')
+    def test_connection_error_halves_capacity(self, request_mock):
+        request_mock.side_effect = ConnectionError()
+
+        with self.assertRaises(ConnectionError):
+            self.service.get_account('token')
+
+        self.assertEqual(self.service._gate.capacity, 5)
+
+    @patch('demands.HTTPServiceClient.request')
+    def test_client_errors_are_not_overload(self, request_mock):
+        request_mock.side_effect = HTTPServiceError(Mock(
+            status_code=404, json=Mock(return_value={})))
+
+        with self.assertRaises(HTTPServiceError):
+            self.service.get_account('token')
+
+        self.assertEqual(self.service._gate.capacity, 10)
+
+
+class ServicePriorityTestCase(SitewitTestCase):
+    def setUp(self):
+        self.service = sitewit.services.SitewitService()
+        self.priorities = []
+        self.service._gate = Mock(slot=Mock(
+            side_effect=lambda p: self.priorities.append(p) or MagicMock()))
+
+    @patch('demands.HTTPServiceClient.request',
+           return_value=Mock(status_code=200))
+    def test_calls_are_interactive_by_default(self, request_mock):
+        self.service.get_account('token')
+
+        self.assertEqual(self.priorities, [INTERACTIVE])
+
+    @patch('demands.HTTPServiceClient.request',
+           return_value=Mock(status_code=200))
+    def test_priority_block_applies_to_calls(self, request_mock):
+        with self.service.priority(BACKGROUND):
+            self.service.get_account('token')
+        self.service.get_account('token')
+
+        self.assertEqual(self.priorities, [BACKGROUND, INTERACTIVE])
+
+    @patch('demands.HTTPServiceClient.request',
+           return_value=Mock(status_code=200))
+    def test_subscription_audit_runs_in_background(self, request_mock):
+        self.service.list_subscriptions()
+
+        self.assertEqual(self.priorities, [BACKGROUND])
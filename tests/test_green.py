@@ -0,0 +1,164 @@
+import os
+import subprocess
+import sys
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, skipIf
+
+from mock import Mock, patch
+
+try:
+    from importlib.util import find_spec
+except ImportError:  # Python 2
+    from pkgutil import find_loader as find_spec
+
+from sitewit.concurrency import make_executor
+from sitewit.green import EVENTLET, GEVENT, GreenExecutor, cooperative_library
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class CooperativeLibraryTestCase(TestCase):
+    def test_unpatched_process(self):
+        self.assertIsNone(cooperative_library())
+        self.assertIsInstance(make_executor(2), ThreadPoolExecutor)
+
+    def test_gevent_patched_threading(self):
+        monkey = Mock(is_module_patched=Mock(return_value=True))
+        with patch.dict(sys.modules, {'gevent.monkey': monkey}):
+            self.assertEqual(cooperative_library(), GEVENT)
+        monkey.is_module_patched.assert_called_once_with('threading')
+
+    def test_eventlet_patched_threading(self):
+        patcher = Mock(is_monkey_patched=Mock(return_value=True))
+        with patch.dict(sys.modules, {'eventlet.patcher': patcher}):
+            self.assertEqual(cooperative_library(), EVENTLET)
+
+    def test_imported_but_not_patched(self):
+        monkey = Mock(is_module_patched=Mock(return_value=False))
+        with patch.dict(sys.modules, {'gevent.monkey': monkey}):
+            self.assertIsNone(cooperative_library())
+
+    @patch('sitewit.concurrency.cooperative_library', return_value=GEVENT)
+    @patch('sitewit.green._spawner')
+    def test_patched_process_gets_green_executor(self, spawner, library):
+        self.assertIsInstance(make_executor(2), GreenExecutor)
+
+
+class GreenExecutorTestCase(TestCase):
+    def setUp(self):
+        # Green threads that only run when the test says so.
+        self.spawned = []
+        patcher = patch('sitewit.green._spawner',
+                        return_value=self.spawned.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.executor = GreenExecutor(2, GEVENT)
+
+    def run_green_threads(self):
+        while self.spawned:
+            self.spawned.pop(0)()
+
+    def test_calls_run_in_order_on_at_most_max_workers(self):
+        calls = []
+        futures = [self.executor.submit(calls.append, i) for i in range(5)]
+
+        self.assertEqual(len(self.spawned), 2)
+        self.run_green_threads()
+
+        self.assertEqual(calls, [0, 1, 2, 3, 4])
+        self.assertTrue(all(future.done() for future in futures))
+
+    def test_failures_are_set_on_futures(self):
+        future = self.executor.submit(int, 'x')
+        self.run_green_threads()
+
+        self.assertIsInstance(future.exception(), ValueError)
+
+    def test_calls_can_submit_more_calls(self):
+        inner = []
+        outer = self.executor.submit(
+            lambda: inner.append(self.executor.submit(lambda: 'inner')))
+        self.run_green_threads()
+
+        self.assertIsNone(outer.result())
+        self.assertEqual(inner[0].result(), 'inner')
+
+    def test_cancelled_calls_are_skipped(self):
+        future = self.executor.submit(Mock())
+        future.cancel()
+        self.run_green_threads()
+
+        self.assertTrue(future.cancelled())
+
+    def test_shutdown(self):
+        self.executor.submit(Mock())
+        self.run_green_threads()
+        self.executor.shutdown()
+
+        with self.assertRaises(RuntimeError):
+            self.executor.submit(Mock())
+
+    def test_max_workers_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            GreenExecutor(0, GEVENT)
+
+
+_LOOKUPS = textwrap.dedent('''
+    %(patch)s
+
+    import os
+
+    from yoconfig import configure
+    from yoconfigurator.base import read_config
+
+    from sitewit.concurrency import make_executor
+    from sitewit.services import SitewitService
+    from tests.fakeapi import FAKE_API_URL, FakeSitewitAPI
+
+    configure(sitewit=read_config(%(root)r).common.sitewit)
+    api = FakeSitewitAPI()
+    api.degrade(FAKE_API_URL, latency=0.02)
+    for i in range(1000):
+        api.accounts['token-%%d' %% i] = {'token': 'token-%%d' %% i}
+    service = SitewitService(
+        api_url=FAKE_API_URL, adaptive_concurrency=False,
+        max_concurrent_requests=100)
+    service.mount(FAKE_API_URL, api)
+
+    executor = make_executor(1000)
+    futures = [executor.submit(service.get_account, 'token-%%d' %% i)
+               for i in range(1000)]
+    accounts = [future.result()['token'] for future in futures]
+    assert accounts == ['token-%%d' %% i for i in range(1000)]
+    bulk = list(service.bulk('get_account', [
+        ('token-%%d' %% i,) for i in range(100)], max_concurrency=50))
+    assert not any(result.error for result in bulk)
+    print(type(executor).__name__, len(os.listdir('/proc/self/task')))
+''')
+
+
+@skipIf(not os.path.isdir('/proc/self/task'), 'Counts threads in /proc')
+class CooperativeModeTestCase(TestCase):
+    def run_lookups(self, patch):
+        script = _LOOKUPS % {'patch': patch, 'root': ROOT}
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.check_output(
+            [sys.executable, '-c', script], cwd=ROOT, env=env)
+        return output.decode('utf8').split()
+
+    @skipIf(find_spec('gevent') is None, 'gevent is not installed')
+    def test_gevent_lookups_use_no_os_threads(self):
+        executor, threads = self.run_lookups(
+            'from gevent import monkey\nmonkey.patch_all()')
+
+        self.assertEqual(executor, 'GreenExecutor')
+        self.assertEqual(int(threads), 1)
+
+    @skipIf(find_spec('eventlet') is None, 'eventlet is not installed')
+    def test_eventlet_lookups_use_no_os_threads(self):
+        executor, threads = self.run_lookups(
+            'import eventlet\neventlet.monkey_patch()')
+
+        self.assertEqual(executor, 'GreenExecutor')
+        self.assertEqual(int(threads), 1)
@@ -0,0 +1,115 @@
+import threading
+import time
+
+from demands import HTTPServiceError
+
+from sitewit.constants import RequestPriorities
+from sitewit.pipeline import PipelineError
+from sitewit.services import SitewitService
+from tests.base import SitewitTestCase
+from tests.fakeapi import FAKE_API_URL, FakeSitewitAPI
+
+
+class PipelineTestCase(SitewitTestCase):
+    def setUp(self):
+        self.api = FakeSitewitAPI()
+        self.api.accounts['token'] = {'token': 'token', 'url': 'a.com'}
+        self.api.campaigns['token'] = [{'id': 1}]
+        self.api.partners[None] = {'name': 'Partner'}
+        self.api.audit = [{'url': 'http://example.com/'}]
+        self.service = SitewitService(api_url=FAKE_API_URL)
+        self.service.mount(FAKE_API_URL, self.api)
+
+    def test_calls_run_concurrently_on_exit(self):
+        self.api.degrade(FAKE_API_URL, latency=0.1)
+
+        started = time.time()
+        with self.service.pipeline() as pipeline:
+            account = pipeline.get_account('token')
+            campaigns = pipeline.list_campaigns('token')
+            partner = pipeline.get_partner()
+            audit = pipeline.list_subscriptions(0, 10)
+            self.assertEqual(self.api.log, [])
+        elapsed = time.time() - started
+
+        self.assertLess(elapsed, 0.3)
+        self.assertEqual(account.result()['url'], 'a.com')
+        self.assertEqual(campaigns.result(), [{'id': 1}])
+        self.assertEqual(partner.result(), {'name': 'Partner'})
+        self.assertEqual(audit.result(), self.api.audit)
+
+    def test_failures_are_kept_per_call(self):
+        with self.service.pipeline() as pipeline:
+            missing = pipeline.get_account('missing')
+            account = pipeline.get_account('token')
+
+        self.assertIsInstance(missing.exception(), HTTPServiceError)
+        self.assertEqual(account.result()['url'], 'a.com')
+
+    def test_results_are_not_available_inside_the_block(self):
+        with self.service.pipeline() as pipeline:
+            account = pipeline.get_account('token')
+            with self.assertRaises(PipelineError):
+                account.result()
+
+    def test_error_in_block_cancels_the_calls(self):
+        with self.assertRaises(ValueError):
+            with self.service.pipeline() as pipeline:
+                account = pipeline.get_account('token')
+                raise ValueError()
+
+        self.assertTrue(account.cancelled())
+        self.assertEqual(self.api.log, [])
+
+    def test_calls_keep_the_callers_priority(self):
+        threads = set()
+
+        def priority():
+            threads.add(threading.current_thread())
+            return self.service.current_priority
+
+        with self.service.priority(RequestPriorities.BACKGROUND):
+            with self.service.pipeline() as pipeline:
+                futures = [pipeline.queue(priority) for _ in range(3)]
+
+        self.assertEqual([future.result() for future in futures],
+                         [RequestPriorities.BACKGROUND] * 3)
+        self.assertIn(threading.current_thread(), threads)
+        self.assertGreater(len(threads), 1)
+
+    def test_pipeline_runs_once(self):
+        pipeline = self.service.pipeline()
+        self.assertEqual(pipeline.execute(), [])
+
+        with self.assertRaises(PipelineError):
+            pipeline.execute()
+        with self.assertRaises(PipelineError):
+            pipeline.get_account('token')
+
+    def test_only_public_methods_can_be_queued(self):
+        pipeline = self.service.pipeline()
+
+        with self.assertRaises(AttributeError):
+            pipeline._get_json
+        with self.assertRaises(AttributeError):
+            pipeline.url
+
+    def test_helpers_can_not_be_queued(self):
+        pipeline = self.service.pipeline()
+
+        for name in ('priority', 'pipeline', 'submit', 'bulk', 'mount',
+                     'get', 'request', 'close', 'pipeline_executor',
+                     'current_priority', 'endpoint_health'):
+            with self.assertRaises(AttributeError):
+                getattr(pipeline, name)
+
+    def test_interrupts_are_not_swallowed(self):
+        pipeline = self.service.pipeline()
+        future = pipeline.queue(self.interrupt)
+
+        with self.assertRaises(KeyboardInterrupt):
+            pipeline.execute()
+        self.assertIsInstance(future.exception(), KeyboardInterrupt)
+
+    def interrupt(self):
+        raise KeyboardInterrupt()
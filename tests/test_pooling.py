@@ -0,0 +1,143 @@
+import threading
+import time
+from unittest import TestCase
+
+from requests import Session
+
+from sitewit.pooling import KeepAliveAdapter, PoolStats
+from sitewit.services import SitewitService
+from tests.base import SitewitTestCase
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class _CountingServer(HTTPServer):
+    connections = 0
+
+    def process_request(self, request, client_address):
+        # One thread per connection, so keep-alive clients can queue up.
+        self.connections += 1
+        thread = threading.Thread(
+            target=self.process_request_thread,
+            args=(request, client_address))
+        thread.daemon = True
+        thread.start()
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class LocalServerTestCase(TestCase):
+    def setUp(self):
+        self.server = _CountingServer(('127.0.0.1', 0), _KeepAliveHandler)
+        thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.01,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+
+
+class KeepAliveAdapterTestCase(LocalServerTestCase):
+    def session(self, **kwargs):
+        session = Session()
+        self.adapter = KeepAliveAdapter(**kwargs)
+        session.mount('http://', self.adapter)
+        self.addCleanup(session.close)
+        self.verify = session.merge_environment_settings(
+            self.url, {}, None, None, None)['verify']
+        return session
+
+    def test_connections_are_reused(self):
+        session = self.session()
+        for _ in range(3):
+            session.get(self.url)
+
+        stats = self.adapter.stats
+        self.assertEqual(stats.checkouts, 3)
+        self.assertEqual(stats.new_connections, 1)
+        self.assertEqual(stats.reused_connections, 2)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_prewarmed_connections_are_used(self):
+        session = self.session(pool_maxsize=4)
+
+        self.assertEqual(self.adapter.prewarm(self.url, 3, self.verify), 3)
+        session.get(self.url)
+
+        stats = self.adapter.stats
+        self.assertEqual(stats.prewarmed, 3)
+        self.assertEqual(stats.new_connections, 0)
+        self.assertEqual(self.server.connections, 3)
+
+    def test_prewarm_failures_are_not_raised(self):
+        self.session()
+
+        self.assertEqual(self.adapter.prewarm('http://127.0.0.1:1/', 2), 0)
+
+    def test_idle_connections_are_closed_before_use(self):
+        session = self.session(idle_timeout=60)
+        session.get(self.url)
+        self.adapter.reap_idle()
+        self.assertEqual(self.adapter.stats.reaped, 0)
+
+        for pool in self.adapter.pools():
+            pool.idle_timeout = 0
+        time.sleep(0.01)
+        session.get(self.url)
+
+        stats = self.adapter.stats
+        self.assertEqual(stats.reaped, 1)
+        self.assertEqual(stats.new_connections, 2)
+
+    def test_reaper_closes_idle_connections(self):
+        session = self.session(idle_timeout=0.05)
+        session.get(self.url)
+        time.sleep(0.2)
+
+        self.assertEqual(self.adapter.stats.reaped, 1)
+        session.get(self.url)
+        self.assertEqual(self.adapter.stats.new_connections, 2)
+
+    def test_stats_averages(self):
+        stats = PoolStats(4, 1, 0, 0, 0.2, 0.1)
+
+        self.assertEqual(stats.reused_connections, 3)
+        self.assertAlmostEqual(stats.mean_wait_time, 0.05)
+
+
+class ServicePoolingTestCase(SitewitTestCase, LocalServerTestCase):
+    def test_service_prewarms_its_pool(self):
+        service = SitewitService(api_url=self.url, prewarm_connections=2)
+        self.addCleanup(service.close)
+
+        for _ in range(50):
+            if service.connection_pool.stats.prewarmed == 2:
+                break
+            time.sleep(0.01)
+        service.get('/api/user')
+
+        stats = service.connection_pool.stats
+        self.assertEqual(stats.prewarmed, 2)
+        self.assertEqual(stats.new_connections, 0)
@@ -0,0 +1,184 @@
+from unittest import TestCase
+
+from demands import HTTPServiceError
+from mock import Mock
+from requests.exceptions import ConnectTimeout, ConnectionError, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from sitewit.routing import EndpointSelector, never_sent
+from sitewit.services import SitewitService
+from tests.base import SitewitTestCase
+from tests.fakeapi import FAKE_API_EU_URL, FAKE_API_URL, FakeSitewitAPI
+
+US, EU, ASIA = 'https://us.test/', 'https://eu.test/', 'https://asia.test/'
+
+
+class EndpointSelectorTestCase(TestCase):
+    def setUp(self):
+        self.selector = EndpointSelector([US, EU, ASIA], recovery=10)
+
+    def test_configured_order_until_measured(self):
+        self.assertEqual(self.selector.ranked(now=0), [US, EU, ASIA])
+
+    def test_slow_endpoint_is_avoided(self):
+        self.selector.record(US, 0.5, True, now=0)
+        self.selector.record(EU, 0.1, True, now=0)
+        self.selector.record(ASIA, 0.2, True, now=0)
+
+        self.assertEqual(self.selector.ranked(now=0), [EU, ASIA, US])
+
+    def test_errors_are_penalized(self):
+        self.selector.record(US, 0.1, False, now=0)
+        self.selector.record(EU, 0.3, True, now=0)
+        self.selector.record(ASIA, 0.3, True, now=0)
+
+        self.assertEqual(self.selector.ranked(now=0)[-1], US)
+
+    def test_close_scores_keep_configured_order(self):
+        self.selector.record(US, 0.15, True, now=0)
+        self.selector.record(EU, 0.1, True, now=0)
+        self.selector.record(ASIA, 0.1, True, now=0)
+
+        self.assertEqual(self.selector.ranked(now=0)[0], US)
+
+    def test_averages_are_exponentially_weighted(self):
+        selector = EndpointSelector([US, EU], smoothing=0.5)
+        selector.record(US, 1.0, False, now=0)
+        selector.record(US, 0.0, True, now=0)
+
+        health = selector.snapshot(now=0)[US]
+        self.assertEqual(health.latency, 0.5)
+        self.assertEqual(health.error_rate, 0.5)
+
+    def test_failed_endpoint_recovers_over_time(self):
+        selector = EndpointSelector([US, EU], recovery=10)
+        selector.record(US, 1.0, False, now=0)
+        selector.record(EU, 0.1, True, now=0)
+        self.assertEqual(selector.ranked(now=0)[0], EU)
+
+        # Its score halves every 10s while nobody uses it.
+        self.assertAlmostEqual(selector.snapshot(now=100)[US].score,
+                               6.0 / 1024)
+        self.assertEqual(selector.ranked(now=100)[0], US)
+
+    def test_urls_are_required(self):
+        with self.assertRaises(ValueError):
+            EndpointSelector([])
+
+
+class NeverSentTestCase(TestCase):
+    def test_refused_connections_were_never_sent(self):
+        refused = NewConnectionError(None, 'Connection refused')
+
+        self.assertTrue(never_sent(ConnectTimeout()))
+        self.assertTrue(never_sent(ConnectionError(refused)))
+        self.assertTrue(never_sent(
+            ConnectionError(MaxRetryError(None, US, refused))))
+
+    def test_broken_connections_may_have_been_sent(self):
+        self.assertFalse(never_sent(ReadTimeout()))
+        self.assertFalse(never_sent(ConnectionError('Connection reset')))
+        self.assertFalse(never_sent(ConnectionError()))
+
+
+class ServiceFailoverTestCase(SitewitTestCase):
+    def setUp(self):
+        self.api = FakeSitewitAPI()
+        self.api.accounts['token'] = {'token': 'token', 'url': 'a.com'}
+        self.service = SitewitService(api_url=[FAKE_API_URL, FAKE_API_EU_URL])
+        self.service.mount(FAKE_API_URL, self.api)
+        self.service.mount(FAKE_API_EU_URL, self.api)
+
+    def test_first_url_is_used_while_healthy(self):
+        self.service.get_account('token')
+        self.service.get_account('token')
+
+        self.assertEqual(self.api.hosts, ['fake.sitewit.test'] * 2)
+
+    def test_reads_fail_over_on_connection_errors(self):
+        self.api.degrade(FAKE_API_URL, refuse=True)
+
+        account = self.service.get_account('token')
+        self.service.get_account('token')
+
+        self.assertEqual(account['url'], 'a.com')
+        self.assertEqual(self.api.hosts, [
+            'fake.sitewit.test', 'eu.fake.sitewit.test',
+            'eu.fake.sitewit.test'])
+        health = self.service.endpoint_health
+        self.assertEqual(health[FAKE_API_URL].error_rate, 1.0)
+        self.assertEqual(health[FAKE_API_EU_URL].error_rate, 0.0)
+
+    def prefixed_service(self, api_urls):
+        service = SitewitService(api_url=api_urls)
+        for api_url in api_urls:
+            service.mount(api_url, self.api)
+        self.api.degrade(api_urls[0], refuse=True)
+        return service
+
+    def test_fail_over_from_url_with_path_prefix(self):
+        service = self.prefixed_service(
+            ['http://fake.sitewit.test/v1/', FAKE_API_EU_URL])
+
+        account = service.get_account('token')
+
+        self.assertEqual(account['url'], 'a.com')
+        self.assertEqual(self.api.log, [('GET', '/api/account/', 200)])
+
+    def test_fail_over_to_url_with_path_prefix(self):
+        service = self.prefixed_service(
+            [FAKE_API_URL, 'http://eu.fake.sitewit.test/v1/'])
+
+        with self.assertRaises(HTTPServiceError):
+            service.get_account('token')  # The fake has no /v1/ routes.
+
+        self.assertEqual(self.api.log, [('GET', '/v1/api/account/', 404)])
+
+    def test_writes_fail_over_when_never_sent(self):
+        self.api.degrade(FAKE_API_URL, refuse=True)
+
+        self.service.update_account('token', url='b.com')
+
+        self.assertEqual(self.api.accounts['token']['url'], 'b.com')
+
+    def test_writes_are_not_repeated_when_maybe_sent(self):
+        self.service.mount(FAKE_API_URL, Mock(
+            send=Mock(side_effect=ConnectionError('Connection reset'))))
+
+        with self.assertRaises(ConnectionError):
+            self.service.update_account('token', url='b.com')
+        self.assertEqual(self.api.hosts, [])
+
+    def test_last_error_is_raised_when_all_urls_fail(self):
+        self.api.degrade(FAKE_API_URL, refuse=True)
+        self.api.degrade(FAKE_API_EU_URL, refuse=True)
+
+        with self.assertRaises(ConnectionError):
+            self.service.get_account('token')
+        self.assertEqual(len(self.api.hosts), 2)
+
+    def test_server_errors_are_not_retried_but_steer_away(self):
+        self.api.degrade(FAKE_API_URL, status_code=503)
+
+        with self.assertRaises(HTTPServiceError):
+            self.service.get_account('token')
+        self.service.get_account('token')
+
+        self.assertEqual(self.api.hosts, [
+            'fake.sitewit.test', 'eu.fake.sitewit.test'])
+
+    def test_slow_endpoint_is_avoided(self):
+        self.api.degrade(FAKE_API_URL, latency=0.2)
+
+        for _ in range(3):
+            self.service.get_account('token')
+
+        self.assertEqual(self.api.hosts, [
+            'fake.sitewit.test', 'eu.fake.sitewit.test',
+            'eu.fake.sitewit.test'])
+
+    def test_single_url_is_not_tracked(self):
+        service = SitewitService(api_url=FAKE_API_URL)
+
+        self.assertEqual(service.url, FAKE_API_URL)
+        self.assertEqual(service.endpoint_health, {})
@@ -0,0 +1,142 @@
+import pickle
+from datetime import date
+from unittest import TestCase
+from uuid import uuid4
+
+from sitewit.models import Account, Subscription
+from sitewit.serialization import (
+    SerializationError,
+    VERSION,
+    dumps,
+    dumps_many,
+    loads,
+    loads_many,
+)
+from tests.campaigns.base import make_subscription
+
+
+def make_account(number, user=True):
+    account_data = {
+        'accountNumber': number,
+        'token': uuid4().hex,
+        'status': 'Active',
+        'url': u'http://\xfcber.example.com/%s' % number,
+        'clientId': uuid4().hex,
+        'currency': 'USD',
+        'countryCode': 'US',
+    }
+    user_data = {
+        'name': 'User %s' % number,
+        'email': 'user%s@example.com' % number,
+        'token': uuid4().hex,
+    }
+    return Account(account_data, user_data if user else None)
+
+
+class SubscriptionSerializationTestCase(TestCase):
+    def setUp(self):
+        self.subscriptions = [
+            make_subscription(1, site_id=uuid4().hex),
+            make_subscription(2),
+            make_subscription(3, budget=200.0),
+        ]
+
+    def test_round_trip(self):
+        decoded = loads_many(dumps_many(self.subscriptions))
+
+        self.assertEqual(len(decoded), 3)
+        for original, copy in zip(self.subscriptions, decoded):
+            self.assertIsInstance(copy, Subscription)
+            self.assertEqual(vars(copy), vars(original))
+
+    def test_single_object(self):
+        subscription = self.subscriptions[0]
+
+        self.assertEqual(vars(loads(dumps(subscription))), vars(subscription))
+
+    def test_smaller_than_pickle(self):
+        subscriptions = [make_subscription(i) for i in range(100)]
+
+        self.assertLess(
+            len(dumps_many(subscriptions)),
+            len(pickle.dumps(subscriptions, pickle.HIGHEST_PROTOCOL)) / 2)
+
+    def test_dates_do_not_widen_records(self):
+        template = vars(make_subscription(1))
+        expiry_dates = [date(2015, 5, 8), None, date(2045, 1, 1)]
+        subscriptions = [
+            Subscription.from_fields(
+                **dict(template, expiry_date=expiry_dates[i % 3]))
+            for i in range(100)]
+
+        data = dumps_many(subscriptions)
+
+        # Same strings, so each extra record is 7 two-byte fields.
+        self.assertEqual(
+            len(data) - len(dumps_many(subscriptions[:1])), 99 * 7 * 2)
+        self.assertEqual(
+            [s.expiry_date for s in loads_many(data)[:3]], expiry_dates)
+
+    def test_many_distinct_strings(self):
+        template = vars(make_subscription(1))
+        subscriptions = [
+            Subscription.from_fields(**dict(template, campaign_id=str(i)))
+            for i in range(70000)]
+
+        decoded = loads_many(dumps_many(subscriptions))
+
+        self.assertEqual(decoded[-1].campaign_id, '69999')
+        self.assertEqual(decoded[-1].url, subscriptions[-1].url)
+
+
+class AccountSerializationTestCase(TestCase):
+    def test_round_trip(self):
+        accounts = [make_account(1), make_account(2, user=False)]
+        accounts[1].is_stale = True
+
+        decoded = loads_many(dumps_many(accounts))
+
+        for original, copy in zip(accounts, decoded):
+            self.assertIsInstance(copy, Account)
+            self.assertEqual(copy.id, original.id)
+            self.assertEqual(copy.url, original.url)
+            self.assertEqual(copy.token, original.token)
+            self.assertEqual(copy.is_stale, original.is_stale)
+        self.assertEqual(vars(decoded[0].user), vars(accounts[0].user))
+        self.assertIsNone(decoded[1].user)
+
+    def test_string_account_numbers_are_kept(self):
+        account = make_account('A-1')
+
+        self.assertEqual(loads(dumps(account)).id, 'A-1')
+
+
+class PayloadTestCase(TestCase):
+    def test_empty_list(self):
+        self.assertEqual(loads_many(dumps_many([])), [])
+
+    def test_mixed_lists_are_rejected(self):
+        with self.assertRaises(SerializationError):
+            dumps_many([make_account(1), make_subscription(1)])
+
+    def test_nul_characters_are_rejected(self):
+        account = make_account(1)
+        account.status = 'Act\x00ive'
+
+        with self.assertRaises(SerializationError):
+            dumps(account)
+
+    def test_garbage_is_rejected(self):
+        with self.assertRaises(SerializationError):
+            loads_many(b'not a payload at all')
+
+    def test_truncated_payload_is_rejected(self):
+        with self.assertRaises(SerializationError):
+            loads_many(dumps_many([make_account(1)])[:-3])
+
+    def test_other_versions_are_rejected(self):
+        data = bytearray(dumps(make_account(1)))
+        data[4] = VERSION + 1
+
+        with self.assertRaises(SerializationError):
+            loads_many(bytes(data))
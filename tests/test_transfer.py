@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+from sitewit.services import SitewitService
+from sitewit.transfer import ACCEPT_ENCODING, EndpointTransfer, endpoint
+from tests.base import SitewitTestCase
+from tests.fakeapi import FAKE_API_URL, FakeSitewitAPI
+
+
+class EndpointTestCase(TestCase):
+    def test_ids_are_folded(self):
+        self.assertEqual(
+            endpoint('GET', 'http://sitewit.test/api/campaign/123'),
+            'GET /api/campaign/{id}')
+        self.assertEqual(
+            endpoint('DELETE', 'http://sitewit.test/api/account/'
+                               '7f1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e'),
+            'DELETE /api/account/{id}')
+
+    def test_query_and_case_are_ignored(self):
+        self.assertEqual(
+            endpoint('GET', 'http://sitewit.test/api/Account/?x=1'),
+            'GET /api/account')
+
+    def test_ratio(self):
+        self.assertEqual(EndpointTransfer(2, 50, 200).ratio, 0.25)
+        self.assertEqual(EndpointTransfer(1, 0, 0).ratio, 1.0)
+
+
+class TransferAccountingTestCase(SitewitTestCase):
+    def setUp(self):
+        self.api = FakeSitewitAPI()
+        self.api.audit = [
+            {'url': 'http://example.com/%d' % i, 'clientId': None,
+             'subscriptions': [{'budget': 50, 'fee': 9.99,
+                                'currency': 'USD'}]}
+            for i in range(200)]
+        self.api.accounts['token'] = {'token': 'token'}
+        self.service = SitewitService(api_url=FAKE_API_URL)
+        self.service.mount(FAKE_API_URL, self.api)
+
+    def test_compression_is_negotiated(self):
+        self.assertEqual(
+            self.service._shared_request_params['headers']['Accept-Encoding'],
+            ACCEPT_ENCODING)
+
+    def test_compressed_responses_are_decoded(self):
+        page = self.service.list_subscriptions(0, 150)
+
+        self.assertEqual(page, self.api.audit[:150])
+
+    def test_wire_and_body_bytes_are_counted_per_endpoint(self):
+        self.service.list_subscriptions(0, 100)
+        self.service.list_subscriptions(100, 100)
+        self.service.get_account('token')
+
+        stats = self.service.transfer_stats.snapshot()
+        audit = stats['GET /api/subscription/audit']
+        self.assertEqual(audit.responses, 2)
+        self.assertLess(audit.wire_bytes, audit.body_bytes / 5)
+        self.assertEqual(stats['GET /api/account'].responses, 1)
+
+    def test_reset(self):
+        self.service.get_account('token')
+        self.service.transfer_stats.reset()
+
+        self.assertEqual(self.service.transfer_stats.snapshot(), {})